@@ -0,0 +1,183 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+import zmq
+import zmq.asyncio
+from dotenv import load_dotenv
+
+load_dotenv()
+CHAT_BROKER = os.getenv("CHAT_BROKER", "local")
+# 워커들의 PUB 소켓이 붙는 주소 (프록시 XSUB), SUB 소켓이 붙는 주소 (프록시 XPUB)
+CHAT_BROKER_PUB_URL = os.getenv("CHAT_BROKER_PUB_URL", "tcp://127.0.0.1:5561")
+CHAT_BROKER_SUB_URL = os.getenv("CHAT_BROKER_SUB_URL", "tcp://127.0.0.1:5562")
+CHAT_BROKER_PROXY_RETRY = float(os.getenv("CHAT_BROKER_PROXY_RETRY", "5"))
+CHAT_BROKER_HWM = int(os.getenv("CHAT_BROKER_HWM", "10000"))
+
+Deliver = Callable[[int, str], Awaitable[None]]
+
+
+class LocalBroker:
+    """워커 1개일 때 사용. 로컬 전달은 ConnectionManager 가 직접 하므로 버스로는 아무것도 보내지 않는다."""
+
+    async def start(self, deliver: Deliver):
+        self.deliver = deliver
+
+    async def subscribe(self, chatRoom_id: int):
+        pass
+
+    async def unsubscribe(self, chatRoom_id: int):
+        pass
+
+    async def publish(self, chatRoom_id: int, message: str):
+        pass
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"kind": "local"}
+
+
+class ZmqBroker:
+    """워커 간 채팅 fan-out. PUB -> (XSUB/XPUB 프록시) -> SUB 구조이고,
+    각 워커는 자기가 소켓을 들고 있는 채팅방 토픽만 구독한다."""
+
+    def __init__(
+        self,
+        pub_url: str = CHAT_BROKER_PUB_URL,
+        sub_url: str = CHAT_BROKER_SUB_URL,
+        prefix: bytes = b"",
+        proxy: bool = True,
+    ):
+        self.pub_url = pub_url
+        self.sub_url = sub_url
+        # 같은 버스를 쓰는 다른 채널(파티 이벤트 등)과 토픽이 겹치지 않도록 붙이는 prefix
+        self.prefix = prefix
+        # 프록시는 프로세스당 하나면 되므로 추가 채널은 proxy=False 로 만든다
+        self.proxy = proxy
+        self.origin = uuid.uuid4().bytes
+        self.context = zmq.asyncio.Context()
+        self.proxy_context = zmq.Context()
+        self.pub: Optional[zmq.asyncio.Socket] = None
+        # 같은 PUB 소켓의 동기 버전 - zmq.asyncio 소켓의 send 는 Future 를 돌려줘서 NOBLOCK 오류가 publish 에서 안 보인다
+        self.pub_sync: Optional[zmq.Socket] = None
+        self.sub: Optional[zmq.asyncio.Socket] = None
+        self.listener: Optional[asyncio.Task] = None
+        self.proxy_thread: Optional[threading.Thread] = None
+
+        self.published = 0
+        self.dropped = 0
+
+    def topic(self, chatRoom_id: int) -> bytes:
+        # "12:" 는 "123:" 의 prefix 가 아니므로 방 번호끼리 구독이 섞이지 않는다
+        return self.prefix + b"%d:" % chatRoom_id
+
+    async def start(self, deliver: Deliver):
+        self.deliver = deliver
+
+        if self.proxy:
+            self.proxy_thread = threading.Thread(target=self.run_proxy, name="chat-broker-proxy", daemon=True)
+            self.proxy_thread.start()
+
+        self.pub = self.context.socket(zmq.PUB)
+        self.pub.setsockopt(zmq.SNDHWM, CHAT_BROKER_HWM)
+        self.pub.setsockopt(zmq.LINGER, 0)
+        self.pub.connect(self.pub_url)
+        self.pub_sync = zmq.Socket.shadow(self.pub.underlying)
+
+        self.sub = self.context.socket(zmq.SUB)
+        self.sub.setsockopt(zmq.RCVHWM, CHAT_BROKER_HWM)
+        self.sub.setsockopt(zmq.LINGER, 0)
+        self.sub.connect(self.sub_url)
+
+        self.listener = asyncio.create_task(self.listen())
+
+    def run_proxy(self):
+        # 같은 호스트의 워커들 중 바인드에 성공한 하나가 프록시를 맡는다.
+        # 나머지는 주기적으로 재시도해서, 프록시를 맡던 워커가 죽으면 이어받는다.
+        while not self.proxy_context.closed:
+            try:
+                xsub = self.proxy_context.socket(zmq.XSUB)
+                xpub = self.proxy_context.socket(zmq.XPUB)
+            except zmq.ZMQError:
+                return
+            xsub.setsockopt(zmq.LINGER, 0)
+            xpub.setsockopt(zmq.LINGER, 0)
+            try:
+                xsub.bind(self.pub_url)
+                xpub.bind(self.sub_url)
+                zmq.proxy(xsub, xpub)
+            except zmq.ContextTerminated:
+                return
+            except zmq.ZMQError:
+                pass
+            finally:
+                xsub.close()
+                xpub.close()
+            time.sleep(CHAT_BROKER_PROXY_RETRY)
+
+    async def listen(self):
+        while True:
+            try:
+                topic, origin, payload = await self.sub.recv_multipart()
+                if origin == self.origin:
+                    continue
+                await self.deliver(int(topic[len(self.prefix):-1]), payload.decode("utf-8"))
+            except asyncio.CancelledError:
+                raise
+            except zmq.ContextTerminated:
+                return
+            except Exception as e:
+                print(f"채팅 브로커 수신 오류: {e}")
+
+    async def subscribe(self, chatRoom_id: int):
+        self.sub.setsockopt(zmq.SUBSCRIBE, self.topic(chatRoom_id))
+
+    async def unsubscribe(self, chatRoom_id: int):
+        self.sub.setsockopt(zmq.UNSUBSCRIBE, self.topic(chatRoom_id))
+
+    async def publish(self, chatRoom_id: int, message: str):
+        # PUB 소켓은 HWM 을 넘으면 버리므로 NOBLOCK 으로 보내도 이벤트 루프를 막지 않는다.
+        # 동기 소켓으로 보내야 보내지 못한 경우(zmq.Again 등)가 여기서 예외로 나온다
+        try:
+            self.pub_sync.send_multipart(
+                [self.topic(chatRoom_id), self.origin, message.encode("utf-8")],
+                flags=zmq.NOBLOCK,
+            )
+            self.published += 1
+        except zmq.Again:
+            self.dropped += 1
+            print(f"채팅 브로커 전송 큐 초과: chatRoom_id={chatRoom_id}")
+        except zmq.ZMQError as e:
+            self.dropped += 1
+            print(f"채팅 브로커 전송 오류: chatRoom_id={chatRoom_id}, {e}")
+
+    async def close(self):
+        if self.listener:
+            self.listener.cancel()
+            try:
+                await self.listener
+            except asyncio.CancelledError:
+                pass
+        # shadow 소켓은 같은 소켓을 가리킬 뿐이라 닫지 않는다 (pub 을 닫으면 같이 닫힘)
+        self.pub_sync = None
+        for sock in (self.pub, self.sub):
+            if sock is not None:
+                sock.close()
+        self.context.term()
+        self.proxy_context.term()
+
+    def stats(self) -> dict:
+        return {"kind": "zmq", "published": self.published, "dropped": self.dropped}
+
+
+def create_broker(kind: str = CHAT_BROKER, prefix: bytes = b"", proxy: bool = True):
+    if kind == "zmq":
+        return ZmqBroker(prefix=prefix, proxy=proxy)
+    if kind == "local":
+        return LocalBroker()
+    raise ValueError(f"Unknown CHAT_BROKER: {kind}")
@@ -0,0 +1,87 @@
+import os
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+from websockets import frames
+from websockets.extensions.base import ServerExtensionFactory
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+
+load_dotenv()
+# 채팅 소켓 permessage-deflate 설정 - benchmarks/ws_deflate.py 결과를 보고 배포 환경별로 정한다
+CHAT_WS_DEFLATE = os.getenv("CHAT_WS_DEFLATE", "true").lower() in ("1", "true", "yes")
+CHAT_WS_DEFLATE_WINDOW_BITS = int(os.getenv("CHAT_WS_DEFLATE_WINDOW_BITS", "15"))
+# 이 크기(바이트)보다 작은 메시지는 압축하지 않고 보낸다 (RFC 7692 상 메시지 단위로 선택 가능)
+CHAT_WS_DEFLATE_MIN_SIZE = int(os.getenv("CHAT_WS_DEFLATE_MIN_SIZE", "0"))
+CHAT_WS_DEFLATE_PATH = os.getenv("CHAT_WS_DEFLATE_PATH", "/user/ws/")
+
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    def __init__(self, *args, min_size: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+
+    def encode(self, frame: frames.Frame) -> frames.Frame:
+        # 한 프레임짜리 작은 메시지는 RSV1 없이 그대로 보낸다
+        if (
+            frame.opcode in (frames.OP_TEXT, frames.OP_BINARY)
+            and frame.fin
+            and len(frame.data) < self.min_size
+        ):
+            return frame
+        return super().encode(frame)
+
+
+class ThresholdPerMessageDeflateFactory(ServerPerMessageDeflateFactory):
+    def __init__(self, min_size: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.min_size = min_size
+
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, ThresholdPerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings,
+            min_size=self.min_size,
+        )
+
+
+def chat_extensions(
+    enabled: bool = CHAT_WS_DEFLATE,
+    window_bits: int = CHAT_WS_DEFLATE_WINDOW_BITS,
+    min_size: int = CHAT_WS_DEFLATE_MIN_SIZE,
+) -> List[ServerExtensionFactory]:
+    if not enabled:
+        return []
+    return [ThresholdPerMessageDeflateFactory(min_size=min_size, server_max_window_bits=window_bits)]
+
+
+class ChatWebSocketProtocol(WebSocketProtocol):
+    """uvicorn 웹소켓 프로토콜. 채팅 경로에는 위 설정의 permessage-deflate 를, 그 외 경로에는 uvicorn 기본값을 쓴다.
+    run.py 에서 uvicorn.run(..., ws=ChatWebSocketProtocol) 로 지정한다."""
+
+    chat_path = False
+
+    async def process_request(self, path: str, headers) -> Optional[object]:
+        self.chat_path = path.startswith(CHAT_WS_DEFLATE_PATH)
+        return await super().process_request(path, headers)
+
+    def process_extensions(self, headers, available_extensions):
+        # 핸드셰이크에서 process_request 다음에 호출된다
+        if self.chat_path:
+            available_extensions = chat_extensions()
+        return super().process_extensions(headers, available_extensions)
+
+    def shutdown(self):
+        # 서버 종료 시 uvicorn 은 모든 소켓을 한 번에 1012 로 끊는다.
+        # 채팅 소켓은 열어 둔 채로 그레이스풀 종료를 시작하고, 앱이 시점을 흩뿌려 닫게 한다
+        from .shutdown import graceful
+
+        if self.chat_path and self.handshake_completed_event.is_set() and graceful.enabled:
+            self.ws_server.closing = True
+            graceful.begin()
+            return
+        super().shutdown()
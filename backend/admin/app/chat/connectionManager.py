@@ -0,0 +1,603 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from fastapi import WebSocket
+from typing import AsyncIterator, Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+from dotenv import load_dotenv
+from .broker import create_broker
+from .history import ChatHistory, ChatMessage
+from .presence import Presence
+from .tap import ChatTaps
+from . import protocol
+from .protocol import Frame
+
+load_dotenv()
+CHAT_SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", "100"))
+# 느린 클라이언트 큐가 가득 찼을 때: drop_oldest | coalesce (legacy 소켓은 drop_oldest) | disconnect
+CHAT_SLOW_CONSUMER_POLICY = os.getenv("CHAT_SLOW_CONSUMER_POLICY", "drop_oldest")
+
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+# 1013 Try Again Later - 클라이언트가 잠시 후 재접속하도록
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# 서버가 CHAT_HEARTBEAT_INTERVAL 초 동안 조용한 소켓에 ping 을 보내고,
+# CHAT_HEARTBEAT_TIMEOUT 초 동안 아무 프레임(pong 포함)도 못 받으면 죽은 소켓으로 보고 정리한다
+CHAT_HEARTBEAT_INTERVAL = float(os.getenv("CHAT_HEARTBEAT_INTERVAL", "25"))
+CHAT_HEARTBEAT_TIMEOUT = float(os.getenv("CHAT_HEARTBEAT_TIMEOUT", "60"))
+HEARTBEAT_PING = Frame(protocol.envelope("ping"))
+# 1001 Going Away - heartbeat 응답이 없어 서버가 정리한 소켓
+HEARTBEAT_CLOSE_CODE = 1001
+# 1002 Protocol Error - 유저 소켓은 방 번호를 실어 보낼 수 있는 v1 서브프로토콜만 받는다
+PROTOCOL_CLOSE_CODE = 1002
+
+# 정원 - 핸드셰이크(accept) 전에 확인해서, 넘치면 소켓을 열지 않고 거절한다 (HTTP 403)
+# 방 단위 소켓 수 (1:1 채팅방이라 2)
+CHAT_ROOM_MAX_SOCKETS = int(os.getenv("CHAT_ROOM_MAX_SOCKETS", "2"))
+# 팀 단체방의 방 단위 소켓 수 상한 - 멤버 수만큼 받되 이 값을 넘지 않는다
+CHAT_GROUP_MAX_SOCKETS = int(os.getenv("CHAT_GROUP_MAX_SOCKETS", "100"))
+# 유저 한 명의 유저 소켓 수 (기기/탭)
+CHAT_USER_MAX_SOCKETS = int(os.getenv("CHAT_USER_MAX_SOCKETS", "5"))
+# 워커 하나가 받는 전체 소켓 수. 0 이면 제한 없음
+CHAT_MAX_CONNECTIONS = int(os.getenv("CHAT_MAX_CONNECTIONS", "0"))
+# 브로커 구독/해제 순서를 맞추는 락 수 - 방 번호로 나눠서 다른 방끼리는 서로 기다리지 않는다
+CHAT_LOCK_SHARDS = int(os.getenv("CHAT_LOCK_SHARDS", "64"))
+# 같은 소켓의 typing 시작 신호는 이 간격(초)에 한 번만 전달한다 (키 입력마다 보내도 fan-out 이 늘지 않게)
+CHAT_TYPING_INTERVAL = float(os.getenv("CHAT_TYPING_INTERVAL", "2"))
+
+# 저장하지도 history 에 남기지도 않는 일회성 이벤트 - 밀린 소켓에는 버리고, legacy 클라이언트에는 보내지 않는다
+SIGNAL_TYPES = ("typing",)
+
+
+def resync_frame(chatRoom_id: int) -> Frame:
+    # 재접속한 소켓이 놓친 메시지를 history 버퍼로 채울 수 없을 때 - 클라이언트는 /user/chat/contents 로 다시 조회
+    return Frame(protocol.envelope("resync", payload={"chatRoom_id": chatRoom_id}))
+
+
+class Connection:
+    """소켓 하나와 그 소켓 전용 송신 큐/송신 태스크.
+    방 단위 소켓(/user/ws/chat/{chatRoom_id}/...)은 chatRoom_id 방 하나를, 유저 소켓(/user/ws/{user_id})은 subscribe 한 방들을 받는다."""
+
+    __slots__ = (
+        "chatRoom_id", "user_id", "rooms", "websocket", "fmt",
+        "queue", "waiter", "sender", "closing", "registered", "last_seen",
+        "presence", "typed_at",
+    )
+
+    def __init__(self, websocket: WebSocket, fmt: str = protocol.LEGACY, chatRoom_id: Optional[int] = None, user_id: Optional[int] = None):
+        self.chatRoom_id = chatRoom_id
+        self.user_id = user_id
+        self.rooms: Set[int] = set()
+        self.websocket = websocket
+        self.fmt = fmt
+        # 항목은 이벤트 프레임이거나, coalesce 로 합쳐진 프레임 목록(list)
+        self.queue: Deque[Union[Frame, List[Frame]]] = deque()
+        # 송신 태스크가 빈 큐를 기다릴 때만 만드는 future (소켓마다 Event 를 들고 있지 않는다)
+        self.waiter: Optional[asyncio.Future] = None
+        self.sender: Optional[asyncio.Task] = None
+        self.closing = False
+        self.registered = False
+        self.last_seen = time.monotonic()
+        # (party_id, user_id) - 파티 접속 현황에 센 소켓만
+        self.presence: Optional[Tuple[int, int]] = None
+        self.typed_at = 0.0
+
+
+class ConnectionManager:
+    def __init__(
+        self,
+        broker=None,
+        queue_size: int = CHAT_SEND_QUEUE_SIZE,
+        policy: str = CHAT_SLOW_CONSUMER_POLICY,
+        heartbeat_interval: float = CHAT_HEARTBEAT_INTERVAL,
+        heartbeat_timeout: float = CHAT_HEARTBEAT_TIMEOUT,
+        history: Optional[ChatHistory] = None,
+        room_max_sockets: int = CHAT_ROOM_MAX_SOCKETS,
+        group_max_sockets: int = CHAT_GROUP_MAX_SOCKETS,
+        user_max_sockets: int = CHAT_USER_MAX_SOCKETS,
+        max_connections: int = CHAT_MAX_CONNECTIONS,
+        lock_shards: int = CHAT_LOCK_SHARDS,
+        presence: Optional[Presence] = None,
+        taps: Optional[ChatTaps] = None,
+        typing_interval: float = CHAT_TYPING_INTERVAL,
+    ):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown CHAT_SLOW_CONSUMER_POLICY: {policy}")
+        # 방별 소켓 (방 단위 소켓 + 그 방을 구독한 유저 소켓)과 유저별 유저 소켓 (기기/탭마다 하나).
+        # 값은 순서 있는 집합으로 쓰는 dict 라 추가/삭제가 O(1)
+        # 등록/해제는 await 없이 한 번에 끝나서 이벤트 루프 안에서는 락이 필요 없다
+        self.active_connections: Dict[int, Dict[Connection, None]] = {}
+        self.user_connections: Dict[int, Dict[Connection, None]] = {}
+        # accept 전에 잡은 자리 수 (정원 확인용)
+        self.room_sockets: Dict[int, int] = {}
+        self.user_sockets: Dict[int, int] = {}
+        self.total = 0
+        self.room_max_sockets = room_max_sockets
+        self.group_max_sockets = group_max_sockets
+        self.user_max_sockets = user_max_sockets
+        self.max_connections = max_connections
+        # 방의 첫 소켓/마지막 소켓 때 하는 브로커 구독/해제가 await 중에 순서가 뒤바뀌지 않도록
+        self.locks = [asyncio.Lock() for _ in range(max(lock_shards, 1))]
+        # 그레이스풀 종료 중에는 새 소켓을 받지 않는다 (app/chat/shutdown.py)
+        self.draining = False
+        self.broker = broker if broker is not None else create_broker()
+        self.queue_size = queue_size
+        self.policy = policy
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        # 마지막으로 프레임을 받은 순서대로 정렬 (앞쪽일수록 오래 조용한 소켓)
+        self.recent: "OrderedDict[Connection, None]" = OrderedDict()
+        self.heartbeat: Optional[asyncio.Task] = None
+        # 방별 최근 메시지 - 채팅 첫 페이지 조회와 재접속 replay 에 사용
+        self.history = history if history is not None else ChatHistory()
+        # 파티별 접속 중인 유저 - 이 레지스트리에서 세고 다른 워커의 현황은 버스로 받아서 /user/partyInfo 가 DB 조회 없이 읽는다
+        self.presence = presence if presence is not None else Presence()
+        self.typing_interval = typing_interval
+        # 매니저용 파티 채팅 탭 - 방 소켓과 같은 브로드캐스트 경로에서 받는다
+        self.taps = taps if taps is not None else ChatTaps()
+
+        self.dropped = 0
+        self.coalesced = 0
+        self.evicted = 0
+        self.pinged = 0
+        self.reaped = 0
+        self.frames_sent = 0
+        self.events_sent = 0
+        self.replayed = 0
+        self.resynced = 0
+        self.rejected = 0
+        self.signals = 0
+        self.signals_dropped = 0
+
+    async def start(self):
+        await self.broker.start(self.receive_remote)
+        await self.presence.start()
+        self.heartbeat = asyncio.create_task(self.run_heartbeat())
+
+    async def close(self):
+        if self.heartbeat is not None:
+            self.heartbeat.cancel()
+            try:
+                await self.heartbeat
+            except asyncio.CancelledError:
+                pass
+            self.heartbeat = None
+        await self.presence.close()
+        await self.broker.close()
+
+    async def connect(self, chatRoom_id: int, websocket: WebSocket, last_chat_id: Optional[int] = None, limit: Optional[int] = None) -> Optional[Connection]:
+        """방 단위 소켓. limit 은 방 정원 (room_limit), 없으면 1:1 방 정원"""
+        if not self.admit(self.room_sockets, chatRoom_id, limit or self.room_max_sockets):
+            await self.reject(websocket)
+            return None
+        try:
+            # 클라이언트가 v1 서브프로토콜을 요청하면 envelope/msgpack, 아니면 기존 방식
+            subprotocol, fmt = protocol.negotiate(websocket.scope.get("subprotocols", []))
+            await websocket.accept(subprotocol=subprotocol)
+        except Exception:
+            self.release(self.room_sockets, chatRoom_id)
+            raise
+        connection = self.open(websocket, fmt, chatRoom_id=chatRoom_id)
+        try:
+            await self.join(connection, chatRoom_id, last_chat_id)
+        except Exception:
+            # 호출한 쪽은 connection 을 받지 못하므로 여기서 자리와 구독을 돌려준다
+            await self.remove(connection)
+            raise
+        return connection
+
+    async def connect_user(self, user_id: int, websocket: WebSocket) -> Optional[Connection]:
+        """유저 소켓 - 소켓 하나로 여러 방을 subscribe 해서 받는다"""
+        subprotocol, fmt = protocol.negotiate(websocket.scope.get("subprotocols", []))
+        if fmt == protocol.LEGACY:
+            await websocket.close(code=PROTOCOL_CLOSE_CODE)
+            return None
+        if not self.admit(self.user_sockets, user_id, self.user_max_sockets):
+            await self.reject(websocket)
+            return None
+        try:
+            await websocket.accept(subprotocol=subprotocol)
+        except Exception:
+            self.release(self.user_sockets, user_id)
+            raise
+        connection = self.open(websocket, fmt, user_id=user_id)
+        self.user_connections.setdefault(user_id, {})[connection] = None
+        return connection
+
+    def room_limit(self, members: int) -> int:
+        """방 단위 소켓 정원 - 1:1 방은 room_max_sockets, 팀 단체방은 멤버 수 (group_max_sockets 까지)"""
+        return min(max(self.room_max_sockets, members), max(self.group_max_sockets, self.room_max_sockets))
+
+    def admit(self, sockets: Dict[int, int], key: int, limit: int) -> bool:
+        """정원 확인과 자리 잡기를 await 없이 한 번에 해서, 동시에 들어온 핸드셰이크가 정원을 같이 넘지 않는다"""
+        if self.draining:
+            return False
+        if self.max_connections and self.total >= self.max_connections:
+            return False
+        count = sockets.get(key, 0)
+        if count >= limit:
+            return False
+        sockets[key] = count + 1
+        self.total += 1
+        return True
+
+    def release(self, sockets: Dict[int, int], key: int):
+        count = sockets.get(key, 0) - 1
+        if count > 0:
+            sockets[key] = count
+        else:
+            sockets.pop(key, None)
+        self.total -= 1
+
+    async def reject(self, websocket: WebSocket):
+        # accept 전에 닫으면 서버가 핸드셰이크를 HTTP 403 으로 끝낸다
+        self.rejected += 1
+        await websocket.close()
+
+    def open(self, websocket: WebSocket, fmt: str, chatRoom_id: Optional[int] = None, user_id: Optional[int] = None) -> Connection:
+        connection = Connection(websocket, fmt, chatRoom_id, user_id)
+        connection.registered = True
+        self.recent[connection] = None
+        return connection
+
+    async def track(self, connection: Connection, party_id: int, user_id: int):
+        """소켓을 파티 접속 현황에 센다. 유저의 첫 소켓이면 파티 채널로 online 을 알린다"""
+        if not connection.registered or connection.presence is not None:
+            return
+        connection.presence = (party_id, user_id)
+        if self.presence.add(party_id, user_id):
+            await self.presence.announce(party_id, user_id, True)
+
+    def lock_for(self, chatRoom_id: int) -> asyncio.Lock:
+        return self.locks[chatRoom_id % len(self.locks)]
+
+    async def subscribe(self, connection: Connection, chatRoom_id: int, last_chat_id: Optional[int] = None):
+        if connection.registered and not connection.closing:
+            await self.join(connection, chatRoom_id, last_chat_id)
+
+    async def unsubscribe(self, connection: Connection, chatRoom_id: int):
+        await self.leave(connection, chatRoom_id)
+
+    async def join(self, connection: Connection, chatRoom_id: int, last_chat_id: Optional[int]):
+        first = False
+        if chatRoom_id not in connection.rooms:
+            connection.rooms.add(chatRoom_id)
+            connections = self.active_connections.get(chatRoom_id)
+            if connections is None:
+                connections = self.active_connections[chatRoom_id] = {}
+                first = True
+            connections[connection] = None
+        # 등록과 같은 동기 구간에서 replay 해야 이후 브로드캐스트와 겹치거나 빠지는 메시지가 없다
+        if last_chat_id is not None:
+            self.replay(connection, chatRoom_id, last_chat_id)
+        # 이 워커에 해당 방의 첫 소켓이 붙을 때만 버스 구독
+        if first:
+            async with self.lock_for(chatRoom_id):
+                await self.broker.subscribe(chatRoom_id)
+
+    async def leave(self, connection: Connection, chatRoom_id: int):
+        if chatRoom_id not in connection.rooms:
+            return
+        connection.rooms.discard(chatRoom_id)
+        connections = self.active_connections.get(chatRoom_id)
+        if connections is None:
+            return
+        connections.pop(connection, None)
+        if not connections:
+            del self.active_connections[chatRoom_id]
+            async with self.lock_for(chatRoom_id):
+                await self.broker.unsubscribe(chatRoom_id)
+
+    async def remove(self, connection: Connection):
+        """소켓을 모든 방과 유저 목록에서 빼고 자리를 돌려준다. 여러 번 호출해도 된다"""
+        connection.closing = True
+        if not connection.registered:
+            return
+        connection.registered = False
+        self.recent.pop(connection, None)
+        if connection.chatRoom_id is not None:
+            self.release(self.room_sockets, connection.chatRoom_id)
+        if connection.user_id is not None:
+            self.release(self.user_sockets, connection.user_id)
+            connections = self.user_connections.get(connection.user_id)
+            if connections is not None:
+                connections.pop(connection, None)
+                if not connections:
+                    del self.user_connections[connection.user_id]
+        for chatRoom_id in list(connection.rooms):
+            await self.leave(connection, chatRoom_id)
+        if connection.presence is not None:
+            party_id, user_id = connection.presence
+            connection.presence = None
+            # 그레이스풀 종료 중에는 곧 다른 워커로 재접속하므로 offline 을 알리지 않는다
+            if self.presence.discard(party_id, user_id) and not self.draining:
+                await self.presence.announce(party_id, user_id, False)
+
+        if connection.sender is not None and connection.sender is not asyncio.current_task():
+            connection.sender.cancel()
+
+    def replay(self, connection: Connection, chatRoom_id: int, last_chat_id: int):
+        messages = self.history.since(chatRoom_id, last_chat_id)
+        if messages is None:
+            self.resynced += 1
+            self.enqueue(connection, resync_frame(chatRoom_id))
+            return
+        for message in messages:
+            self.enqueue(connection, Frame(protocol.envelope("chat", payload=message.as_payload(chatRoom_id))))
+        self.replayed += len(messages)
+
+    def touch(self, connection: Connection):
+        """클라이언트에게서 프레임(채팅, pong 등)을 받을 때마다 호출"""
+        connection.last_seen = time.monotonic()
+        if connection in self.recent:
+            self.recent.move_to_end(connection)
+
+    async def run_heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self.check_heartbeat(time.monotonic())
+                await self.evict_history()
+            except Exception as e:
+                print(f"heartbeat 처리 오류: {e}")
+
+    def check_heartbeat(self, now: float):
+        # recent 는 last_seen 순으로 정렬되어 있어서, 앞에서부터 살아있는 소켓을 만나면 멈춘다 - O(죽은 소켓 수)
+        while self.recent:
+            connection = next(iter(self.recent))
+            if connection.last_seen + self.heartbeat_timeout > now:
+                break
+            del self.recent[connection]
+            if not connection.closing:
+                connection.closing = True
+                self.reaped += 1
+                asyncio.create_task(self.evict(connection, HEARTBEAT_CLOSE_CODE))
+
+        # interval 이상 조용했던 소켓에만 ping
+        for connection in self.recent:
+            if connection.last_seen + self.heartbeat_interval > now:
+                break
+            self.enqueue(connection, HEARTBEAT_PING)
+            self.pinged += 1
+
+    async def send_personal_message(self, message: str, websocket: WebSocket):
+        await websocket.send_text(message)
+
+    def send(self, connection: Connection, event: dict):
+        """이 소켓에만 보내는 이벤트 (ack, error 등)"""
+        self.enqueue(connection, Frame(event))
+
+    def send_user(self, user_id: int, event: dict):
+        """이 워커에 붙은 유저 소켓 전부에 보내는 이벤트 - 보고 있는 방과 상관없이 받는다"""
+        frame = Frame(event)
+        for connection in self.user_connections.get(user_id, ()):
+            self.enqueue(connection, frame)
+
+    async def broadcast(self, chatRoom_id: int, event: dict, sender: Optional[Connection] = None):
+        # 포맷별 인코딩은 Frame 이 한 번씩만 하고 같은 결과를 각 소켓 큐에 넣는다
+        frame = Frame(event)
+        await self.remember(chatRoom_id, event)
+        # 다른 워커에 붙은 상대방에게는 버스로, 이 워커의 소켓에는 직접 전달
+        await self.broker.publish(chatRoom_id, frame.encode(protocol.JSON))
+        await self.deliver(chatRoom_id, frame, sender)
+        self.taps.feed(chatRoom_id, frame)
+
+    async def signal(self, chatRoom_id: int, event: dict, sender: Optional[Connection] = None):
+        """typing 같은 일회성 이벤트 - 브로커로 다른 워커에도 보내지만 history/DB 에는 남기지 않는다"""
+        frame = Frame(event)
+        await self.broker.publish(chatRoom_id, frame.encode(protocol.JSON))
+        self.deliver_signal(chatRoom_id, frame, sender)
+
+    async def typing(self, connection: Connection, chatRoom_id: int, user_id: int, typing: bool):
+        now = time.monotonic()
+        if typing:
+            if connection.typed_at + self.typing_interval > now:
+                return
+            connection.typed_at = now
+        else:
+            connection.typed_at = 0.0
+        await self.signal(chatRoom_id, protocol.envelope("typing", payload={"chatRoom_id": chatRoom_id, "user_id": user_id, "typing": typing}), connection)
+
+    async def tap(self, party_id: int, chatRoom_ids: Iterable[int], rooms: Optional[Set[int]] = None, users: Optional[Set[int]] = None) -> AsyncIterator[str]:
+        """매니저용 파티 채팅 탭 (SSE 본문). chatRoom_ids 는 파티의 방 전체 - 다른 워커에서 보낸 채팅도 받도록 버스를 구독한다"""
+        tap, added = self.taps.add(party_id, chatRoom_ids, rooms, users)
+        try:
+            for chatRoom_id in added:
+                async with self.lock_for(chatRoom_id):
+                    await self.broker.subscribe(chatRoom_id)
+            async for chunk in self.taps.stream(tap):
+                yield chunk
+        finally:
+            for chatRoom_id in self.taps.remove(tap):
+                async with self.lock_for(chatRoom_id):
+                    await self.broker.unsubscribe(chatRoom_id)
+
+    async def tap_room(self, party_id: int, chatRoom_id: int):
+        """탭이 열린 파티에 새 방이 생겼을 때 (이 워커에서 만든 방)"""
+        if self.taps.add_room(party_id, chatRoom_id):
+            async with self.lock_for(chatRoom_id):
+                await self.broker.subscribe(chatRoom_id)
+
+    def deliver_signal(self, chatRoom_id: int, frame: Frame, sender: Optional[Connection] = None):
+        for connection in self.active_connections.get(chatRoom_id, ()):
+            if connection is sender or connection.fmt == protocol.LEGACY:
+                continue
+            # 밀린 소켓에는 버린다 - 느린 소켓 정책(drop_oldest 등)이 채팅 메시지를 밀어내지 않게
+            if len(connection.queue) >= self.queue_size:
+                self.signals_dropped += 1
+                continue
+            self.enqueue(connection, frame)
+            self.signals += 1
+
+    async def receive_remote(self, chatRoom_id: int, message: str):
+        event = json.loads(message)
+        if event.get("type") in SIGNAL_TYPES:
+            self.deliver_signal(chatRoom_id, Frame(event))
+            return
+        await self.remember(chatRoom_id, event)
+        frame = Frame(event)
+        # 다른 워커가 버스로 보낸 JSON 을 그대로 써서 탭에 보낼 때 다시 인코딩하지 않는다
+        frame.encoded[protocol.JSON] = message
+        await self.deliver(chatRoom_id, frame)
+        self.taps.feed(chatRoom_id, frame)
+
+    async def remember(self, chatRoom_id: int, event: dict):
+        if event.get("type") != "chat":
+            return
+        payload = event["payload"]
+        message = ChatMessage(payload["chat_id"], payload["user_id"], payload["content"], payload.get("date"), payload.get("seq"))
+        # history 가 들고 있는 방은 소켓이 없어도 버스 구독을 유지해야 다른 워커의 메시지가 빠지지 않는다
+        # (zmq SUB 구독은 횟수로 관리되어 소켓 쪽 구독/해제와 섞이지 않는다)
+        if self.history.append(chatRoom_id, message):
+            await self.broker.subscribe(chatRoom_id)
+        await self.evict_history()
+
+    async def reserve_history(self, chatRoom_id: int, delay: float = 0.0):
+        """DB 조회 전에 버퍼를 만들고 버스를 구독한다 - 조회와 구독 사이에 다른 워커가 보낸 메시지도 버퍼에 들어오도록"""
+        if self.history.reserve(chatRoom_id, delay):
+            await self.broker.subscribe(chatRoom_id)
+        await self.evict_history()
+
+    async def seed_history(self, chatRoom_id: int, rows: List[ChatMessage], limit: int, delay: float = 0.0):
+        if self.history.seed(chatRoom_id, rows, limit, delay):
+            await self.broker.subscribe(chatRoom_id)
+        await self.evict_history()
+
+    async def evict_history(self):
+        for chatRoom_id in self.history.evict(time.monotonic()):
+            await self.broker.unsubscribe(chatRoom_id)
+
+    async def deliver(self, chatRoom_id: int, frame: Frame, sender: Optional[Connection] = None):
+        # enqueue 는 await 없이 끝나서 도는 중에 목록이 바뀌지 않는다 (복사 불필요)
+        for connection in self.active_connections.get(chatRoom_id, ()):
+            # v1 클라이언트는 자기 메시지를 다시 받지 않고 ack 로 대신한다
+            if connection is sender and connection.fmt != protocol.LEGACY:
+                continue
+            self.enqueue(connection, frame)
+
+    def enqueue(self, connection: Connection, frame: Frame):
+        if connection.closing:
+            return
+        queue = connection.queue
+        if len(queue) >= self.queue_size:
+            # legacy 클라이언트는 배열 프레임을 못 읽어서 coalesce 대신 drop_oldest
+            if self.policy == "drop_oldest" or (self.policy == "coalesce" and connection.fmt == protocol.LEGACY):
+                item = queue.popleft()
+                self.dropped += len(item) if isinstance(item, list) else 1
+            elif self.policy == "coalesce":
+                # 밀린 프레임을 배열 프레임 하나로 합친다 (재인코딩 없이 이어붙임).
+                # 합친 목록도 queue_size 개를 넘지 않도록 오래된 것부터 버린다 - 큐 전체가 프레임 2 x queue_size 개를 넘지 않는다
+                merged: List[Frame] = []
+                while queue:
+                    item = queue.popleft()
+                    if isinstance(item, list):
+                        merged.extend(item)
+                    else:
+                        merged.append(item)
+                if len(merged) > self.queue_size:
+                    self.dropped += len(merged) - self.queue_size
+                    del merged[:-self.queue_size]
+                queue.append(merged)
+                self.coalesced += 1
+            else:
+                connection.closing = True
+                self.evicted += 1
+                asyncio.create_task(self.evict(connection))
+                return
+        queue.append(frame)
+        # 송신 태스크는 처음 보낼 것이 생길 때 만든다 - 조용한 소켓은 태스크 없이 레코드만 차지
+        if connection.sender is None:
+            connection.sender = asyncio.create_task(self.drain(connection))
+        waiter = connection.waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def evict(self, connection: Connection, code: int = SLOW_CONSUMER_CLOSE_CODE, reason: Optional[str] = None):
+        await self.remove(connection)
+        try:
+            await connection.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    async def close_gracefully(self, connection: Connection, code: int, reason: Optional[str] = None, timeout: float = 1.0):
+        """송신 큐에 남은 프레임을 보낸 뒤 닫는다 (timeout 초까지만 기다림)"""
+        deadline = time.monotonic() + timeout
+        while connection.queue and connection.registered and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await self.evict(connection, code, reason)
+
+    async def drain(self, connection: Connection):
+        try:
+            while True:
+                if not connection.queue:
+                    connection.waiter = asyncio.get_running_loop().create_future()
+                    await connection.waiter
+                    connection.waiter = None
+                while connection.queue:
+                    await self.send_frames(connection, self.next_batch(connection))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"WebSocket 전송 오류: {e}")
+            await self.remove(connection)
+
+    def next_batch(self, connection: Connection) -> List[Frame]:
+        item = connection.queue.popleft()
+        frames = item if isinstance(item, list) else [item]
+        # 부하가 걸려 큐에 쌓인 이벤트는 v1 클라이언트에게 한 프레임으로 묶어서 보낸다
+        if connection.fmt != protocol.LEGACY:
+            while connection.queue and len(frames) < protocol.CHAT_WS_BATCH_MAX:
+                item = connection.queue.popleft()
+                frames.extend(item if isinstance(item, list) else [item])
+        return frames
+
+    async def send_frames(self, connection: Connection, frames: List[Frame]):
+        if connection.fmt == protocol.LEGACY and len(frames) == 1:
+            data = frames[0].encode(connection.fmt)
+        else:
+            data = protocol.encode_batch(frames, connection.fmt)
+
+        if isinstance(data, bytes):
+            await connection.websocket.send_bytes(data)
+        else:
+            await connection.websocket.send_text(data)
+        self.frames_sent += 1
+        self.events_sent += len(frames)
+
+    def stats(self) -> dict:
+        rooms = {}
+        for chatRoom_id, connections in self.active_connections.items():
+            depths = [len(c.queue) for c in connections]
+            rooms[chatRoom_id] = {
+                "connections": len(connections),
+                "queued": sum(depths),
+                "maxQueued": max(depths, default=0),
+            }
+        return {
+            "connections": self.total,
+            "rejected": self.rejected,
+            "policy": self.policy,
+            "queueSize": self.queue_size,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "evicted": self.evicted,
+            "pinged": self.pinged,
+            "reaped": self.reaped,
+            "framesSent": self.frames_sent,
+            "eventsSent": self.events_sent,
+            "replayed": self.replayed,
+            "resynced": self.resynced,
+            "signals": self.signals,
+            "signalsDropped": self.signals_dropped,
+            "broker": self.broker.stats(),
+            "presence": self.presence.stats(),
+            "taps": self.taps.stats(),
+            "history": self.history.stats(),
+            "users": len(self.user_connections),
+            "userSockets": sum(len(connections) for connections in self.user_connections.values()),
+            "rooms": rooms,
+        }
+
+
+manager = ConnectionManager()
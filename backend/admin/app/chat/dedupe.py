@@ -0,0 +1,89 @@
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+# 방 하나당 기억하는 최근 클라이언트 메시지 키 수. 넘친 키의 재전송은 DB 유니크 키(ux_Chat_chatRoom_id_user_id_clientKey)가 잡는다
+# (write-behind 모드는 배치를 저장할 때 writer 가 잡아서 remember 로 알려 준다)
+CHAT_DEDUPE_KEYS = int(os.getenv("CHAT_DEDUPE_KEYS", "256"))
+# 키를 들고 있는 최대 방 수. 넘치면 가장 오래 안 쓴 방부터 버린다
+CHAT_DEDUPE_MAX_ROOMS = int(os.getenv("CHAT_DEDUPE_MAX_ROOMS", "1000"))
+# 클라이언트 메시지 키 최대 길이 (Chat.clientKey 컬럼 길이)
+CLIENT_KEY_MAX_LENGTH = 64
+
+Key = Tuple[int, str]
+
+
+class RecentKeys:
+    """방별 최근 (보낸 사람, 클라이언트 메시지 키) -> post_chat 결과.
+    모바일 재전송처럼 같은 키가 다시 오면 저장/전달 없이 처음 결과(chat_id, seq, date)를 그대로 돌려준다.
+    값은 future 라서 처음 요청이 아직 처리 중일 때 온 재전송은 그 결과를 기다린다."""
+
+    def __init__(self, size: int = CHAT_DEDUPE_KEYS, max_rooms: int = CHAT_DEDUPE_MAX_ROOMS):
+        self.size = size
+        self.max_rooms = max_rooms
+        self.rooms: "OrderedDict[int, OrderedDict[Key, asyncio.Future]]" = OrderedDict()
+
+        self.claimed = 0
+        self.hits = 0
+        self.db_hits = 0
+
+    def claim(self, chatRoom_id: int, user_id: int, client_key: str) -> Tuple[asyncio.Future, bool]:
+        """(결과 future, 처음 본 키인지). 처음 본 키면 호출한 쪽이 처리하고 resolve/release 해야 한다"""
+        keys = self.rooms.get(chatRoom_id)
+        if keys is None:
+            keys = self.rooms[chatRoom_id] = OrderedDict()
+            if len(self.rooms) > self.max_rooms:
+                self.rooms.popitem(last=False)
+        else:
+            self.rooms.move_to_end(chatRoom_id)
+
+        key = (user_id, client_key)
+        future = keys.get(key)
+        if future is not None:
+            self.hits += 1
+            return future, False
+
+        future = asyncio.get_running_loop().create_future()
+        keys[key] = future
+        while len(keys) > self.size:
+            keys.popitem(last=False)
+        self.claimed += 1
+        return future, True
+
+    def resolve(self, future: asyncio.Future, result: dict):
+        if not future.done():
+            future.set_result(result)
+
+    def release(self, chatRoom_id: int, user_id: int, client_key: str, future: asyncio.Future):
+        """처리에 실패한 키를 잊는다 - 다음 재전송은 새 메시지로 처리. 기다리던 재전송에는 None 을 돌려준다"""
+        keys = self.rooms.get(chatRoom_id)
+        if keys is not None and keys.get((user_id, client_key)) is future:
+            del keys[(user_id, client_key)]
+        if not future.done():
+            future.set_result(None)
+
+    def remember(self, chatRoom_id: int, user_id: int, client_key: str, result: dict):
+        """write-behind 모드: writer 가 배치를 저장하다 이미 저장된 키를 찾았을 때 - 다음 재전송이 처음 저장된 채팅을 받도록 바꿔 둔다"""
+        keys = self.rooms.get(chatRoom_id)
+        if keys is None:
+            return
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(result)
+        keys[(user_id, client_key)] = future
+        while len(keys) > self.size:
+            keys.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self.rooms),
+            "keys": sum(len(keys) for keys in self.rooms.values()),
+            "claimed": self.claimed,
+            "hits": self.hits,
+            "dbHits": self.db_hits,
+        }
+
+
+recent_keys = RecentKeys()
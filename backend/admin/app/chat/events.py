@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+from dotenv import load_dotenv
+from .broker import create_broker
+from . import protocol
+
+load_dotenv()
+# 구독자(SSE 연결) 하나당 밀려 있을 수 있는 이벤트 수. 넘치면 밀린 것을 버리고 resync 이벤트를 보낸다
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "32"))
+# 프록시/로드밸런서가 조용한 연결을 끊지 않도록 보내는 SSE 주석 간격(초)
+EVENT_KEEPALIVE = float(os.getenv("EVENT_KEEPALIVE", "15"))
+# 연결이 끊겼을 때 브라우저 EventSource 가 재접속까지 기다리는 시간(ms)
+EVENT_RETRY_MS = int(os.getenv("EVENT_RETRY_MS", "3000"))
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    # nginx 가 응답을 버퍼링하면 이벤트가 늦게 도착한다
+    "X-Accel-Buffering": "no",
+}
+
+Event = Tuple[str, str]
+RESYNC: Event = ("resync", json.dumps(protocol.envelope("resync"), separators=(",", ":")))
+
+
+class EventHub:
+    """id(파티 등) 단위 서버 -> 클라이언트 단방향 이벤트 채널 (SSE).
+    이벤트는 protocol.envelope 모양이고, 다른 워커에 붙은 구독자에게는 채팅과 같은 브로커 버스로 전달한다."""
+
+    def __init__(self, prefix: bytes, broker=None, queue_size: int = EVENT_QUEUE_SIZE, keepalive: float = EVENT_KEEPALIVE):
+        self.subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self.broker = broker if broker is not None else create_broker(prefix=prefix, proxy=False)
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    async def start(self):
+        await self.broker.start(self.receive_remote)
+
+    async def close(self):
+        await self.broker.close()
+
+    async def subscribe(self, id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        queues = self.subscribers.setdefault(id, set())
+        queues.add(queue)
+        if len(queues) == 1:
+            await self.broker.subscribe(id)
+        return queue
+
+    async def unsubscribe(self, id: int, queue: asyncio.Queue):
+        queues = self.subscribers.get(id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[id]
+            await self.broker.unsubscribe(id)
+
+    async def publish(self, id: int, type: str, payload: Optional[dict] = None):
+        """DB 커밋이 끝난 뒤에 호출. 전송 실패가 원래 요청을 실패시키지 않도록 예외는 삼킨다"""
+        try:
+            data = json.dumps(protocol.envelope(type, payload), ensure_ascii=False, separators=(",", ":"), default=str)
+            self.published += 1
+            await self.broker.publish(id, data)
+            self.deliver(id, (type, data))
+        except Exception as e:
+            print(f"이벤트 발행 오류: id={id}, type={type}, {e}")
+
+    async def publish_many(self, ids, type: str, payload: Optional[dict] = None):
+        """같은 이벤트를 여러 채널에 - 인코딩은 한 번만 (팀 방 멤버 전원의 채팅방 리스트 등)"""
+        try:
+            data = json.dumps(protocol.envelope(type, payload), ensure_ascii=False, separators=(",", ":"), default=str)
+        except Exception as e:
+            print(f"이벤트 발행 오류: type={type}, {e}")
+            return
+        for id in ids:
+            try:
+                self.published += 1
+                await self.broker.publish(id, data)
+                self.deliver(id, (type, data))
+            except Exception as e:
+                print(f"이벤트 발행 오류: id={id}, type={type}, {e}")
+
+    async def receive_remote(self, id: int, message: str):
+        self.deliver(id, (json.loads(message)["type"], message))
+
+    def deliver(self, id: int, event: Event):
+        for queue in self.subscribers.get(id, ()):
+            if queue.full():
+                # 밀린 이벤트를 버리고 resync 하나로 바꾼다 - 클라이언트는 받으면 현재 상태를 다시 조회
+                while not queue.empty():
+                    queue.get_nowait()
+                    self.dropped += 1
+                queue.put_nowait(RESYNC)
+            queue.put_nowait(event)
+            self.delivered += 1
+
+    async def stream(self, id: int) -> AsyncIterator[str]:
+        """StreamingResponse 에 넘기는 SSE 본문. 클라이언트가 끊으면 제너레이터가 취소되면서 구독이 풀린다"""
+        queue = await self.subscribe(id)
+        try:
+            yield f"retry: {EVENT_RETRY_MS}\n\n"
+            while True:
+                try:
+                    type, data = await asyncio.wait_for(queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if type is None:
+                    # 서버 종료 - data 는 브라우저가 재접속까지 기다릴 시간(ms)
+                    yield f"retry: {data}\n\n"
+                    return
+                yield f"event: {type}\ndata: {data}\n\n"
+        finally:
+            await self.unsubscribe(id, queue)
+
+    def end(self, id: int, queue: asyncio.Queue, retry_ms: int):
+        """구독 하나의 스트림을 끝낸다 (그레이스풀 종료). 종료 표시가 밀려나지 않도록 더 이상 이벤트를 넣지 않고,
+        밀린 이벤트는 버린다 - 클라이언트는 재접속 후 현재 상태를 다시 조회한다"""
+        self.subscribers.get(id, set()).discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait((None, str(retry_ms)))
+
+    def streams(self):
+        return [(id, queue) for id, queues in self.subscribers.items() for queue in queues]
+
+    def stats(self) -> dict:
+        return {
+            "channels": len(self.subscribers),
+            "subscribers": sum(len(queues) for queues in self.subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+def chat_room_channel(party_id: int, user_id: int) -> int:
+    # 브로커 토픽이 정수 id 라서 (파티, 유저) 쌍을 정수 하나로 합친다
+    return (party_id << 32) | user_id
+
+
+# 파티 단위 이벤트: matchStart, partyOn, partyUserOn, team, announcement, presence(접속 중인 유저 변화)
+party_events = EventHub(prefix=b"party:")
+# (파티, 유저) 단위 채팅방 리스트 이벤트: chat, chatRoom, read
+chat_room_events = EventHub(prefix=b"rooms:")
@@ -0,0 +1,288 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+# 금지어 목록 파일 - 한 줄에 하나, "단어<TAB>처리" 로 단어별 처리를 따로 줄 수 있다. # 으로 시작하는 줄은 주석
+CHAT_FILTER_WORDS = os.getenv("CHAT_FILTER_WORDS", "chat_filter_words.txt")
+# 처리를 안 적은 단어의 처리: mask(* 로 가림) / reject(전송 거절) / flag(그대로 보내고 매니저에게 표시)
+CHAT_FILTER_ACTION = os.getenv("CHAT_FILTER_ACTION", "mask")
+# 전화번호처럼 보이는 숫자열의 처리. off 면 검사 안 함
+CHAT_FILTER_CONTACT = os.getenv("CHAT_FILTER_CONTACT", "flag")
+# 목록 파일이 바뀌었는지 확인하는 주기(초) - 바뀌었으면 백그라운드에서 다시 만들어 바꾼다 (메시지 전송 경로에서는 확인하지 않음)
+CHAT_FILTER_RELOAD = float(os.getenv("CHAT_FILTER_RELOAD", "10"))
+# 파티별로 들고 있는 최근 flag 수
+CHAT_FILTER_FLAGS = int(os.getenv("CHAT_FILTER_FLAGS", "200"))
+# flag 를 들고 있는 최대 파티 수. 넘치면 가장 오래 flag 가 없던 파티부터 버린다
+CHAT_FILTER_FLAG_PARTIES = int(os.getenv("CHAT_FILTER_FLAG_PARTIES", "1000"))
+
+MASK = "mask"
+REJECT = "reject"
+FLAG = "flag"
+ACTIONS = (MASK, REJECT, FLAG)
+# 전화번호로 보는 최소 숫자 수 (숫자 사이의 공백, -, . 은 무시)
+CONTACT_DIGITS = 9
+CONTACT_SEPARATORS = " -."
+
+
+class AhoCorasick:
+    """여러 단어를 한 번에 찾는 자동자. 만드는 데 단어 길이 합만큼, 찾는 데 본문 길이 + 찾은 수만큼 걸린다 (단어 수와 무관)"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # 노드에서 끝나는 단어 번호 (fail 로 이어진 짧은 단어 포함)
+        self.out: List[Tuple[int, ...]] = [()]
+        for pattern in patterns:
+            self.add(pattern)
+        self.build()
+
+    def add(self, pattern: str):
+        node = 0
+        for ch in pattern:
+            next_node = self.goto[node].get(ch)
+            if next_node is None:
+                next_node = self.goto[node][ch] = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+            node = next_node
+        self.out[node] += (len(self.patterns),)
+        self.patterns.append(pattern)
+
+    def build(self):
+        # 얕은 노드부터 (BFS) fail 링크를 잇는다
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(ch, 0)
+                self.fail[child] = target if target != child else 0
+                if self.out[self.fail[child]]:
+                    self.out[child] += self.out[self.fail[child]]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """(시작, 끝, 단어 번호). 겹치는 단어도 모두 나온다"""
+        goto, fail, out, patterns = self.goto, self.fail, self.out, self.patterns
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for index in out[node]:
+                    yield i + 1 - len(patterns[index]), i + 1, index
+
+
+def contact_spans(text: str) -> List[Tuple[int, int]]:
+    """전화번호처럼 보이는 구간 (숫자 CONTACT_DIGITS 개 이상, 사이에 구분자 허용)"""
+    spans = []
+    start = end = -1
+    digits = 0
+    for i, ch in enumerate(text):
+        if "0" <= ch <= "9":
+            if digits == 0:
+                start = i
+            digits += 1
+            end = i + 1
+        elif digits and ch in CONTACT_SEPARATORS:
+            continue
+        else:
+            if digits >= CONTACT_DIGITS:
+                spans.append((start, end))
+            digits = 0
+    if digits >= CONTACT_DIGITS:
+        spans.append((start, end))
+    return spans
+
+
+class FilterResult:
+    __slots__ = ("action", "contents", "words", "flagged")
+
+    def __init__(self, action: str, contents: str, words: List[str], flagged: bool):
+        # 가장 강한 처리 (reject > mask > flag)
+        self.action = action
+        # mask 가 적용된 본문
+        self.contents = contents
+        self.words = words
+        # 매니저에게 표시할 단어가 있었는지 (mask 와 같이 걸릴 수 있다)
+        self.flagged = flagged
+
+
+class ChatFilter:
+    """채팅 금지어/연락처 필터. post_chat 이 저장하기 전에 check 를 부른다.
+    목록 파일이 바뀌면 백그라운드 스레드에서 새 자동자를 만들어 통째로 바꾼다 (만드는 중에도 이전 자동자로 검사)"""
+
+    def __init__(
+        self,
+        path: str = CHAT_FILTER_WORDS,
+        action: str = CHAT_FILTER_ACTION,
+        contact: str = CHAT_FILTER_CONTACT,
+        reload_interval: float = CHAT_FILTER_RELOAD,
+        flags_size: int = CHAT_FILTER_FLAGS,
+        flag_parties: int = CHAT_FILTER_FLAG_PARTIES,
+    ):
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown CHAT_FILTER_ACTION: {action}")
+        if contact not in ACTIONS + ("off",):
+            raise ValueError(f"Unknown CHAT_FILTER_CONTACT: {contact}")
+        self.path = path
+        self.action = action
+        self.contact = contact
+        self.reload_interval = reload_interval
+        self.flags_size = flags_size
+        self.flag_parties = flag_parties
+        self.matcher = AhoCorasick(())
+        self.actions: List[str] = []
+        self.mtime: Optional[float] = None
+        self.reloader: Optional[asyncio.Task] = None
+        # 최근에 flag 가 생긴 순서 (앞쪽일수록 오래된 파티)
+        self.flags: "OrderedDict[int, Deque[dict]]" = OrderedDict()
+
+        self.loads = 0
+        self.last_build_ms = 0.0
+        self.checked = 0
+        self.masked = 0
+        self.rejected = 0
+        self.flagged = 0
+
+    async def start(self):
+        await self.reload(force=True)
+        if self.reloader is None:
+            self.reloader = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self.reloader is not None:
+            self.reloader.cancel()
+            try:
+                await self.reloader
+            except asyncio.CancelledError:
+                pass
+            self.reloader = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            await self.reload()
+
+    def load(self, words: Optional[Iterable[str]] = None):
+        """words 를 주면 그 목록으로, 아니면 파일에서 읽어서 자동자를 새로 만든다 (이 스레드에서 바로 - 시작 전이나 벤치마크용)"""
+        self.swap(self.build(words))
+
+    def build(self, words: Optional[Iterable[str]] = None) -> Tuple[AhoCorasick, List[str], float]:
+        """(자동자, 단어별 처리, 만든 시간 ms). 공유 상태를 건드리지 않아서 executor 스레드에서 돌려도 된다"""
+        if words is None:
+            with open(self.path, encoding="utf-8") as f:
+                words = f.read().splitlines()
+        patterns, actions = [], []
+        for line in words:
+            word, _, action = line.partition("\t")
+            word = word.strip().lower()
+            action = action.strip() or self.action
+            if not word or word.startswith("#"):
+                continue
+            if action not in ACTIONS:
+                raise ValueError(f"금지어 처리는 {', '.join(ACTIONS)} 중 하나여야 합니다: {line}")
+            patterns.append(word)
+            actions.append(action)
+
+        start_time = time.perf_counter()
+        matcher = AhoCorasick(patterns)
+        return matcher, actions, (time.perf_counter() - start_time) * 1000
+
+    def swap(self, built: Tuple[AhoCorasick, List[str], float]):
+        # 이벤트 루프 스레드에서 한 번에 바꾼다 - check 가 새 자동자와 이전 처리 목록을 섞어 보는 일이 없다
+        matcher, actions, build_ms = built
+        self.matcher, self.actions = matcher, actions
+        self.last_build_ms = build_ms
+        self.loads += 1
+
+    async def reload(self, force: bool = False):
+        """목록 파일이 바뀌었으면 executor 스레드에서 자동자를 만들어 바꾼다 (만드는 동안 이벤트 루프를 막지 않는다)"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self.mtime and not force:
+            return
+        self.mtime = mtime
+        try:
+            built = await asyncio.get_running_loop().run_in_executor(None, self.build, () if mtime is None else None)
+        except Exception as e:
+            # 잘못된 목록이면 이전 자동자를 계속 쓴다
+            print(f"금지어 목록 로드 오류: {e}")
+            return
+        self.swap(built)
+
+    def check(self, text: str) -> Optional[FilterResult]:
+        """걸린 게 없으면 None"""
+        self.checked += 1
+        folded = text.lower()
+        if len(folded) != len(text):
+            # 소문자로 바꾸면 길이가 달라지는 문자가 있으면 위치가 어긋나므로 원문으로 찾는다
+            folded = text
+
+        spans: List[Tuple[int, int, str]] = []
+        words: List[str] = []
+        for start, end, index in self.matcher.finditer(folded):
+            spans.append((start, end, self.actions[index]))
+            words.append(self.matcher.patterns[index])
+        if self.contact != "off":
+            for start, end in contact_spans(text):
+                spans.append((start, end, self.contact))
+                words.append(text[start:end])
+        if not spans:
+            return None
+
+        actions: Set[str] = {action for _, _, action in spans}
+        flagged = FLAG in actions
+        if REJECT in actions:
+            self.rejected += 1
+            return FilterResult(REJECT, text, words, flagged)
+        if MASK in actions:
+            chars = list(text)
+            for start, end, action in spans:
+                if action == MASK:
+                    chars[start:end] = "*" * (end - start)
+            self.masked += 1
+            return FilterResult(MASK, "".join(chars), words, flagged)
+        return FilterResult(FLAG, text, words, flagged)
+
+    def flag(self, party_id: int, record: dict):
+        self.flagged += 1
+        flags = self.flags.get(party_id)
+        if flags is None:
+            flags = self.flags[party_id] = deque(maxlen=self.flags_size)
+            while len(self.flags) > self.flag_parties:
+                self.flags.popitem(last=False)
+        else:
+            self.flags.move_to_end(party_id)
+        flags.append(record)
+
+    def recent_flags(self, party_id: int) -> List[dict]:
+        return list(reversed(self.flags.get(party_id, ())))
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "patterns": len(self.matcher.patterns),
+            "nodes": len(self.matcher.goto),
+            "loads": self.loads,
+            "lastBuildMs": round(self.last_build_ms, 3),
+            "checked": self.checked,
+            "masked": self.masked,
+            "rejected": self.rejected,
+            "flagged": self.flagged,
+            "flagParties": len(self.flags),
+        }
+
+
+chat_filter = ChatFilter()
@@ -0,0 +1,209 @@
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+# 방 하나당 메모리에 들고 있는 최근 메시지 수
+CHAT_HISTORY_SIZE = int(os.getenv("CHAT_HISTORY_SIZE", "100"))
+# 버퍼를 들고 있는 최대 방 수. 넘치면 가장 오래 안 쓴 방부터 버린다 (메모리 상한 = 방 수 x 메시지 수)
+CHAT_HISTORY_MAX_ROOMS = int(os.getenv("CHAT_HISTORY_MAX_ROOMS", "1000"))
+# 이 시간(초) 동안 메시지도 조회도 없던 방의 버퍼는 버린다
+CHAT_HISTORY_IDLE = float(os.getenv("CHAT_HISTORY_IDLE", "1800"))
+
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+class ChatMessage:
+    __slots__ = ("id", "user_id", "contents", "date", "seq")
+
+    def __init__(self, id: int, user_id: int, contents: str, date: str, seq: Optional[int] = None):
+        self.id = id
+        self.user_id = user_id
+        self.contents = contents
+        self.date = date
+        self.seq = seq
+
+    def as_row(self) -> dict:
+        """/user/chat/contents 응답 모양"""
+        return {"id": self.id, "user_id": self.user_id, "contents": self.contents, "date": self.date, "seq": self.seq}
+
+    def as_payload(self, chatRoom_id: int) -> dict:
+        """웹소켓 chat 이벤트 payload 모양"""
+        return {
+            "user_id": self.user_id,
+            "chatRoom_id": chatRoom_id,
+            "chat_id": self.id,
+            "content": self.contents,
+            "date": self.date,
+            "seq": self.seq,
+        }
+
+
+class RoomBuffer:
+    """방의 최근 메시지. messages 는 빠진 메시지 없이 이어진 구간이고 id 오름차순이다 (늦게 도착한 메시지는 id 순 자리에 끼운다)."""
+
+    __slots__ = ("messages", "complete", "last_used", "servable_at")
+
+    def __init__(self, size: int):
+        self.messages: Deque[ChatMessage] = deque(maxlen=size)
+        # DB 에서 채울 때 방의 전체 기록이 버퍼에 다 들어왔으면 True (앞쪽에 더 없음)
+        self.complete = False
+        self.last_used = time.monotonic()
+        # 이 시각(monotonic) 전에는 버퍼로 응답하지 않는다 - 구독 전에 다른 워커가 응답하고 아직 DB 에 저장 안 한 메시지가
+        # DB 조회에도 버스에도 없을 수 있다 (write-behind 모드, 배치 간격만큼)
+        self.servable_at = 0.0
+
+
+class ChatHistory:
+    def __init__(
+        self,
+        size: int = CHAT_HISTORY_SIZE,
+        max_rooms: int = CHAT_HISTORY_MAX_ROOMS,
+        idle: float = CHAT_HISTORY_IDLE,
+    ):
+        self.size = size
+        self.max_rooms = max_rooms
+        self.idle = idle
+        # 최근에 쓴 순서 (앞쪽일수록 오래 안 쓴 방)
+        self.rooms: "OrderedDict[int, RoomBuffer]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def touch(self, chatRoom_id: int) -> Optional[RoomBuffer]:
+        buffer = self.rooms.get(chatRoom_id)
+        if buffer is not None:
+            buffer.last_used = time.monotonic()
+            self.rooms.move_to_end(chatRoom_id)
+        return buffer
+
+    def append(self, chatRoom_id: int, message: ChatMessage) -> bool:
+        """브로드캐스트되는 메시지마다 호출. 이 방의 버퍼를 새로 만들었으면 True"""
+        buffer = self.touch(chatRoom_id)
+        created = buffer is None
+        if created:
+            buffer = self.rooms[chatRoom_id] = RoomBuffer(self.size)
+        messages = buffer.messages
+        if not messages or message.id > messages[-1].id:
+            if len(messages) == messages.maxlen:
+                buffer.complete = False
+            messages.append(message)
+            return created
+
+        # id 순서보다 늦게 도착한 메시지 - id 를 먼저 받고 저장을 기다린 요청이나, 같은 ms 에 워커 번호가 작은 다른 워커의 메시지.
+        # 대부분 끝 근처라 뒤에서부터 자리를 찾는다
+        index = len(messages)
+        while index > 0 and messages[index - 1].id > message.id:
+            index -= 1
+        if index > 0 and messages[index - 1].id == message.id:
+            return created
+        if len(messages) == messages.maxlen:
+            buffer.complete = False
+            if index == 0:
+                # 버퍼에 남은 것보다 오래된 메시지 - 담을 자리가 없다 (그 이전 구간은 DB 로 조회)
+                return created
+            messages.popleft()
+            index -= 1
+        messages.insert(index, message)
+        return created
+
+    def reserve(self, chatRoom_id: int, delay: float = 0.0) -> bool:
+        """DB 조회 전에 빈 버퍼를 만든다 (버스 구독을 먼저 해서 조회 중에 온 메시지를 담도록). 버퍼를 새로 만들었으면 True.
+        새 버퍼는 delay 초가 지나야 응답에 쓴다"""
+        buffer = self.touch(chatRoom_id)
+        if buffer is not None:
+            return False
+        buffer = self.rooms[chatRoom_id] = RoomBuffer(self.size)
+        buffer.servable_at = time.monotonic() + delay
+        return True
+
+    def seed(self, chatRoom_id: int, rows: List[ChatMessage], limit: int, delay: float = 0.0) -> bool:
+        """DB 에서 읽은 최신 limit 개(최신순)로 버퍼 앞쪽을 채운다. 버퍼를 새로 만들었으면 True (reserve 뒤에 밀려난 경우)"""
+        buffer = self.touch(chatRoom_id)
+        created = buffer is None
+        if created:
+            buffer = self.rooms[chatRoom_id] = RoomBuffer(self.size)
+            buffer.servable_at = time.monotonic() + delay
+
+        # 아직 DB 에 반영 안 된(write-behind) 최신 메시지가 버퍼에 있을 수 있어서 id 로 합친다
+        merged: Dict[int, ChatMessage] = {message.id: message for message in rows}
+        for message in buffer.messages:
+            merged[message.id] = message
+        ordered = sorted(merged.values(), key=lambda message: message.id)
+        buffer.messages = deque(ordered[-self.size:], maxlen=self.size)
+        buffer.complete = len(rows) < limit and len(ordered) <= self.size
+        return created
+
+    def page(self, chatRoom_id: int, limit: int, before: Optional[int] = None) -> Optional[List[ChatMessage]]:
+        """before 보다 오래된 메시지 중 최신 limit 개 (오름차순). 버퍼로 다 채울 수 없으면 None"""
+        buffer = self.touch(chatRoom_id)
+        if buffer is None or buffer.servable_at > time.monotonic():
+            self.misses += 1
+            return None
+        messages = [m for m in buffer.messages if before is None or m.id < before]
+        if len(messages) >= limit:
+            self.hits += 1
+            return messages[-limit:]
+        if buffer.complete:
+            self.hits += 1
+            return messages
+        self.misses += 1
+        return None
+
+    def since(self, chatRoom_id: int, last_id: int) -> Optional[List[ChatMessage]]:
+        """last_id 이후 메시지 (오름차순). 사이에 버퍼 밖의 메시지가 있을 수 있으면 None"""
+        buffer = self.touch(chatRoom_id)
+        if buffer is None or buffer.servable_at > time.monotonic():
+            self.misses += 1
+            return None
+        messages = buffer.messages
+        if buffer.complete or (messages and last_id >= messages[0].id):
+            self.hits += 1
+            return [m for m in messages if m.id > last_id]
+        self.misses += 1
+        return None
+
+    def after(self, chatRoom_id: int, last_id: int) -> List[ChatMessage]:
+        """버퍼에 있는 last_id 이후 메시지 (오름차순, 빠진 것이 있을 수 있음) - DB 조회 결과와 합칠 때"""
+        buffer = self.rooms.get(chatRoom_id)
+        if buffer is None:
+            return []
+        return [m for m in buffer.messages if m.id > last_id]
+
+    def find(self, chatRoom_id: int, chat_id: int) -> Optional[ChatMessage]:
+        buffer = self.rooms.get(chatRoom_id)
+        if buffer is None:
+            return None
+        # 최근 메시지를 찾는 경우가 대부분이라 뒤에서부터
+        for message in reversed(buffer.messages):
+            if message.id == chat_id:
+                return message
+            if message.id < chat_id:
+                break
+        return None
+
+    def evict(self, now: float) -> List[int]:
+        """최대 방 수를 넘었거나 오래 안 쓴 방의 버퍼를 버리고 그 방 번호를 돌려준다"""
+        evicted = []
+        while self.rooms:
+            chatRoom_id, buffer = next(iter(self.rooms.items()))
+            if len(self.rooms) <= self.max_rooms and buffer.last_used + self.idle > now:
+                break
+            del self.rooms[chatRoom_id]
+            evicted.append(chatRoom_id)
+        self.evicted += len(evicted)
+        return evicted
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self.rooms),
+            "messages": sum(len(buffer.messages) for buffer in self.rooms.values()),
+            "size": self.size,
+            "maxRooms": self.max_rooms,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
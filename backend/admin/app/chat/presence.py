@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Dict, Optional, Set
+from dotenv import load_dotenv
+from .broker import create_broker
+from .events import party_events
+
+load_dotenv()
+# 워커마다 이 간격(초)으로 자기 워커의 접속 현황 전체를 다른 워커에 보낸다 (새로 뜬 워커가 현황을 받고, 죽은 워커를 가려내도록)
+CHAT_PRESENCE_SYNC = float(os.getenv("CHAT_PRESENCE_SYNC", "15"))
+# 이 횟수만큼 현황을 못 받은 워커는 죽은 것으로 보고 그 워커의 접속 유저를 지운다
+CHAT_PRESENCE_MISSES = 3
+
+# 접속 현황 버스는 토픽 하나 - 워커는 모든 파티의 변화를 받는다
+PRESENCE_TOPIC = 0
+
+
+class Presence:
+    """파티별 접속 중인 유저. ConnectionManager 가 소켓을 등록/해제할 때 같이 세고 DB 는 건드리지 않는다.
+    유저의 첫 소켓이 붙거나 마지막 소켓이 떨어질 때 다른 워커에 변화를 보내고, 파티 전체로 접속 상태가 바뀌었으면
+    파티 이벤트 채널로 presence 이벤트를 보낸다.
+    다른 워커의 현황은 전용 버스로 받는다 - 변화(접속/해제)와 sync 간격마다 보내는 워커별 전체 현황"""
+
+    def __init__(self, hub=party_events, broker=None, sync_interval: float = CHAT_PRESENCE_SYNC):
+        # party_id -> user_id -> 이 워커에 붙은 소켓 수 (방 단위 소켓 + 유저 소켓)
+        self.parties: Dict[int, Dict[int, int]] = {}
+        # 다른 워커 -> party_id -> 그 워커에 붙은 user_id
+        self.remote: Dict[str, Dict[int, Set[int]]] = {}
+        # 다른 워커에게서 마지막으로 받은 시각
+        self.seen: Dict[str, float] = {}
+        self.hub = hub
+        self.broker = broker if broker is not None else create_broker(prefix=b"presence:", proxy=False)
+        self.origin = uuid.uuid4().hex
+        self.sync_interval = sync_interval
+        self.syncer: Optional[asyncio.Task] = None
+
+        self.joined = 0
+        self.left = 0
+        self.expired = 0
+
+    async def start(self):
+        await self.broker.start(self.receive_remote)
+        await self.broker.subscribe(PRESENCE_TOPIC)
+        # 처음 보내는 현황을 받은 워커들이 자기 현황으로 답한다
+        await self.sync()
+        self.syncer = asyncio.create_task(self.run_sync())
+
+    async def close(self):
+        if self.syncer is not None:
+            self.syncer.cancel()
+            try:
+                await self.syncer
+            except asyncio.CancelledError:
+                pass
+            self.syncer = None
+            # 다른 워커가 이 워커의 유저를 바로 지운다 (재접속한 워커에서 다시 세어진다)
+            await self.send({"bye": True})
+        await self.broker.close()
+
+    def add(self, party_id: int, user_id: int) -> bool:
+        """처음 접속한 소켓이면 True"""
+        users = self.parties.setdefault(party_id, {})
+        count = users.get(user_id, 0)
+        users[user_id] = count + 1
+        if count == 0:
+            self.joined += 1
+        return count == 0
+
+    def discard(self, party_id: int, user_id: int) -> bool:
+        """마지막 소켓이 떨어졌으면 True"""
+        users = self.parties.get(party_id)
+        if users is None or user_id not in users:
+            return False
+        count = users[user_id] - 1
+        if count > 0:
+            users[user_id] = count
+            return False
+        del users[user_id]
+        if not users:
+            del self.parties[party_id]
+        self.left += 1
+        return True
+
+    def online(self, party_id: int) -> Set[int]:
+        users = set(self.parties.get(party_id, ()))
+        for parties in self.remote.values():
+            users.update(parties.get(party_id, ()))
+        return users
+
+    def is_online(self, party_id: int, user_id: int) -> bool:
+        return user_id in self.parties.get(party_id, ()) or self.remote_online(party_id, user_id)
+
+    def remote_online(self, party_id: int, user_id: int) -> bool:
+        return any(user_id in parties.get(party_id, ()) for parties in self.remote.values())
+
+    async def announce(self, party_id: int, user_id: int, online: bool):
+        """이 워커에서 유저의 첫 소켓/마지막 소켓일 때. 다른 워커에도 붙어 있으면 파티 전체로는 변화가 없어서 이벤트를 보내지 않는다"""
+        await self.send({"party_id": party_id, "user_id": user_id, "online": online})
+        if self.remote_online(party_id, user_id):
+            return
+        await self.hub.publish(party_id, "presence", {"party_id": party_id, "user_id": user_id, "online": online})
+
+    async def send(self, message: dict):
+        try:
+            await self.broker.publish(PRESENCE_TOPIC, json.dumps({"worker": self.origin, **message}, separators=(",", ":")))
+        except Exception as e:
+            print(f"접속 현황 전송 오류: {e}")
+
+    async def sync(self):
+        await self.send({"parties": {party_id: list(users) for party_id, users in self.parties.items()}})
+
+    async def run_sync(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                self.expire(time.monotonic())
+                await self.sync()
+            except Exception as e:
+                print(f"접속 현황 sync 오류: {e}")
+
+    async def receive_remote(self, topic: int, message: str):
+        data = json.loads(message)
+        worker = data["worker"]
+        if worker == self.origin:
+            return
+        if data.get("bye"):
+            self.remote.pop(worker, None)
+            self.seen.pop(worker, None)
+            return
+        first = worker not in self.seen
+        self.seen[worker] = time.monotonic()
+        if "parties" in data:
+            self.remote[worker] = {int(party_id): set(users) for party_id, users in data["parties"].items() if users}
+        else:
+            users = self.remote.setdefault(worker, {}).setdefault(data["party_id"], set())
+            if data["online"]:
+                users.add(data["user_id"])
+            else:
+                users.discard(data["user_id"])
+                if not users:
+                    del self.remote[worker][data["party_id"]]
+        # 처음 보는 워커(새로 떴거나 이 워커가 새로 떴을 때)에는 다음 sync 를 기다리지 않고 현황을 보낸다
+        if first:
+            await self.sync()
+
+    def expire(self, now: float):
+        deadline = now - self.sync_interval * CHAT_PRESENCE_MISSES
+        for worker in [worker for worker, seen in self.seen.items() if seen < deadline]:
+            del self.seen[worker]
+            self.remote.pop(worker, None)
+            self.expired += 1
+
+    def stats(self) -> dict:
+        return {
+            "parties": len(self.parties),
+            "online": sum(len(users) for users in self.parties.values()),
+            "joined": self.joined,
+            "left": self.left,
+            "remoteWorkers": len(self.seen),
+            "remoteOnline": sum(len(users) for parties in self.remote.values() for users in parties.values()),
+            "expired": self.expired,
+        }
@@ -0,0 +1,119 @@
+import json
+import os
+from typing import List, Optional, Sequence, Tuple, Union
+
+import msgpack
+from dotenv import load_dotenv
+
+load_dotenv()
+# 한 프레임에 묶어 보낼 최대 이벤트 수 (v1 클라이언트만)
+CHAT_WS_BATCH_MAX = int(os.getenv("CHAT_WS_BATCH_MAX", "50"))
+
+VERSION = 1
+
+# legacy: 서브프로토콜 없이 붙은 기존 클라이언트 - 원문 텍스트 수신, 채팅 payload 만 JSON 으로 송신
+LEGACY = "legacy"
+JSON = "json"
+MSGPACK = "msgpack"
+
+SUBPROTOCOLS = {
+    "pirates.chat.v1.msgpack": MSGPACK,
+    "pirates.chat.v1.json": JSON,
+}
+
+# 클라이언트 -> 서버: chat, typing, pong, subscribe/unsubscribe(유저 소켓만)
+# 서버 -> 클라이언트: chat, typing, ack, error, ping, resync(놓친 메시지를 다시 조회해야 함)
+#   {"v": 1, "type": "chat", "id": "<클라이언트 메시지 id>", "payload": {"content": "...", "clientKey": "<uuid>"}}
+#   clientKey(선택)는 재전송해도 바뀌지 않는 메시지 키 - 같은 키로 다시 보내면 저장/전달 없이 처음 chat_id 로 ack 한다
+#   {"v": 1, "type": "ack", "ack": "<클라이언트 메시지 id>", "payload": {"chat_id": 123}}
+#   {"v": 1, "type": "error", "ack": "<클라이언트 메시지 id>", "payload": {"msg": "...", "code": "rate_limited", "retryAfter": 200}}
+# typing 은 저장하지 않고 방의 다른 v1 소켓에만 전달한다 (legacy 클라이언트는 보내지도 받지도 않음)
+#   {"v": 1, "type": "typing", "payload": {"typing": true}}  -> {"v": 1, "type": "typing", "payload": {"chatRoom_id": 1, "user_id": 2, "typing": true}}
+#   입력 중에는 CHAT_TYPING_INTERVAL 초마다 true 를 다시 보내고, 받는 쪽은 그 몇 배 동안 새 신호가 없으면 (끊긴 경우 포함) 끝난 것으로 본다
+# 유저 소켓(/user/ws/{user_id})에서는 방을 payload 의 chatRoom_id 로 지정한다
+#   {"v": 1, "type": "subscribe", "id": "...", "payload": {"chatRoom_id": 1, "lastChat_id": 123}}
+#   {"v": 1, "type": "chat", "id": "...", "payload": {"chatRoom_id": 1, "content": "..."}}
+# 여러 이벤트를 한 프레임에 보낼 때는 envelope 배열로 보낸다
+
+
+def envelope(type: str, payload: Optional[dict] = None, id=None, ack=None) -> dict:
+    event = {"v": VERSION, "type": type}
+    if id is not None:
+        event["id"] = id
+    if ack is not None:
+        event["ack"] = ack
+    if payload is not None:
+        event["payload"] = payload
+    return event
+
+
+def negotiate(requested: Sequence[str]) -> Tuple[Optional[str], str]:
+    for subprotocol in requested:
+        if subprotocol in SUBPROTOCOLS:
+            return subprotocol, SUBPROTOCOLS[subprotocol]
+    return None, LEGACY
+
+
+def encode(event: dict, fmt: str) -> Union[str, bytes]:
+    if fmt == MSGPACK:
+        return msgpack.packb(event, use_bin_type=True)
+    if fmt == JSON:
+        return json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+
+    # legacy 클라이언트가 이미 쓰고 있는 모양 유지
+    payload = event.get("payload") or {}
+    if event["type"] == "chat":
+        return json.dumps(payload, ensure_ascii=False)
+    if event["type"] == "error":
+        return payload.get("msg", "")
+    return json.dumps({"type": event["type"], **payload}, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode(fmt: str, message: dict) -> dict:
+    """ASGI websocket.receive 메시지를 envelope 로 변환"""
+    if fmt == LEGACY:
+        text = message.get("text")
+        if text is None:
+            raise ValueError("legacy 클라이언트는 텍스트 프레임만 보낼 수 있습니다")
+        if text == encode(envelope("pong"), LEGACY):
+            return envelope("pong")
+        return envelope("chat", payload={"content": text})
+
+    if fmt == MSGPACK:
+        data = message.get("bytes")
+        event = msgpack.unpackb(data, raw=False) if data is not None else json.loads(message.get("text"))
+    else:
+        data = message.get("text")
+        event = json.loads(data) if data is not None else json.loads(message.get("bytes"))
+
+    if not isinstance(event, dict) or "type" not in event:
+        raise ValueError("잘못된 메시지 형식입니다")
+    if event.get("v", VERSION) != VERSION:
+        raise ValueError(f"지원하지 않는 프로토콜 버전입니다: {event.get('v')}")
+    return event
+
+
+class Frame:
+    """브로드캐스트 이벤트 하나. 포맷별 인코딩은 처음 필요할 때 한 번만 하고 모든 소켓이 같은 결과를 공유한다."""
+
+    __slots__ = ("event", "encoded")
+
+    def __init__(self, event: dict):
+        self.event = event
+        self.encoded = {}
+
+    def encode(self, fmt: str) -> Union[str, bytes]:
+        data = self.encoded.get(fmt)
+        if data is None:
+            data = self.encoded[fmt] = encode(self.event, fmt)
+        return data
+
+
+def encode_batch(frames: List[Frame], fmt: str) -> Union[str, bytes]:
+    """이미 인코딩된 이벤트들을 재인코딩 없이 배열 프레임 하나로 잇는다"""
+    if len(frames) == 1 and fmt != LEGACY:
+        return frames[0].encode(fmt)
+    if fmt == MSGPACK:
+        packer = msgpack.Packer(use_bin_type=True)
+        return packer.pack_array_header(len(frames)) + b"".join(frame.encode(fmt) for frame in frames)
+    return "[" + ",".join(frame.encode(fmt) for frame in frames) + "]"
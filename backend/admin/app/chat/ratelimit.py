@@ -0,0 +1,91 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+# 유저 한 명이 보낼 수 있는 채팅 수 (초당 rate 개씩 채워지고 최대 burst 개까지 몰아서 보낼 수 있다). rate 0 이면 제한 없음
+CHAT_USER_RATE = float(os.getenv("CHAT_USER_RATE", "5"))
+CHAT_USER_BURST = float(os.getenv("CHAT_USER_BURST", "10"))
+# 방 하나에 들어오는 채팅 수 (방의 모든 참여자 합계)
+CHAT_ROOM_RATE = float(os.getenv("CHAT_ROOM_RATE", "10"))
+CHAT_ROOM_BURST = float(os.getenv("CHAT_ROOM_BURST", "20"))
+# 버킷을 들고 있는 최대 유저/방 수. 넘치면 가장 오래 안 쓴 것부터 버린다 (버려진 버킷은 가득 찬 상태로 다시 시작)
+CHAT_RATE_MAX_KEYS = int(os.getenv("CHAT_RATE_MAX_KEYS", "100000"))
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """키(유저 id, 방 id) 별 토큰 버킷. 워커 프로세스 안에서만 센다 - 워커가 N 개면 전체 한도는 최대 N 배"""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = CHAT_RATE_MAX_KEYS):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self.limited = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def refill(self, key: int, now: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.burst, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return bucket
+        self.buckets.move_to_end(key)
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+        return bucket
+
+    def retry_after(self, bucket: TokenBucket) -> float:
+        """토큰 하나가 찰 때까지 남은 시간(초)"""
+        return max(1 - bucket.tokens, 0) / self.rate
+
+    def stats(self) -> dict:
+        return {"rate": self.rate, "burst": self.burst, "keys": len(self.buckets), "limited": self.limited}
+
+
+class ChatRateLimit:
+    """채팅 전송(웹소켓 chat 프레임, POST /user/chat) 한도. DB 에 닿기 전에 호출해서 넘친 메시지는 바로 버린다.
+    유저 버킷과 방 버킷 둘 다 토큰이 있을 때만 둘 다에서 하나씩 뺀다 (한쪽에서 막힌 메시지가 다른 쪽 토큰을 쓰지 않게)"""
+
+    def __init__(self, user: Optional[RateLimiter] = None, room: Optional[RateLimiter] = None):
+        self.user = user if user is not None else RateLimiter(CHAT_USER_RATE, CHAT_USER_BURST)
+        self.room = room if room is not None else RateLimiter(CHAT_ROOM_RATE, CHAT_ROOM_BURST)
+        self.allowed = 0
+
+    def check(self, user_id: int, chatRoom_id: Optional[int] = None) -> Tuple[bool, float]:
+        """(보내도 되는지, 막혔으면 다시 보내도 되는 때까지 남은 초)"""
+        now = time.monotonic()
+        limiters = []
+        if self.user.enabled:
+            limiters.append((self.user, self.user.refill(user_id, now)))
+        if chatRoom_id is not None and self.room.enabled:
+            limiters.append((self.room, self.room.refill(chatRoom_id, now)))
+
+        for limiter, bucket in limiters:
+            if bucket.tokens < 1:
+                limiter.limited += 1
+                return False, limiter.retry_after(bucket)
+        for _, bucket in limiters:
+            bucket.tokens -= 1
+        self.allowed += 1
+        return True, 0.0
+
+    def stats(self) -> dict:
+        return {"allowed": self.allowed, "user": self.user.stats(), "room": self.room.stats()}
+
+
+chat_rate_limit = ChatRateLimit()
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.mysql import insert
+
+from ..db import database
+from ..db.errorLog import format_dates, log_error
+from ..utils import models
+
+load_dotenv()
+# 읽음 상태(ChatReadStatus) 저장 주기(초). 0 이면 요청마다 바로 저장 (기존 방식)
+CHAT_READ_FLUSH_INTERVAL = float(os.getenv("CHAT_READ_FLUSH_INTERVAL", "3"))
+# 저장이 끝난 읽음 상태를 메모리에 들고 있는 최대 (방, 유저) 수 - 같은 값이 다시 들어오면 저장을 건너뛴다
+CHAT_READ_CACHE_SIZE = int(os.getenv("CHAT_READ_CACHE_SIZE", "10000"))
+CHAT_READ_RETRY = int(os.getenv("CHAT_READ_RETRY", "3"))
+
+Key = Tuple[int, int]
+
+
+class ReadReceipt:
+    __slots__ = ("chat_id", "seq", "date")
+
+    def __init__(self, chat_id: Optional[int], seq: int, date: datetime):
+        self.chat_id = chat_id
+        self.seq = seq
+        self.date = date
+
+    def newer_than(self, other: "ReadReceipt") -> bool:
+        if self.seq and other.seq and self.seq != other.seq:
+            return self.seq > other.seq
+        # 순번을 모르는 채팅(seq 0)이 끼면 snowflake id 로 비교
+        return (self.chat_id or 0) > (other.chat_id or 0)
+
+
+class ReadReceipts:
+    """(방, 유저) 별 마지막 읽은 채팅. 스크롤할 때마다 들어오는 /user/chat/lastReadChat 을 메모리에서 최댓값만 남기고
+    interval 마다 바뀐 것만 한 번의 multi-row upsert 로 저장한다.
+    요청에서 순번을 모르면(seq 0) 저장할 때 배치의 채팅 id 를 모아 한 번에 찾는다 - 요청마다 조회하지 않는다."""
+
+    def __init__(
+        self,
+        interval: float = CHAT_READ_FLUSH_INTERVAL,
+        cache_size: int = CHAT_READ_CACHE_SIZE,
+        retry: int = CHAT_READ_RETRY,
+    ):
+        self.interval = interval
+        self.cache_size = cache_size
+        self.retry = retry
+        # 아직 저장 안 된 읽음 상태
+        self.pending: Dict[Key, ReadReceipt] = {}
+        # 저장이 끝난 읽음 상태 (최근에 쓴 순서)
+        self.flushed: "OrderedDict[Key, ReadReceipt]" = OrderedDict()
+        self.flusher: Optional[asyncio.Task] = None
+        # 종료 표시 - flusher 를 취소하지 않고 하던 flush 를 끝낸 뒤 멈추게 한다
+        self.stopping: Optional[asyncio.Event] = None
+
+        self.marked = 0
+        self.skipped = 0
+        self.flushed_rows = 0
+        self.flushed_batches = 0
+        self.failed_rows = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    async def start(self):
+        if self.enabled and self.flusher is None:
+            self.stopping = asyncio.Event()
+            self.flusher = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self.flusher is not None:
+            # 취소하면 꺼내 놓고 저장 중이던 배치가 사라진다 - 하던 flush 가 끝날 때까지 기다린다
+            self.stopping.set()
+            await self.flusher
+            self.flusher = None
+        # 남은 읽음 상태를 모두 저장하고 종료
+        await self.flush()
+
+    async def run(self):
+        while not self.stopping.is_set():
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+    def get(self, chatRoom_id: int, user_id: int) -> Optional[ReadReceipt]:
+        key = (chatRoom_id, user_id)
+        receipt = self.pending.get(key)
+        if receipt is None:
+            receipt = self.flushed.get(key)
+        return receipt
+
+    async def mark(self, chatRoom_id: int, user_id: int, chat_id: Optional[int], seq: Optional[int]) -> bool:
+        """읽음 위치를 올린다. 이미 알고 있는 위치보다 앞이 아니면 아무것도 안 하고 False"""
+        receipt = ReadReceipt(chat_id, seq or 0, format_dates(datetime.now()))
+        current = self.get(chatRoom_id, user_id)
+        if current is not None and not receipt.newer_than(current):
+            self.skipped += 1
+            return False
+        self.marked += 1
+        self.pending[(chatRoom_id, user_id)] = receipt
+        if not self.enabled:
+            await self.flush([(chatRoom_id, user_id)])
+        return True
+
+    async def flush(self, keys: Optional[Iterable[Key]] = None):
+        """keys 를 주면 그 (방, 유저)만 (소켓이 끊길 때), 아니면 쌓인 것을 모두 저장"""
+        if keys is None:
+            batch, self.pending = self.pending, {}
+        else:
+            batch = {key: self.pending.pop(key) for key in keys if key in self.pending}
+        if not batch:
+            return
+
+        start_time = time.perf_counter()
+        try:
+            for attempt in range(max(self.retry, 1)):
+                async with database.ChatSessionLocal() as db:
+                    try:
+                        await self.resolve_seqs(db, batch)
+                        await db.execute(self.upsert(self.rows(batch)))
+                        await db.commit()
+                        break
+                    except Exception as e:
+                        await db.rollback()
+                        print(f"읽음 상태 저장 오류 ({attempt + 1}/{self.retry}): {e}")
+                        if attempt + 1 >= self.retry:
+                            await log_error(db, str(e))
+                            self.failed_rows += len(batch)
+                            self.requeue(batch)
+                            return
+                await asyncio.sleep(0.1 * (attempt + 1))
+        except asyncio.CancelledError:
+            # 저장 중에 취소되면(요청 취소 등) 꺼낸 배치를 돌려 놓는다 - commit 됐어도 다시 저장하면 같은 값
+            self.requeue(batch)
+            raise
+
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        self.flushed_rows += len(batch)
+        self.flushed_batches += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+
+        for key, receipt in batch.items():
+            self.flushed[key] = receipt
+            self.flushed.move_to_end(key)
+        while len(self.flushed) > self.cache_size:
+            self.flushed.popitem(last=False)
+
+    def requeue(self, batch: Dict[Key, ReadReceipt]):
+        """저장에 실패한 읽음 상태를 다음 flush 로 돌린다. 그 사이에 더 최근 위치가 들어온 (방, 유저)는 그것을 남긴다"""
+        for key, receipt in batch.items():
+            current = self.pending.get(key)
+            if current is None or receipt.newer_than(current):
+                self.pending[key] = receipt
+
+    @staticmethod
+    async def resolve_seqs(db, batch: Dict[Key, ReadReceipt]):
+        """순번을 모르는 읽음 상태의 채팅 순번을 쿼리 한 번으로 채운다 (아직 DB 에 없는 채팅은 0 으로 둔다)"""
+        chat_ids = {receipt.chat_id for receipt in batch.values() if not receipt.seq and receipt.chat_id is not None}
+        if not chat_ids:
+            return
+        result = await db.execute(select(models.Chat.id, models.Chat.seq).where(models.Chat.id.in_(chat_ids)))
+        seqs = {row.id: row.seq for row in result}
+        for receipt in batch.values():
+            if not receipt.seq and receipt.chat_id in seqs:
+                receipt.seq = seqs[receipt.chat_id] or 0
+
+    @staticmethod
+    def rows(batch: Dict[Key, ReadReceipt]) -> List[dict]:
+        return [
+            {
+                "chatRoom_id": chatRoom_id,
+                "user_id": user_id,
+                "lastReadChat_id": receipt.chat_id,
+                "lastReadSeq": receipt.seq,
+                "date": receipt.date,
+            }
+            for (chatRoom_id, user_id), receipt in batch.items()
+        ]
+
+    @staticmethod
+    def upsert(rows: List[dict]):
+        """(chatRoom_id, user_id) 유니크 키 기준 upsert. 읽음 위치는 뒤로 가지 않는다
+        (다른 워커가 더 최근 위치를 먼저 저장했거나, 메시지를 보내면서 lastReadSeq 가 올라간 경우)"""
+        stmt = insert(models.ChatReadStatus).values(rows)
+        table = models.ChatReadStatus
+        newer = stmt.inserted.lastReadSeq >= table.lastReadSeq
+        # MySQL 은 SET 을 왼쪽부터 적용하므로 lastReadSeq 를 비교에 쓰는 컬럼을 먼저 둔다
+        return stmt.on_duplicate_key_update([
+            ("lastReadChat_id", case((newer, stmt.inserted.lastReadChat_id), else_=table.lastReadChat_id)),
+            ("date", case((newer, stmt.inserted.date), else_=table.date)),
+            ("lastReadSeq", func.greatest(table.lastReadSeq, stmt.inserted.lastReadSeq)),
+        ])
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "pending": len(self.pending),
+            "cached": len(self.flushed),
+            "marked": self.marked,
+            "skipped": self.skipped,
+            "flushedRows": self.flushed_rows,
+            "flushedBatches": self.flushed_batches,
+            "failedRows": self.failed_rows,
+            "lastFlushMs": round(self.last_flush_ms, 3),
+            "maxFlushMs": round(self.max_flush_ms, 3),
+        }
+
+
+receipts = ReadReceipts()
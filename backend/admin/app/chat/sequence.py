@@ -0,0 +1,81 @@
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db.errorLog import format_dates
+from ..utils import models
+
+# 방별 메시지 순번(seq). ChatRoom.lastSeq 가 방의 마지막 순번이고 Chat.seq 는 1 부터 빈틈없이 증가한다.
+# 안읽은 수 = ChatRoom.lastSeq - ChatReadStatus.lastReadSeq (기록 길이와 상관없이 O(1))
+# 내가 보낸 메시지는 안읽은 수에 들어가지 않도록 보낼 때 내 lastReadSeq 도 같이 올린다
+# write-behind 모드는 RoomSeqs 가 메모리에서 순번을 매기고 ChatRoom.lastSeq 는 writer 가 배치 트랜잭션에서 올린다
+# (배치에서 빠진 재전송 중복의 순번은 비어서 남는다 - 안읽은 수가 그만큼 많아 보일 수 있음)
+
+
+async def reserve_seq(db: AsyncSession, chatRoom_id: int, count: int = 1) -> int:
+    """count 개의 순번을 예약하고 마지막 순번을 돌려준다.
+    MySQL LAST_INSERT_ID(expr) 로 증가와 읽기를 행 잠금 한 번에 처리해서 워커가 여러 개여도 겹치지 않는다."""
+    result = await db.execute(
+        update(models.ChatRoom)
+        .where(models.ChatRoom.id == chatRoom_id)
+        .values(lastSeq=func.last_insert_id(models.ChatRoom.lastSeq + count))
+    )
+    if result.rowcount == 0:
+        raise ValueError(f"채팅방이 존재하지 않습니다: {chatRoom_id}")
+    return await db.scalar(select(func.last_insert_id()))
+
+
+class RoomSeqs:
+    """write-behind 모드용 방별 순번 카운터. 방마다 처음 한 번만 ChatRoom.lastSeq 를 읽고 이후에는 메모리에서 올려서
+    메시지마다 순번 UPDATE/commit 을 하지 않는다. DB 의 lastSeq 는 writer 가 배치를 저장할 때 맞춘다 -
+    다른 워커가 같은 방에 먼저 저장한 순번과 겹치면 그 배치의 순번을 뒤로 다시 매긴다 (응답/전달한 seq 와 달라질 수 있음)"""
+
+    def __init__(self):
+        # chatRoom_id -> 이 워커가 마지막으로 매긴 순번
+        self.last: Dict[int, int] = {}
+        self.loads = 0
+
+    async def next(self, db: AsyncSession, chatRoom_id: int) -> int:
+        if chatRoom_id not in self.last:
+            lastSeq = await db.scalar(select(models.ChatRoom.lastSeq).where(models.ChatRoom.id == chatRoom_id))
+            if lastSeq is None:
+                raise ValueError(f"채팅방이 존재하지 않습니다: {chatRoom_id}")
+            self.loads += 1
+            # 읽는 동안 다른 요청이 먼저 채웠으면 그 값을 쓴다
+            self.last.setdefault(chatRoom_id, lastSeq)
+        self.last[chatRoom_id] += 1
+        return self.last[chatRoom_id]
+
+    def observe(self, chatRoom_id: int, lastSeq: int):
+        """배치를 저장한 뒤의 DB lastSeq - 다른 워커가 앞서 있었으면 따라간다"""
+        if lastSeq > self.last.get(chatRoom_id, 0):
+            self.last[chatRoom_id] = lastSeq
+
+    def get(self, chatRoom_id: int, lastSeq: int) -> int:
+        """DB 의 lastSeq 와 아직 저장 안 된 순번 중 큰 값 (안읽은 수 계산용)"""
+        return max(lastSeq, self.last.get(chatRoom_id, 0))
+
+    def stats(self) -> dict:
+        return {"rooms": len(self.last), "loads": self.loads}
+
+
+room_seqs = RoomSeqs()
+
+
+async def advance_read_seq(db: AsyncSession, chatRoom_id: int, user_id: int, seq: int):
+    """ChatReadStatus.lastReadSeq 를 seq 까지 올린다 (뒤로 가지 않음). 읽음 상태가 없으면 만든다. commit 은 호출한 쪽에서"""
+    result = await db.execute(
+        update(models.ChatReadStatus)
+        .where(
+            models.ChatReadStatus.chatRoom_id == chatRoom_id,
+            models.ChatReadStatus.user_id == user_id,
+        )
+        .values(lastReadSeq=func.greatest(func.coalesce(models.ChatReadStatus.lastReadSeq, 0), seq))
+    )
+    if result.rowcount == 0:
+        db.add(models.ChatReadStatus(
+            chatRoom_id=chatRoom_id,
+            user_id=user_id,
+            lastReadSeq=seq,
+            date=format_dates(datetime.now()),
+        ))
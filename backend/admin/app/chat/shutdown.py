@@ -0,0 +1,141 @@
+import asyncio
+import os
+import random
+import signal
+import time
+from typing import Optional, Set
+
+from dotenv import load_dotenv
+
+from .connectionManager import manager
+from .events import chat_room_events, party_events
+from .receipts import receipts
+from .writer import writer
+
+load_dotenv()
+# 종료할 때 열린 채팅 소켓/SSE 를 닫는 시점을 이 구간(초)에 흩뿌린다. 0 이면 uvicorn 기본 동작 (전부 한 번에 1012)
+CHAT_DRAIN_WINDOW = float(os.getenv("CHAT_DRAIN_WINDOW", "10"))
+# 닫을 때 클라이언트에게 재접속 전에 더 기다리라고 알려주는 시간의 상한(ms). 실제 값은 0 ~ 상한 사이 무작위
+CHAT_RECONNECT_JITTER_MS = int(os.getenv("CHAT_RECONNECT_JITTER_MS", "5000"))
+# 소켓 하나를 닫기 전에 송신 큐에 남은 프레임을 보내려고 기다리는 최대 시간(초)
+CHAT_DRAIN_SEND_TIMEOUT = float(os.getenv("CHAT_DRAIN_SEND_TIMEOUT", "1"))
+
+# RFC 6455 1012 Service Restart - 프론트는 reason 의 retry=<ms> 만큼 기다렸다가 재접속한다
+RESTART_CLOSE_CODE = 1012
+
+
+class GracefulShutdown:
+    """SIGTERM/SIGINT 를 받으면: 새 소켓 거절 -> 쌓인 채팅/읽음 상태 저장 -> 열린 소켓과 SSE 를 window 동안 나눠서 닫기.
+    배포 때 모든 클라이언트가 같은 순간에 끊기고 같은 순간에 다시 붙어서 새 서버에 몰리는 것을 막는다."""
+
+    def __init__(self, window: float = CHAT_DRAIN_WINDOW, jitter_ms: int = CHAT_RECONNECT_JITTER_MS, send_timeout: float = CHAT_DRAIN_SEND_TIMEOUT):
+        self.window = window
+        self.jitter_ms = jitter_ms
+        self.send_timeout = send_timeout
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.task: Optional[asyncio.Task] = None
+        # 닫는 중인 소켓 태스크 (이벤트 루프는 태스크를 약하게만 참조한다)
+        self.closing: Set[asyncio.Task] = set()
+        self.draining = False
+
+        self.closed_sockets = 0
+        self.closed_streams = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def install(self):
+        """lifespan 시작 때 호출. uvicorn 이 설치한 종료 시그널 핸들러 앞에 끼워서, 서버가 리스닝 소켓을 닫기 전에 drain 을 시작한다"""
+        self.loop = asyncio.get_running_loop()
+        if not self.enabled:
+            return
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                previous = signal.getsignal(sig)
+                if not callable(previous):
+                    continue
+
+                def handler(signum, frame, previous=previous):
+                    self.begin()
+                    previous(signum, frame)
+
+                signal.signal(sig, handler)
+            except ValueError:
+                # 메인 스레드가 아니면 시그널 핸들러를 못 건다 - ChatWebSocketProtocol.shutdown 에서 시작된다
+                return
+
+    def begin(self):
+        """여러 번 불려도 한 번만 시작한다. 시그널 핸들러에서도 불리므로 루프에는 call_soon_threadsafe 로만 넘긴다"""
+        if self.draining or not self.enabled:
+            return
+        self.draining = True
+        manager.draining = True
+        loop = self.loop or asyncio.get_running_loop()
+        loop.call_soon_threadsafe(self.spawn)
+
+    def spawn(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        """lifespan 종료 때 호출. 소켓이 하나도 없으면 uvicorn 이 바로 lifespan 종료로 넘어오므로 저장이 끝날 때까지 기다린다"""
+        if self.task is None:
+            return
+        try:
+            await asyncio.wait_for(self.task, self.window + self.send_timeout)
+            if self.closing:
+                await asyncio.wait(self.closing, timeout=self.send_timeout)
+        except asyncio.TimeoutError:
+            print("그레이스풀 종료가 제한 시간 안에 끝나지 않았습니다")
+        except Exception as e:
+            print(f"그레이스풀 종료 오류: {e}")
+
+    def retry_ms(self) -> int:
+        return random.randint(0, self.jitter_ms) if self.jitter_ms > 0 else 0
+
+    async def run(self):
+        start_time = time.monotonic()
+        try:
+            # 이미 받은 메시지와 읽음 상태를 먼저 저장해서, 재접속한 클라이언트가 새 서버에서 바로 보게 한다
+            await writer.sync()
+            await receipts.flush()
+        except Exception as e:
+            print(f"종료 전 저장 오류: {e}")
+
+        # (닫을 시각, 순서, 대상) - 같은 시각이면 순서로 정렬되도록
+        targets = [(random.uniform(0, self.window), i, ("socket", connection)) for i, connection in enumerate(list(manager.recent))]
+        for hub in (party_events, chat_room_events, manager.taps):
+            for id, queue in hub.streams():
+                targets.append((random.uniform(0, self.window), len(targets), ("stream", (hub, id, queue))))
+        targets.sort()
+
+        for at, _, (kind, target) in targets:
+            delay = at - (time.monotonic() - start_time)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            retry_ms = self.retry_ms()
+            if kind == "socket":
+                if not target.registered:
+                    continue
+                # 송신 큐를 비우는 동안 다음 소켓이 밀리지 않도록 따로 닫는다
+                task = asyncio.create_task(manager.close_gracefully(target, RESTART_CLOSE_CODE, f"retry={retry_ms}", self.send_timeout))
+                self.closing.add(task)
+                task.add_done_callback(self.closing.discard)
+                self.closed_sockets += 1
+            else:
+                hub, id, queue = target
+                hub.end(id, queue, retry_ms)
+                self.closed_streams += 1
+
+        print(f"그레이스풀 종료: 소켓 {self.closed_sockets}개, SSE {self.closed_streams}개를 {time.monotonic() - start_time:.1f}초 동안 닫음")
+
+    def stats(self) -> dict:
+        return {
+            "window": self.window,
+            "draining": self.draining,
+            "closedSockets": self.closed_sockets,
+            "closedStreams": self.closed_streams,
+        }
+
+
+graceful = GracefulShutdown()
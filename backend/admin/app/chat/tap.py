@@ -0,0 +1,136 @@
+import asyncio
+import os
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from .events import EVENT_KEEPALIVE, EVENT_RETRY_MS, RESYNC, Event
+from . import protocol
+from .protocol import Frame
+
+load_dotenv()
+# 매니저 모니터링 연결 하나당 밀려 있을 수 있는 메시지 수. 넘치면 밀린 것을 버리고 resync 이벤트를 보낸다
+CHAT_TAP_QUEUE_SIZE = int(os.getenv("CHAT_TAP_QUEUE_SIZE", "256"))
+
+
+class Tap:
+    """매니저 모니터링 연결 하나. rooms/users 가 있으면 그 방/보낸 사람의 채팅만 받는다"""
+
+    __slots__ = ("party_id", "rooms", "users", "queue", "closed")
+
+    def __init__(self, party_id: int, rooms: Optional[Set[int]], users: Optional[Set[int]], queue_size: int):
+        self.party_id = party_id
+        self.rooms = rooms
+        self.users = users
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def wants(self, chatRoom_id: int, user_id: Optional[int]) -> bool:
+        if self.rooms is not None and chatRoom_id not in self.rooms:
+            return False
+        if self.users is not None and user_id not in self.users:
+            return False
+        return True
+
+
+class ChatTaps:
+    """매니저용 파티 채팅 탭 (읽기 전용). ConnectionManager 가 방 소켓에 전달하는 채팅 프레임을 그대로 받아서
+    파티의 탭들에 나눠 준다 - 메시지마다 DB 를 읽거나 다시 인코딩하지 않는다 (버스로 보낼 때 만든 JSON 을 그대로 쓴다).
+    탭이 열린 파티의 방 목록(방 -> 파티)은 탭을 열 때 받고, 이후 이 워커에서 만든 방은 add_room 으로 더한다.
+    다른 워커에서 만든 방은 다음 탭을 열 때(재접속 포함) 더해진다"""
+
+    def __init__(self, queue_size: int = CHAT_TAP_QUEUE_SIZE, keepalive: float = EVENT_KEEPALIVE):
+        self.parties: Dict[int, Dict[Tap, None]] = {}
+        self.room_party: Dict[int, int] = {}
+        self.party_rooms: Dict[int, Set[int]] = {}
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+
+        self.delivered = 0
+        self.dropped = 0
+
+    def add(self, party_id: int, chatRoom_ids: Iterable[int], rooms: Optional[Set[int]] = None, users: Optional[Set[int]] = None) -> Tuple[Tap, List[int]]:
+        """(탭, 새로 버스 구독해야 하는 방). 방 구독은 파티 단위라 이미 탭이 있으면 그 뒤에 생긴 방만 더한다"""
+        tap = Tap(party_id, rooms, users, self.queue_size)
+        self.parties.setdefault(party_id, {})[tap] = None
+        added = [chatRoom_id for chatRoom_id in chatRoom_ids if self.add_room(party_id, chatRoom_id)]
+        return tap, added
+
+    def add_room(self, party_id: int, chatRoom_id: int) -> bool:
+        """탭이 열려 있는 파티에 방이 생겼을 때. 새로 구독해야 하면 True"""
+        if party_id not in self.parties or chatRoom_id in self.room_party:
+            return False
+        self.room_party[chatRoom_id] = party_id
+        self.party_rooms.setdefault(party_id, set()).add(chatRoom_id)
+        return True
+
+    def remove(self, tap: Tap) -> List[int]:
+        """구독을 풀어야 하는 방 (파티의 마지막 탭일 때). 여러 번 호출해도 된다"""
+        tap.closed = True
+        taps = self.parties.get(tap.party_id)
+        if taps is None or tap not in taps:
+            return []
+        del taps[tap]
+        if taps:
+            return []
+        del self.parties[tap.party_id]
+        chatRoom_ids = list(self.party_rooms.pop(tap.party_id, ()))
+        for chatRoom_id in chatRoom_ids:
+            self.room_party.pop(chatRoom_id, None)
+        return chatRoom_ids
+
+    def feed(self, chatRoom_id: int, frame: Frame):
+        party_id = self.room_party.get(chatRoom_id)
+        if party_id is None or frame.event.get("type") != "chat":
+            return
+        user_id = frame.event.get("payload", {}).get("user_id")
+        event: Optional[Event] = None
+        for tap in self.parties.get(party_id, ()):
+            if tap.closed or not tap.wants(chatRoom_id, user_id):
+                continue
+            if event is None:
+                event = ("chat", frame.encode(protocol.JSON))
+            self.put(tap, event)
+
+    def put(self, tap: Tap, event: Event):
+        queue = tap.queue
+        if queue.full():
+            # 밀린 메시지를 버리고 resync 하나로 바꾼다 - 매니저 화면은 필요하면 방별로 다시 조회
+            while not queue.empty():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(RESYNC)
+        queue.put_nowait(event)
+        self.delivered += 1
+
+    async def stream(self, tap: Tap) -> AsyncIterator[str]:
+        """SSE 본문 (구독/해제는 ConnectionManager.tap)"""
+        yield f"retry: {EVENT_RETRY_MS}\n\n"
+        while True:
+            try:
+                type, data = await asyncio.wait_for(tap.queue.get(), self.keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if type is None:
+                yield f"retry: {data}\n\n"
+                return
+            yield f"event: {type}\ndata: {data}\n\n"
+
+    def end(self, tap: Tap, queue: asyncio.Queue, retry_ms: int):
+        """그레이스풀 종료 - EventHub.end 와 같다"""
+        tap.closed = True
+        while not queue.empty():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait((None, str(retry_ms)))
+
+    def streams(self):
+        return [(tap, tap.queue) for taps in self.parties.values() for tap in taps]
+
+    def stats(self) -> dict:
+        return {
+            "parties": len(self.parties),
+            "taps": sum(len(taps) for taps in self.parties.values()),
+            "rooms": len(self.room_party),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
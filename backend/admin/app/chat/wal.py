@@ -0,0 +1,285 @@
+import asyncio
+import mmap
+import os
+import struct
+import time
+import zlib
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import msgpack
+from dotenv import load_dotenv
+
+from ..utils.snowflake import generator, try_lock
+
+load_dotenv()
+# 채팅 로그(WAL) 상위 디렉터리. 워커마다 그 아래 worker-{snowflake 워커 id} 디렉터리에 따로 쓴다
+# (uvicorn --workers 는 모든 워커가 같은 환경변수로 뜬다 - 워커 id 는 프로세스마다 잠금으로 따로 잡힌다)
+CHAT_WAL_DIR = os.getenv("CHAT_WAL_DIR", "chat_wal")
+# 세그먼트 파일 하나의 최대 크기. 넘으면 새 세그먼트로 넘어가고, DB 에 다 옮긴 세그먼트는 지운다
+CHAT_WAL_SEGMENT_BYTES = int(os.getenv("CHAT_WAL_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+# 그룹 커밋 대기(ms) - 그 사이에 들어온 메시지를 한 번의 write + fsync 로 묶는다. 0 이면 바로 fsync
+CHAT_WAL_FSYNC_MS = float(os.getenv("CHAT_WAL_FSYNC_MS", "1"))
+
+# 레코드 = 길이(4) + crc32(4) + msgpack(행)
+HEADER = struct.Struct("<II")
+SEGMENT_SUFFIX = ".wal"
+CHECKPOINT = "checkpoint"
+# 디렉터리를 쓰는 프로세스가 잡고 있는 잠금 파일
+LOCK = "lock"
+WORKER_PREFIX = "worker-"
+
+# (세그먼트 번호, 세그먼트 안 오프셋)
+Position = Tuple[int, int]
+
+
+def worker_directory(base: str, worker_id: int) -> str:
+    return os.path.join(base, f"{WORKER_PREFIX}{worker_id}")
+
+
+def worker_ids(base: str) -> List[int]:
+    """base 아래에 로그 디렉터리가 있는 워커 id"""
+    if not os.path.isdir(base):
+        return []
+    return sorted(
+        int(name[len(WORKER_PREFIX):]) for name in os.listdir(base)
+        if name.startswith(WORKER_PREFIX) and name[len(WORKER_PREFIX):].isdigit()
+    )
+
+
+def encode_row(row: dict) -> bytes:
+    body = msgpack.packb({**row, "date": row["date"].isoformat()}, use_bin_type=True)
+    return HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+def decode_row(body) -> dict:
+    row = msgpack.unpackb(body, raw=False)
+    row["date"] = datetime.fromisoformat(row["date"])
+    return row
+
+
+class ChatLog:
+    """채팅 append-only 로그. 메시지를 세그먼트 파일 끝에 붙이고 fsync 가 끝나면 응답하고,
+    DB 로 옮기는 쪽(ChatWriter wal 모드)은 checkpoint 이후를 mmap 으로 읽어 간다.
+    checkpoint 는 DB commit 이 끝난 위치라서, 서버가 죽어도 다시 시작하면 그 뒤부터 다시 옮긴다 (중복 INSERT 는 id 로 무시됨)."""
+
+    def __init__(self, base: str = CHAT_WAL_DIR, segment_bytes: int = CHAT_WAL_SEGMENT_BYTES, fsync_ms: float = CHAT_WAL_FSYNC_MS):
+        self.base = base
+        # open() 때 정해진다 - base/worker-{워커 id}
+        self.directory: Optional[str] = None
+        self.lock_file = None
+        self.segment_bytes = segment_bytes
+        self.fsync_window = fsync_ms / 1000
+        self.fd: Optional[int] = None
+        self.segment = 0
+        self.size = 0
+        # fsync 까지 끝나서 읽어도 되는 끝 위치 (이벤트 루프 스레드에서만 바꾼다)
+        self.durable: Position = (0, 0)
+        self.checkpoint: Position = (0, 0)
+        self.pending: List[Tuple[bytes, asyncio.Future]] = []
+        self.wakeup: Optional[asyncio.Event] = None
+        self.committer: Optional[asyncio.Task] = None
+        self.closing = False
+        # 잘라내지 못한 쓰기 오류 - 그 뒤로는 세그먼트 끝을 믿을 수 없어서 append 를 모두 실패시킨다 (재시작하면 open 이 잘라낸다)
+        self.failed: Optional[Exception] = None
+
+        self.appended = 0
+        self.fsyncs = 0
+        self.truncated_bytes = 0
+        self.last_fsync_ms = 0.0
+        self.max_fsync_ms = 0.0
+
+    def path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:020d}{SEGMENT_SUFFIX}")
+
+    def segments(self) -> List[int]:
+        return sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+
+    def open(self, worker_id: Optional[int] = None):
+        """시작할 때 한 번. worker_id(기본은 이 프로세스의 워커 id)의 디렉터리를 잠그고 checkpoint 를 읽고,
+        마지막 세그먼트 끝에 쓰다 만 레코드가 있으면 잘라낸다. 다른 프로세스가 잠그고 있으면 바로 실패한다"""
+        if worker_id is None:
+            worker_id = generator.start()
+        self.directory = worker_directory(self.base, worker_id)
+        os.makedirs(self.directory, exist_ok=True)
+        self.lock_file = try_lock(os.path.join(self.directory, LOCK))
+        if self.lock_file is None:
+            raise RuntimeError(f"채팅 로그 {self.directory} 를 다른 프로세스가 쓰고 있습니다")
+        self.checkpoint = self.read_checkpoint()
+        segments = self.segments()
+        if segments:
+            self.segment = segments[-1]
+            self.size = self.valid_length(self.segment)
+        else:
+            self.segment, self.size = max(self.checkpoint[0], 1), 0
+        self.fd = os.open(self.path(self.segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        os.ftruncate(self.fd, self.size)
+        self.durable = (self.segment, self.size)
+        # 처음 시작했거나 checkpoint 가 가리키는 세그먼트가 없으면 남아 있는 첫 세그먼트부터
+        if not segments:
+            self.checkpoint = (self.segment, 0)
+        elif self.checkpoint[0] < segments[0]:
+            self.checkpoint = (segments[0], 0)
+
+    def valid_length(self, segment: int) -> int:
+        """crc 가 맞는 마지막 레코드까지의 길이"""
+        with open(self.path(segment), "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + HEADER.size <= len(data):
+            length, crc = HEADER.unpack_from(data, offset)
+            end = offset + HEADER.size + length
+            if end > len(data) or zlib.crc32(data[offset + HEADER.size:end]) != crc:
+                break
+            offset = end
+        if offset < len(data):
+            self.truncated_bytes += len(data) - offset
+            print(f"채팅 로그 {segment} 끝의 잘린 레코드 {len(data) - offset}바이트를 버립니다")
+        return offset
+
+    def start(self):
+        self.wakeup = asyncio.Event()
+        self.committer = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self.committer is not None:
+            # 쓰는 중인 배치와 기다리는 append 를 마저 쓰고 끝낸다 (취소하면 executor 의 write 와 겹친다)
+            self.closing = True
+            self.wakeup.set()
+            await self.committer
+            self.committer = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+    async def append(self, row: dict):
+        """fsync 까지 끝나면 돌아온다"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((encode_row(row), future))
+        self.wakeup.set()
+        await future
+
+    async def run(self):
+        while not self.closing:
+            await self.wakeup.wait()
+            # 동시에 보내는 메시지를 모아서 fsync 한 번으로 (그룹 커밋)
+            if self.fsync_window > 0 and not self.closing:
+                await asyncio.sleep(self.fsync_window)
+            self.wakeup.clear()
+            await self.commit_pending()
+        await self.commit_pending()
+
+    async def commit_pending(self):
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        start_time = time.perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.write, b"".join(record for record, _ in batch))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.durable = (self.segment, self.size)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        self.appended += len(batch)
+        self.fsyncs += 1
+        self.last_fsync_ms = elapsed_ms
+        self.max_fsync_ms = max(self.max_fsync_ms, elapsed_ms)
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    def write(self, data: bytes):
+        # executor 스레드에서 실행 - 한 번에 하나만 돈다 (commit_pending 이 끝날 때까지 기다림)
+        if self.failed is not None:
+            raise RuntimeError(f"채팅 로그 쓰기를 멈췄습니다 - 다시 시작해야 합니다: {self.failed}")
+        if self.size > 0 and self.size + len(data) > self.segment_bytes:
+            os.fsync(self.fd)
+            # 새 세그먼트를 연 뒤에 바꾼다 - 열다 실패해도 지금 세그먼트에 계속 쓸 수 있게
+            fd = os.open(self.path(self.segment + 1), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            os.close(self.fd)
+            self.fd, self.segment, self.size = fd, self.segment + 1, 0
+        try:
+            view = memoryview(data)
+            while view:
+                written = os.write(self.fd, view)
+                view = view[written:]
+            if hasattr(os, "fdatasync"):
+                os.fdatasync(self.fd)
+            else:
+                os.fsync(self.fd)
+        except OSError:
+            # 일부만 쓰였거나 fsync 가 실패한 배치는 잘라낸다 - 남겨 두면 다음 레코드 위치와 durable 이 레코드 중간을 가리킨다
+            try:
+                os.ftruncate(self.fd, self.size)
+            except OSError as e:
+                print(f"채팅 로그 자르기 실패 ({self.path(self.segment)}): {e}")
+                self.failed = e
+            raise
+        self.size += len(data)
+
+    def read(self, position: Position, limit: int) -> Tuple[List[dict], Position]:
+        """position 부터 fsync 된 레코드를 최대 limit 개 읽고 (행들, 다음 위치)"""
+        segment, offset = position
+        durable_segment, durable_size = self.durable
+        rows: List[dict] = []
+        while len(rows) < limit and (segment, offset) < (durable_segment, durable_size):
+            end = durable_size if segment == durable_segment else os.path.getsize(self.path(segment))
+            if offset >= end:
+                segment, offset = segment + 1, 0
+                continue
+            with open(self.path(segment), "rb") as f, mmap.mmap(f.fileno(), end, access=mmap.ACCESS_READ) as m:
+                while offset < end and len(rows) < limit:
+                    length, crc = HEADER.unpack_from(m, offset)
+                    body = m[offset + HEADER.size:offset + HEADER.size + length]
+                    if zlib.crc32(body) != crc:
+                        raise ValueError(f"채팅 로그가 손상되었습니다: 세그먼트 {segment}, 오프셋 {offset}")
+                    rows.append(decode_row(body))
+                    offset += HEADER.size + length
+        return rows, (segment, offset)
+
+    def read_checkpoint(self) -> Position:
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT)) as f:
+                segment, offset = f.read().split()
+            return int(segment), int(offset)
+        except (FileNotFoundError, ValueError):
+            return (0, 0)
+
+    async def advance(self, position: Position):
+        """position 까지 DB 에 옮겼다고 기록하고, 다 옮긴 세그먼트를 지운다"""
+        await asyncio.get_running_loop().run_in_executor(None, self.write_checkpoint, position)
+        self.checkpoint = position
+
+    def write_checkpoint(self, position: Position):
+        path = os.path.join(self.directory, CHECKPOINT)
+        with open(path + ".tmp", "w") as f:
+            f.write(f"{position[0]} {position[1]}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        for segment in self.segments():
+            if segment >= position[0]:
+                break
+            os.remove(self.path(segment))
+
+    def stats(self) -> dict:
+        segments = self.segments() if self.fd is not None else []
+        return {
+            "segment": self.segment,
+            "segments": len(segments),
+            "durable": list(self.durable),
+            "checkpoint": list(self.checkpoint),
+            "pending": len(self.pending),
+            "appended": self.appended,
+            "fsyncs": self.fsyncs,
+            "avgBatch": round(self.appended / self.fsyncs, 2) if self.fsyncs else 0.0,
+            "truncatedBytes": self.truncated_bytes,
+            "lastFsyncMs": round(self.last_fsync_ms, 3),
+            "maxFsyncMs": round(self.max_fsync_ms, 3),
+        }
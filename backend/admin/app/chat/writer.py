@@ -0,0 +1,453 @@
+import asyncio
+import os
+import time
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import case, insert, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+
+from ..db import database
+from ..db.errorLog import log_error
+from ..utils import models
+from ..utils.snowflake import generator
+from .dedupe import recent_keys
+from .history import DATE_FORMAT
+from .sequence import advance_read_seq, room_seqs
+from .wal import ChatLog, worker_ids
+
+load_dotenv()
+# direct: 메시지마다 바로 commit (기존 방식)
+# enqueue: 큐에 넣자마자 응답 (flush 전에 서버가 죽으면 유실될 수 있음)
+# flush: 해당 메시지가 포함된 배치가 commit 된 뒤 응답
+# wal: 로컬 채팅 로그(chat/wal.py)에 fsync 된 뒤 응답, DB 에는 백그라운드로 옮긴다 (서버가 죽어도 재시작 때 이어서 옮김)
+CHAT_WRITE_MODE = os.getenv("CHAT_WRITE_MODE", "direct")
+CHAT_WRITE_INTERVAL_MS = int(os.getenv("CHAT_WRITE_INTERVAL_MS", "50"))
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "200"))
+CHAT_WRITE_QUEUE_SIZE = int(os.getenv("CHAT_WRITE_QUEUE_SIZE", "10000"))
+CHAT_WRITE_RETRY = int(os.getenv("CHAT_WRITE_RETRY", "3"))
+# enqueue 모드에서 종료할 때까지 DB 에 저장하지 못한 메시지를 남기는 디렉터리 - 다음 시작 때 먼저 옮긴다
+# (채팅 로그처럼 워커마다 그 아래 worker-{워커 id} 디렉터리)
+CHAT_WRITE_SPILL_DIR = os.getenv("CHAT_WRITE_SPILL_DIR", "chat_spill")
+
+WRITE_MODES = ("direct", "enqueue", "flush", "wal")
+
+
+class ChatWriter:
+    """채팅 write-behind 버퍼. 큐에 쌓인 메시지를 interval_ms 마다 또는 batch_size 개가 모이면
+    한 번의 multi-row INSERT 로 저장한다."""
+
+    def __init__(
+        self,
+        mode: str = CHAT_WRITE_MODE,
+        interval_ms: int = CHAT_WRITE_INTERVAL_MS,
+        batch_size: int = CHAT_WRITE_BATCH_SIZE,
+        queue_size: int = CHAT_WRITE_QUEUE_SIZE,
+        retry: int = CHAT_WRITE_RETRY,
+        spill_dir: str = CHAT_WRITE_SPILL_DIR,
+    ):
+        if mode not in WRITE_MODES:
+            raise ValueError(f"Unknown CHAT_WRITE_MODE: {mode}")
+        self.mode = mode
+        self.interval = interval_ms / 1000
+        self.batch_size = batch_size
+        self.retry = retry
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.flusher: Optional[asyncio.Task] = None
+        self.log: Optional[ChatLog] = ChatLog() if mode == "wal" else None
+        self.spill_dir = spill_dir
+        # enqueue 모드에서 재시도 끝에도 저장하지 못한 행 - 버리지 않고 새 메시지보다 먼저 다시 저장한다
+        self.retained: List[Tuple[dict, None]] = []
+        self.stopping = False
+
+        self.recovered_rows = 0
+        self.flushed_rows = 0
+        self.flushed_batches = 0
+        self.failed_rows = 0
+        self.duplicate_rows = 0
+        self.spilled_rows = 0
+        self.renumbered_rows = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "direct"
+
+    async def start(self):
+        if self.log is not None and self.flusher is None:
+            self.log.open()
+            self.log.start()
+            await self.recover(self.log)
+            await self.recover_orphans(self.log.base)
+            self.flusher = asyncio.create_task(self.replicate())
+        elif self.enabled and self.flusher is None:
+            await self.recover_spill()
+            self.flusher = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self.flusher is None:
+            return
+        if self.log is not None:
+            # 로그에 남은 것을 DB 로 옮길 수 있는 만큼 옮기고 끝낸다. 못 옮긴 것은 다음 시작 때 recover 가 옮긴다
+            await self.log.close()
+            self.stopping = True
+            await self.flusher
+            self.flusher = None
+            return
+        # 종료 표시를 큐 맨 뒤에 넣어서 앞에 쌓인 메시지를 모두 저장한 뒤 flusher 가 끝나게 한다
+        # (DB 가 안 돼서 저장하지 못한 것은 flusher 가 spill 디렉터리에 남기고 끝난다)
+        self.stopping = True
+        await self.queue.put(None)
+        await self.flusher
+        self.flusher = None
+
+    async def sync(self):
+        """지금까지 큐에 들어간 메시지가 모두 저장될 때까지 기다린다 (flusher 는 계속 돈다)"""
+        # wal 모드는 응답한 메시지가 이미 로그에 fsync 되어 있다
+        if self.flusher is None or self.log is not None:
+            return
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((None, future))
+        await future
+
+    async def submit(self, row: dict) -> Optional[dict]:
+        """flush 모드에서 같은 clientKey 의 채팅이 이미 저장되어 있었으면 그 채팅(chat_id, date, seq)을 돌려준다"""
+        if self.log is not None:
+            await self.log.append(row)
+            return None
+        future = asyncio.get_running_loop().create_future() if self.mode == "flush" else None
+        await self.queue.put((row, future))
+        if future is not None:
+            return await future
+        return None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while True:
+            if self.retained:
+                # 저장하지 못한 행을 새 메시지보다 먼저 다시 저장한다 - 그동안 큐가 차면 submit 이 기다린다
+                if await self.flush(self.retained):
+                    self.retained = []
+                elif self.stopping:
+                    await self.spill([row for row, _ in self.retained] + self.take_queued())
+                    self.retained = []
+                    return
+                else:
+                    await asyncio.sleep(self.interval * max(self.retry, 1))
+                    continue
+            if stopping:
+                return
+            item = await self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            if not await self.flush(batch):
+                # 응답을 기다리는 요청(flush 모드)은 실패를 받았다. 이미 응답한(enqueue 모드) 행만 남겨서 다시 저장한다
+                self.retained.extend((row, None) for row, future in batch if row is not None and future is None)
+
+    def take_queued(self) -> List[dict]:
+        """종료할 때 큐에 남은 행 (sync 표시는 풀어 준다)"""
+        rows = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is None:
+                continue
+            row, future = item
+            if row is not None:
+                rows.append(row)
+            elif future is not None and not future.done():
+                future.set_result(None)
+        return rows
+
+    async def spill(self, rows: List[dict]):
+        """종료 때까지 DB 에 저장하지 못한 행을 spill 디렉터리의 로그로 남긴다 (다음 시작 때 recover_spill 이 옮긴다)"""
+        if not rows:
+            return
+        log = ChatLog(self.spill_dir, fsync_ms=0)
+        log.open()
+        log.start()
+        try:
+            await asyncio.gather(*(log.append(row) for row in rows))
+        finally:
+            await log.close()
+        self.spilled_rows += len(rows)
+        print(f"DB 에 저장하지 못한 채팅 {len(rows)}건을 {log.directory} 에 남김 - 다음 시작 때 옮깁니다")
+
+    async def recover_spill(self):
+        if not os.path.isdir(self.spill_dir):
+            return
+        log = ChatLog(self.spill_dir, fsync_ms=0)
+        log.open()
+        try:
+            await self.recover(log)
+        finally:
+            await log.close()
+        await self.recover_orphans(self.spill_dir)
+
+    async def recover_orphans(self, base: str):
+        """base 아래 다른 워커의 로그 중 주인이 없는 것(워커 id 잠금이 풀린 것)을 옮긴다 - 워커 수가 줄었거나 id 가 바뀌었을 때.
+        옮기는 동안 그 워커 id 를 잡아서 새로 뜨는 워커가 같은 디렉터리를 쓰지 않게 한다"""
+        own = generator.start()
+        for worker_id in worker_ids(base):
+            if worker_id == own:
+                continue
+            held = generator.hold(worker_id)
+            if held is None:
+                continue
+            try:
+                log = ChatLog(base, fsync_ms=0)
+                try:
+                    log.open(worker_id)
+                except RuntimeError as e:
+                    # CHAT_WORKER_ID 를 직접 지정한 워커가 쓰고 있다
+                    print(e)
+                    continue
+                try:
+                    await self.recover(log)
+                finally:
+                    await log.close()
+            finally:
+                held.close()
+
+    async def recover(self, log: ChatLog):
+        """시작 때: 지난번에 DB 로 다 못 옮긴 메시지(wal 로그, spill)를 요청을 받기 전에 옮긴다 (조회/안읽은 수에 바로 보이도록)"""
+        recovered = 0
+        while True:
+            rows, position = log.read(log.checkpoint, self.batch_size)
+            if not rows:
+                break
+            if not await self.flush([(row, None) for row in rows]):
+                print(f"채팅 로그 복구 중 DB 저장 실패 ({log.directory}) - 나머지는 나중에 옮깁니다")
+                break
+            await log.advance(position)
+            recovered += len(rows)
+        self.recovered_rows += recovered
+        if recovered:
+            print(f"채팅 로그 복구: {recovered}건을 DB 로 옮김 ({log.directory})")
+
+    async def replicate(self):
+        """wal 모드: checkpoint 이후의 로그를 배치로 DB 에 옮기고 checkpoint 를 올린다"""
+        while True:
+            try:
+                rows, position = self.log.read(self.log.checkpoint, self.batch_size)
+                if rows and await self.flush([(row, None) for row in rows]):
+                    await self.log.advance(position)
+                    # 밀려 있으면 쉬지 않고 다음 배치
+                    continue
+            except Exception as e:
+                print(f"채팅 로그 복제 오류: {e}")
+            if self.stopping:
+                return
+            await asyncio.sleep(self.interval)
+
+    async def flush(self, batch: List[Tuple[Optional[dict], Optional[asyncio.Future]]]) -> bool:
+        # row 가 None 인 항목은 sync() 가 넣은 표시 - 앞의 메시지와 같이 저장되면 풀린다
+        pending = self.dedupe([(row, future) for row, future in batch if row is not None])
+        error: Optional[Exception] = None
+        start_time = time.perf_counter()
+        rows = 0
+        attempt = 0
+        while pending:
+            async with database.ChatSessionLocal() as db:
+                try:
+                    await self.write(db, [row for row, _ in pending])
+                    rows = len(pending)
+                    error = None
+                    break
+                except IntegrityError as e:
+                    await db.rollback()
+                    error = e
+                    try:
+                        remaining = await self.skip_stored(db, pending)
+                    except Exception as e:
+                        error, remaining = e, pending
+                    if len(remaining) < len(pending):
+                        # 이미 저장된 행만 빼고 바로 다시 저장한다 (재시도 횟수에 넣지 않는다)
+                        pending = remaining
+                        error = None
+                        continue
+                except Exception as e:
+                    await db.rollback()
+                    error = e
+                attempt += 1
+                print(f"채팅 배치 저장 오류 ({attempt}/{self.retry}): {error}")
+                if attempt >= self.retry:
+                    await log_error(db, str(error))
+                    break
+            await asyncio.sleep(self.interval * attempt)
+
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        if error is None:
+            if rows:
+                self.flushed_rows += rows
+                self.flushed_batches += 1
+                self.last_flush_ms = elapsed_ms
+                self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+                self.total_flush_ms += elapsed_ms
+        else:
+            self.failed_rows += len(pending)
+
+        for _, future in batch:
+            if future is None or future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+        return error is None
+
+    async def write(self, db, rows: List[dict]):
+        last_seqs = await self.reconcile(db, rows)
+        await db.execute(self.insert(), rows)
+        await db.execute(
+            update(models.ChatRoom)
+            .where(models.ChatRoom.id.in_(last_seqs.keys()))
+            .values(lastSeq=case(last_seqs, value=models.ChatRoom.id))
+        )
+        # 보낸 사람의 읽음 순번도 올려서 자기 메시지가 안읽은 수에 들어가지 않게 한다
+        for (chatRoom_id, user_id), seq in self.sender_seqs(rows).items():
+            await advance_read_seq(db, chatRoom_id, user_id, seq)
+        await db.commit()
+        for chatRoom_id, lastSeq in last_seqs.items():
+            room_seqs.observe(chatRoom_id, lastSeq)
+
+    async def reconcile(self, db, rows: List[dict]) -> dict:
+        """배치의 방들을 잠그고(FOR UPDATE) 메모리에서 매긴 순번을 DB lastSeq 에 맞춘다. 방마다 새 lastSeq 를 돌려준다.
+        다른 워커가 먼저 같은 순번을 썼으면 그 방의 행들을 순서대로 lastSeq 뒤로 다시 매긴다"""
+        by_room = {}
+        for row in rows:
+            by_room.setdefault(row["chatRoom_id"], []).append(row)
+        result = await db.execute(
+            select(models.ChatRoom.id, models.ChatRoom.lastSeq)
+            .where(models.ChatRoom.id.in_(by_room.keys()))
+            .with_for_update()
+        )
+        stored = dict(result.all())
+        last_seqs = {}
+        for chatRoom_id, room_rows in by_room.items():
+            lastSeq = stored.get(chatRoom_id, 0)
+            room_rows.sort(key=lambda row: row["seq"])
+            if room_rows[0]["seq"] <= lastSeq:
+                for seq, row in enumerate(room_rows, lastSeq + 1):
+                    row["seq"] = seq
+                self.renumbered_rows += len(room_rows)
+            last_seqs[chatRoom_id] = max(lastSeq, room_rows[-1]["seq"])
+        return last_seqs
+
+    def dedupe(self, items: List[Tuple[dict, Optional[asyncio.Future]]]) -> List[Tuple[dict, Optional[asyncio.Future]]]:
+        """한 배치 안에 같은 (방, 보낸 사람, clientKey) 가 또 있으면 처음 것만 저장한다"""
+        first = {}
+        kept = []
+        for row, future in items:
+            if row.get("clientKey") is not None:
+                key = (row["chatRoom_id"], row["user_id"], row["clientKey"])
+                if key in first:
+                    self.duplicate_rows += 1
+                    self.report(key, self.result(first[key]), future)
+                    continue
+                first[key] = row
+            kept.append((row, future))
+        return kept
+
+    async def skip_stored(self, db, items: List[Tuple[dict, Optional[asyncio.Future]]]) -> List[Tuple[dict, Optional[asyncio.Future]]]:
+        """중복 키로 실패한 배치에서 이미 DB 에 있는 행을 뺀다 - 같은 id 의 같은 행(로그를 다시 옮길 때)과
+        같은 (방, 보낸 사람, clientKey) 재전송. 그 밖의 충돌(다른 메시지와 id/순번이 겹침)은 빼지 않아서 배치가 실패한다"""
+        ids = [row["id"] for row, _ in items]
+        keys = [(row["chatRoom_id"], row["user_id"], row["clientKey"]) for row, _ in items if row.get("clientKey") is not None]
+        condition = models.Chat.id.in_(ids)
+        if keys:
+            condition = or_(condition, tuple_(models.Chat.chatRoom_id, models.Chat.user_id, models.Chat.clientKey).in_(keys))
+        result = await db.execute(
+            select(models.Chat.id, models.Chat.chatRoom_id, models.Chat.user_id, models.Chat.clientKey, models.Chat.date, models.Chat.seq)
+            .where(condition)
+        )
+        by_id = {}
+        by_key = {}
+        for stored in result.all():
+            by_id[stored.id] = stored
+            if stored.clientKey is not None:
+                by_key[(stored.chatRoom_id, stored.user_id, stored.clientKey)] = stored
+
+        remaining = []
+        for row, future in items:
+            stored = by_id.get(row["id"])
+            if stored is not None and (stored.chatRoom_id, stored.user_id) == (row["chatRoom_id"], row["user_id"]):
+                self.duplicate_rows += 1
+                continue
+            stored = by_key.get((row["chatRoom_id"], row["user_id"], row.get("clientKey")))
+            if row.get("clientKey") is not None and stored is not None:
+                self.duplicate_rows += 1
+                recent_keys.db_hits += 1
+                self.report(
+                    (row["chatRoom_id"], row["user_id"], row["clientKey"]),
+                    {"chat_id": stored.id, "date": stored.date.strftime(DATE_FORMAT), "seq": stored.seq},
+                    future,
+                )
+                continue
+            remaining.append((row, future))
+        return remaining
+
+    @staticmethod
+    def report(key: Tuple[int, int, str], result: dict, future: Optional[asyncio.Future]):
+        """저장하지 않은 재전송 - 기다리는 요청(flush 모드)과 dedupe 캐시에 처음 저장된 채팅을 알려 준다"""
+        chatRoom_id, user_id, client_key = key
+        recent_keys.remember(chatRoom_id, user_id, client_key, result)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    @staticmethod
+    def result(row: dict) -> dict:
+        return {"chat_id": row["id"], "date": row["date"].strftime(DATE_FORMAT), "seq": row.get("seq")}
+
+    @staticmethod
+    def insert():
+        # 중복 키를 건너뛰지 않는다 - 충돌하면 skip_stored 가 이미 저장된 행(같은 id, 같은 clientKey)만 빼고 다시 저장한다
+        return insert(models.Chat)
+
+    @staticmethod
+    def sender_seqs(rows: List[dict]) -> dict:
+        seqs = {}
+        for row in rows:
+            if row.get("seq") is None:
+                continue
+            key = (row["chatRoom_id"], row["user_id"])
+            seqs[key] = max(seqs.get(key, 0), row["seq"])
+        return seqs
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "queueDepth": self.queue.qsize(),
+            "flushedRows": self.flushed_rows,
+            "flushedBatches": self.flushed_batches,
+            "failedRows": self.failed_rows,
+            "retainedRows": len(self.retained),
+            "duplicateRows": self.duplicate_rows,
+            "spilledRows": self.spilled_rows,
+            "renumberedRows": self.renumbered_rows,
+            "seqs": room_seqs.stats(),
+            "lastFlushMs": round(self.last_flush_ms, 3),
+            "maxFlushMs": round(self.max_flush_ms, 3),
+            "avgFlushMs": round(self.total_flush_ms / self.flushed_batches, 3) if self.flushed_batches else 0.0,
+            "recoveredRows": self.recovered_rows,
+            "log": self.log.stats() if self.log is not None else None,
+        }
+
+
+writer = ChatWriter()
@@ -30,9 +30,34 @@ SessionLocal = sessionmaker(
     class_=AsyncSession
     )
 
+# 채팅 웹소켓/쓰기 전용 작은 풀 - 채팅이 몰려도 HTTP API 용 풀을 고갈시키지 않는다
+CHAT_DB_POOL_SIZE = int(os.getenv("CHAT_DB_POOL_SIZE", "5"))
+CHAT_DB_MAX_OVERFLOW = int(os.getenv("CHAT_DB_MAX_OVERFLOW", "5"))
+
+chat_engine = create_async_engine(
+    SQLALCHEMY_DATABASE_URL,
+    pool_size=CHAT_DB_POOL_SIZE,
+    max_overflow=CHAT_DB_MAX_OVERFLOW,
+    pool_recycle=3600
+    )
+
+ChatSessionLocal = sessionmaker(
+    autocommit=False, 
+    autoflush=False, 
+    bind=chat_engine, 
+    class_=AsyncSession
+    )
+
 async def get_db():
     async with SessionLocal() as db:
         try:
             yield db
         finally:
             await db.close()
+
+def pool_stats(engine) -> dict:
+    return {
+        "size": engine.pool.size(),
+        "checkedOut": engine.pool.checkedout(),
+        "overflow": engine.pool.overflow(),
+    }
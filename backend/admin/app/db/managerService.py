@@ -8,6 +8,8 @@ from ..utils import models, schemas
 from typing import List, Optional
 from datetime import datetime
 from ..oauth.password import hash_password, verify_password
+from ..chat.events import party_events
+from .userService import sync_team_chatRooms
 
 ## owner , manager(사장님 And 매니저 사용 API)
 async def get_managerGetAccomodation(
@@ -455,6 +457,7 @@ async def put_managerPartyOn(db: AsyncSession, id: int, party: schemas.managerPa
             db_party.partyOn = party.partyOn
             await db.commit()
             await db.refresh(db_party)
+            await party_events.publish(id, "partyOn", {"party_id": id, "partyOn": db_party.partyOn})
             return {"msg": "ok"}  
         
         except SQLAlchemyError as e:
@@ -564,6 +567,16 @@ async def get_managerPartyInfo(
         raise HTTPException(status_code=500, detail={"msg": error_message})
 
 
+async def get_party_chatRoom_ids(db: AsyncSession, party_id: int) -> List[int]:
+    """파티의 채팅방 id 전체 (1:1 방 + 팀 단체방)"""
+    result = await db.execute(
+        select(models.ChatRoom.id)
+        .where(models.ChatRoom.party_id == party_id)
+        .order_by(models.ChatRoom.id)
+    )
+    return list(result.scalars().all())
+
+
 async def put_managerPartyUserInfo(db: AsyncSession, data: schemas.managerPartyUserInfoDatas):
     try:
         updated_count = 0
@@ -590,6 +603,22 @@ async def put_managerPartyUserInfo(db: AsyncSession, data: schemas.managerPartyU
                 await db.commit()
                 await db.refresh(db_party)
 
+        # 조 배정이 끝나면 유저들이 속한 파티별로 한 번씩 알림
+        teams = {item.id: item.team for item in data.data}
+        if teams:
+            result = await db.execute(
+                select(models.User.id, models.User.party_id)
+                .where(models.User.id.in_(teams.keys()))
+            )
+            party_users = {}
+            for user_id, party_id in result.all():
+                if party_id is not None:
+                    party_users.setdefault(party_id, []).append({"id": user_id, "team": teams[user_id]})
+            for party_id, users in party_users.items():
+                # 조마다 단체방 - 바뀐 유저만 방을 옮긴다
+                await sync_team_chatRooms(db, party_id, {user["id"]: user["team"] for user in users})
+                await party_events.publish(party_id, "team", {"party_id": party_id, "users": users})
+
         return {
             "msg": "ok",
             "updated_count": updated_count,
@@ -625,6 +654,9 @@ async def put_managerPartyUserOn(id: int, db: AsyncSession, partyOn: bool):
             db_party.partyOn = partyOn
             await db.commit()
             await db.refresh(db_party)
+            party_id = await db.scalar(select(models.User.party_id).where(models.User.id == id))
+            if party_id is not None:
+                await party_events.publish(party_id, "partyUserOn", {"party_id": party_id, "user_id": id, "partyOn": partyOn})
             return {"msg": "ok"}  
         
         except SQLAlchemyError as e:
@@ -658,6 +690,7 @@ async def put_managerPartyMatchStart(id: int, db: AsyncSession):
             db_party.matchStartTime = format_dates(datetime.now())
             await db.commit()
             await db.refresh(db_party)
+            await party_events.publish(id, "matchStart", {"party_id": id, "matchStartTime": db_party.matchStartTime.isoformat()})
             return {"msg": "ok"}  
         
         except SQLAlchemyError as e:
@@ -713,4 +746,35 @@ async def get_managerPartyMatchTime(
         error_message = str(e)
         print("Exception:", error_message)
         await log_error(db, error_message)
-        raise HTTPException(status_code=500, detail={"msg": error_message})
\ No newline at end of file
+        raise HTTPException(status_code=500, detail={"msg": error_message})
+
+
+async def post_managerPartyAnnouncement(db: AsyncSession, id: int, data: schemas.managerPartyAnnouncement):
+    try:
+        party = await db.scalar(select(models.Party.id).filter(models.Party.id == id))
+        if party is None:
+            return {"msg": "fail"}
+
+        # 공지는 저장하지 않고 지금 파티 이벤트 채널을 듣고 있는 유저들에게만 보낸다
+        await party_events.publish(id, "announcement", {
+            "party_id": id,
+            "message": data.message,
+            "date": format_dates(datetime.now()).strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        return {"msg": "ok"}
+
+    except SQLAlchemyError as e:
+        error_message = str(e)
+        print("SQLAlchemyError:", error_message)
+        await log_error(db, error_message)
+        raise HTTPException(status_code=500, detail="Database Error")
+    except ValueError as e:
+        error_message = str(e)
+        print("ValueError:", error_message)
+        await log_error(db, error_message)
+        raise HTTPException(status_code=400, detail={"msg": error_message})
+    except Exception as e:
+        error_message = str(e)
+        print("Exception:", error_message)
+        await log_error(db, error_message)
+        raise HTTPException(status_code=500, detail={"msg": error_message})
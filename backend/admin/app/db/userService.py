@@ -1,16 +1,40 @@
 from fastapi.websockets import WebSocketState
-from sqlalchemy import func, select, and_, or_, case
+from sqlalchemy import func, select, and_, or_, case, delete
+from sqlalchemy.dialects.mysql import insert
 from sqlalchemy.orm import selectinload, aliased
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from fastapi import HTTPException, WebSocket, WebSocketDisconnect
 from websockets import ConnectionClosed
 from .errorLog import format_date, log_error, format_dates
 from ..utils import models, schemas
-from typing import List, Optional, Dict
+from ..utils.snowflake import next_id
+from ..chat.connectionManager import ConnectionManager, manager
+from ..chat.writer import writer
+from ..chat.events import chat_room_events, chat_room_channel
+from ..chat.history import ChatMessage, DATE_FORMAT
+from ..chat.sequence import reserve_seq, advance_read_seq, room_seqs
+from ..chat.receipts import receipts
+from ..chat.dedupe import recent_keys, CLIENT_KEY_MAX_LENGTH
+from ..chat.filter import chat_filter, FilterResult, MASK, REJECT
+from typing import List, Optional, Dict, Tuple
 from datetime import datetime, timedelta, timezone, time
 from itertools import groupby
+from collections import OrderedDict
+from dotenv import load_dotenv
+from time import monotonic
 import asyncio
+import os
+
+load_dotenv()
+# 채팅방 참여자 캐시 크기 - 참여자는 바뀌지 않아서 메시지마다 ChatRoom 을 다시 조회할 필요가 없다
+CHAT_ROOM_CACHE_SIZE = int(os.getenv("CHAT_ROOM_CACHE_SIZE", "10000"))
+# 팀 단체방 멤버는 조 배정으로 바뀔 수 있어서 캐시를 이 시간(초)만 믿는다 (배정한 워커는 바로 지우고, 다른 워커는 이 시간 안에 따라온다)
+CHAT_GROUP_MEMBERS_TTL = float(os.getenv("CHAT_GROUP_MEMBERS_TTL", "30"))
+# 채팅 내역 한 페이지 크기
+CHAT_PAGE_SIZE = 30
+# 전체 방 동기화(/user/chat/sync) 한 페이지 크기
+CHAT_SYNC_PAGE_SIZE = int(os.getenv("CHAT_SYNC_PAGE_SIZE", "200"))
 
 ## user
 ## 카카오 로그인 
@@ -360,6 +384,8 @@ async def get_userPartyInfo(
 
         result = await db.execute(query)
         users = result.all()
+        # 접속 여부는 소켓 레지스트리에서 읽는다 (DB 조회 없음)
+        online = manager.presence.online(party_id)
 
         response = [
             {
@@ -367,6 +393,7 @@ async def get_userPartyInfo(
                 "name": user.username,
                 "gender": user.gender if user.gender is not None else True,  
                 "team": user.team if user.team else None,
+                "online": user.id in online,
             }
             for user in users
         ]
@@ -445,6 +472,276 @@ async def get_userPartyInfoChatExist(
         raise HTTPException(status_code=500, detail={"msg": error_message})
     
 
+## 채팅방 리스트 SSE (/user/chatRooms/events) 이벤트 발행
+chatRoom_members: "OrderedDict[int, Tuple[int, ...]]" = OrderedDict()
+# 팀 단체방 캐시가 만료되는 시각
+group_members_expire: Dict[int, float] = {}
+
+async def get_chatRoom_members(db: AsyncSession, chatRoom_id: int) -> Optional[Tuple[int, ...]]:
+    """(party_id, 멤버 user_id...) - 1:1 방은 (party_id, user_id_1, user_id_2), 팀 단체방은 ChatRoomMember 의 멤버들"""
+    members = chatRoom_members.get(chatRoom_id)
+    if members is not None and group_members_expire.get(chatRoom_id, float("inf")) > monotonic():
+        chatRoom_members.move_to_end(chatRoom_id)
+        return members
+
+    result = await db.execute(
+        select(models.ChatRoom.party_id, models.ChatRoom.user_id_1, models.ChatRoom.user_id_2, models.ChatRoom.team)
+        .where(models.ChatRoom.id == chatRoom_id)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    if row.team is None:
+        members = (row.party_id, row.user_id_1, row.user_id_2)
+    else:
+        user_ids = await db.execute(
+            select(models.ChatRoomMember.user_id)
+            .where(models.ChatRoomMember.chatRoom_id == chatRoom_id)
+            .order_by(models.ChatRoomMember.user_id)
+        )
+        members = (row.party_id, *user_ids.scalars().all())
+        group_members_expire[chatRoom_id] = monotonic() + CHAT_GROUP_MEMBERS_TTL
+    chatRoom_members[chatRoom_id] = members
+    if len(chatRoom_members) > CHAT_ROOM_CACHE_SIZE:
+        evicted, _ = chatRoom_members.popitem(last=False)
+        group_members_expire.pop(evicted, None)
+    return members
+
+def forget_chatRoom_members(chatRoom_id: int):
+    chatRoom_members.pop(chatRoom_id, None)
+    group_members_expire.pop(chatRoom_id, None)
+
+# 이벤트 발행 실패가 채팅 저장/채팅방 생성 요청을 실패시키지 않도록 예외는 로그만 남긴다
+async def publish_chatRoom_chat(db: AsyncSession, chat: schemas.chatCreateRequest, chat_id: int, date: datetime, seq: int):
+    try:
+        members = await get_chatRoom_members(db, chat.chatRoom_id)
+        if members is None:
+            return
+        party_id, *user_ids = members
+        payload = {
+            "party_id": party_id,
+            "chatRoom_id": chat.chatRoom_id,
+            "chat_id": chat_id,
+            "user_id": chat.user_id,
+            "contents": chat.contents,
+            "date": date.strftime(DATE_FORMAT),
+            "seq": seq,
+        }
+        # 팀 단체방은 멤버가 많아서 한 번 인코딩한 이벤트를 멤버마다 보낸다
+        channels = [chat_room_channel(party_id, user_id) for user_id in dict.fromkeys(user_ids) if user_id is not None]
+        await chat_room_events.publish_many(channels, "chat", payload)
+    except Exception as e:
+        print(f"채팅방 리스트 이벤트 발행 오류: {e}")
+
+async def flag_chat(db: AsyncSession, chat: schemas.chatCreateRequest, verdict: FilterResult, chat_id: int, date: datetime):
+    """flag 처리된 단어가 있는 채팅을 파티별 최근 목록에 남긴다 (/manager/chat/flags/{party_id})"""
+    try:
+        members = await get_chatRoom_members(db, chat.chatRoom_id)
+        if members is None:
+            return
+        chat_filter.flag(members[0], {
+            "chatRoom_id": chat.chatRoom_id,
+            "chat_id": chat_id,
+            "user_id": chat.user_id,
+            "contents": chat.contents,
+            "words": verdict.words,
+            "date": date.strftime(DATE_FORMAT),
+        })
+    except Exception as e:
+        print(f"채팅 필터 flag 기록 오류: {e}")
+
+async def publish_chatRoom_created(db: AsyncSession, chatRoom_id: int, party_id: int, user_id_1: int, user_id_2: int):
+    try:
+        chatRoom_members[chatRoom_id] = (party_id, user_id_1, user_id_2)
+        # 이 파티를 보고 있는 매니저 탭에 새 방을 더한다
+        await manager.tap_room(party_id, chatRoom_id)
+        result = await db.execute(
+            select(models.UserInfo.user_id, models.UserInfo.name, models.UserInfo.gender, models.PartyUserInfo.team)
+            .join(models.PartyUserInfo, models.PartyUserInfo.user_id == models.UserInfo.user_id, isouter=True)
+            .where(models.UserInfo.user_id.in_([user_id_1, user_id_2]))
+        )
+        users = {row.user_id: row for row in result.all()}
+
+        # 각자의 채팅방 리스트에 들어갈 항목 (post_userChatRooms 응답과 같은 모양)
+        for user_id, other_user_id in ((user_id_1, user_id_2), (user_id_2, user_id_1)):
+            other = users.get(other_user_id)
+            await chat_room_events.publish(chat_room_channel(party_id, user_id), "chatRoom", {
+                "id": chatRoom_id,
+                "user_id_2": other_user_id,
+                "gender": other.gender if other else None,
+                "team": other.team if other else None,
+                "name": other.name if other else None,
+                "contents": "",
+                "date": "",
+                "unreadCount": 0,
+                "group": False,
+            })
+    except Exception as e:
+        print(f"채팅방 리스트 이벤트 발행 오류: {e}")
+
+def user_chatRooms(party_id: int, user_id: int):
+    """파티 안에서 내가 참여한 채팅방 조건 (1:1 방 + 멤버로 들어가 있는 팀 단체방)"""
+    return and_(
+        models.ChatRoom.party_id == party_id,
+        or_(
+            models.ChatRoom.user_id_1 == user_id,
+            models.ChatRoom.user_id_2 == user_id,
+            models.ChatRoom.id.in_(
+                select(models.ChatRoomMember.chatRoom_id).where(models.ChatRoomMember.user_id == user_id)
+            )
+        )
+    )
+
+async def get_user_chatRoom_ids(db: AsyncSession, party_id: int, user_id: int) -> List[int]:
+    """파티 안에서 내가 참여한 채팅방 id (오름차순)"""
+    result = await db.execute(
+        select(models.ChatRoom.id)
+        .where(user_chatRooms(party_id, user_id))
+        .order_by(models.ChatRoom.id)
+    )
+    return list(result.scalars().all())
+
+async def sync_team_chatRooms(db: AsyncSession, party_id: int, teams: Dict[int, Optional[int]]):
+    """조 배정이 바뀐 유저들을 팀 단체방 멤버로 옮긴다. 단체방은 (party_id, team) 마다 하나로, 처음 배정될 때 만든다.
+    읽음 위치는 멤버마다 ChatReadStatus 에 따로 두고, 새 멤버는 들어온 시점부터 안읽은 수를 센다. commit 까지 한다"""
+    wanted = {team for team in teams.values() if team is not None}
+    if wanted:
+        # 동시에 같은 조를 만들어도 ux_ChatRoom_party_id_team 으로 하나만 남는다
+        await db.execute(
+            insert(models.ChatRoom)
+            .values([{"party_id": party_id, "team": team, "lastSeq": 0} for team in sorted(wanted)])
+            .on_duplicate_key_update(team=models.ChatRoom.team)
+        )
+    result = await db.execute(
+        select(models.ChatRoom.team, models.ChatRoom.id, models.ChatRoom.lastSeq)
+        .where(models.ChatRoom.party_id == party_id, models.ChatRoom.team.isnot(None))
+    )
+    rooms: Dict[int, int] = {}
+    last_seqs: Dict[int, int] = {}
+    for team, chatRoom_id, lastSeq in result.all():
+        rooms[team] = chatRoom_id
+        last_seqs[chatRoom_id] = room_seqs.get(chatRoom_id, lastSeq)
+
+    result = await db.execute(
+        select(models.ChatRoomMember.user_id, models.ChatRoomMember.chatRoom_id)
+        .where(
+            models.ChatRoomMember.user_id.in_(teams.keys()),
+            models.ChatRoomMember.chatRoom_id.in_(rooms.values()),
+        )
+    )
+    current: Dict[int, set] = {}
+    for user_id, chatRoom_id in result.all():
+        current.setdefault(user_id, set()).add(chatRoom_id)
+
+    joined: List[Tuple[int, int]] = []
+    left: List[Tuple[int, int]] = []
+    for user_id, team in teams.items():
+        target = rooms.get(team)
+        for chatRoom_id in current.get(user_id, set()) - {target}:
+            left.append((chatRoom_id, user_id))
+        if target is not None and target not in current.get(user_id, set()):
+            joined.append((target, user_id))
+
+    for chatRoom_id, user_id in left:
+        await db.execute(
+            delete(models.ChatRoomMember)
+            .where(models.ChatRoomMember.chatRoom_id == chatRoom_id, models.ChatRoomMember.user_id == user_id)
+        )
+    if joined:
+        now = format_dates(datetime.now())
+        await db.execute(
+            insert(models.ChatRoomMember)
+            .values([{"chatRoom_id": chatRoom_id, "user_id": user_id, "date": now} for chatRoom_id, user_id in joined])
+            .on_duplicate_key_update(date=models.ChatRoomMember.date)
+        )
+        for chatRoom_id, user_id in joined:
+            await advance_read_seq(db, chatRoom_id, user_id, last_seqs[chatRoom_id])
+    await db.commit()
+
+    for chatRoom_id in {chatRoom_id for chatRoom_id, _ in joined + left}:
+        forget_chatRoom_members(chatRoom_id)
+    # 이 워커에 붙은 유저 소켓은 바로 구독을 옮긴다 (다른 워커의 소켓은 재접속할 때 party_id 로 다시 구독)
+    for chatRoom_id, user_id in left:
+        for connection in list(manager.user_connections.get(user_id, ())):
+            await manager.unsubscribe(connection, chatRoom_id)
+    for chatRoom_id, user_id in joined:
+        for connection in list(manager.user_connections.get(user_id, ())):
+            await manager.subscribe(connection, chatRoom_id)
+    for chatRoom_id in rooms.values():
+        await manager.tap_room(party_id, chatRoom_id)
+    team_by_room = {chatRoom_id: team for team, chatRoom_id in rooms.items()}
+    for chatRoom_id, user_id in joined:
+        await publish_team_chatRoom_joined(db, chatRoom_id, party_id, team_by_room[chatRoom_id], user_id)
+
+async def publish_team_chatRoom_joined(db: AsyncSession, chatRoom_id: int, party_id: int, team: int, user_id: int):
+    try:
+        # 채팅방 리스트에 들어갈 항목 (post_userChatRooms 응답과 같은 모양)
+        await chat_room_events.publish(chat_room_channel(party_id, user_id), "chatRoom", {
+            "id": chatRoom_id,
+            "user_id_2": None,
+            "gender": None,
+            "team": team,
+            "name": team_chatRoom_name(team),
+            "contents": "",
+            "date": "",
+            "unreadCount": 0,
+            "group": True,
+        })
+    except Exception as e:
+        print(f"채팅방 리스트 이벤트 발행 오류: {e}")
+
+def team_chatRoom_name(team: int) -> str:
+    return f"{team}조 단체방"
+
+def get_chat_seq(chatRoom_id: int, chat_id: Optional[int], seq: Optional[int] = None) -> Optional[int]:
+    """채팅 id 의 방 안 순번 - history 버퍼, 없으면 클라이언트가 보낸 seq. 둘 다 없으면 receipts 가 저장할 때 배치로 찾는다"""
+    if chat_id is None:
+        return seq
+    message = manager.history.find(chatRoom_id, chat_id)
+    if message is not None and message.seq is not None:
+        return message.seq
+    return seq
+
+async def find_chat_by_key(db: AsyncSession, chat: schemas.chatCreateRequest) -> Optional[dict]:
+    """같은 사람이 같은 클라이언트 키로 이미 저장한 채팅 (ux_Chat_chatRoom_id_user_id_clientKey)"""
+    row = (await db.execute(
+        select(models.Chat.id, models.Chat.date, models.Chat.seq)
+        .where(
+            models.Chat.chatRoom_id == chat.chatRoom_id,
+            models.Chat.user_id == chat.user_id,
+            models.Chat.clientKey == chat.clientKey,
+        )
+    )).first()
+    if row is None:
+        return None
+    return {"chat_id": row.id, "date": row.date.strftime(DATE_FORMAT), "seq": row.seq}
+
+def duplicate_chat(result: dict) -> dict:
+    # 재전송 - 처음 저장된 채팅을 그대로 돌려주고, 라우터는 다시 전달하지 않는다
+    return {**result, "msg": "Chat already exists", "duplicate": True}
+
+def get_read_seq(chatRoom_id: int, user_id: int, lastReadSeq: int) -> int:
+    """DB 의 읽음 순번과 아직 저장 안 된(receipts) 읽음 순번 중 큰 값"""
+    receipt = receipts.get(chatRoom_id, user_id)
+    if receipt is None:
+        return lastReadSeq
+    return max(lastReadSeq, receipt.seq)
+
+async def publish_chatRoom_read(db: AsyncSession, chatRoom_id: int, user_id: int, lastReadChat_id: Optional[int]):
+    try:
+        members = await get_chatRoom_members(db, chatRoom_id)
+        if members is None:
+            return
+        party_id = members[0]
+        # 같은 유저의 다른 탭/기기의 배지도 맞춘다
+        await chat_room_events.publish(chat_room_channel(party_id, user_id), "read", {
+            "chatRoom_id": chatRoom_id,
+            "lastReadChat_id": lastReadChat_id,
+        })
+    except Exception as e:
+        print(f"채팅방 리스트 이벤트 발행 오류: {e}")
+
+
 async def post_userChatRoom(
     db: AsyncSession, 
     userChatRoomRequest: schemas.userChatRoomRequest
@@ -471,6 +768,8 @@ async def post_userChatRoom(
         result = await db.execute(query)
         chatRoom_id = result.scalar_one_or_none()
 
+        await publish_chatRoom_created(db, chatRoom_id, userChatRoomRequest.party_id, user_id_1, user_id_2)
+
         response = {"chatRoom_id":chatRoom_id}
         return {
             "data": response,
@@ -503,99 +802,78 @@ async def post_userChatRooms(
         party_id = userChatRoomsRequest.party_id
         user_id = userChatRoomsRequest.user_id
 
+        # 방 목록, 상대방 정보, 마지막 메시지, 안읽은 수를 쿼리 한 번으로 가져온다 (방 수와 상관없이 왕복 1회)
+        # 팀 단체방은 상대방이 없어서 상대방 정보 자리가 NULL
+        my_rooms = user_chatRooms(party_id, user_id)
+
+        # 방별 마지막 메시지 id - (chatRoom_id, id) 인덱스로 방마다 한 번씩만 찾는다
+        latest_chat_ids = (
+            select(
+                models.Chat.chatRoom_id.label("chatRoom_id"),
+                func.max(models.Chat.id).label("chat_id")
+            )
+            .join(models.ChatRoom, models.Chat.chatRoom_id == models.ChatRoom.id)
+            .where(my_rooms)
+            .group_by(models.Chat.chatRoom_id)
+            .subquery()
+        )
+
+        other_user_id = case(
+            (models.ChatRoom.user_id_1 != user_id, models.ChatRoom.user_id_1),
+            else_=models.ChatRoom.user_id_2
+        )
+
         query = (
             select(
                 models.ChatRoom.id.label("chat_room_id"),
-                models.ChatRoom.user_id_1.label("user_id_1"),
-                models.ChatRoom.user_id_2.label("user_id_2")
+                other_user_id.label("other_user_id"),
+                models.UserInfo.name,
+                models.UserInfo.gender,
+                models.PartyUserInfo.team,
+                models.ChatRoom.team.label("room_team"),
+                models.Chat.contents,
+                models.Chat.date,
+                # 안읽은 수 = 방의 마지막 순번 - 내가 읽은 순번 (Chat 을 세지 않는다)
+                # 읽음 상태가 없는 방은 한 번도 안 읽은 방이라 전부 안읽음 (기존 방은 migrations/002 에서 읽음 상태를 채워 기존 수를 유지)
+                models.ChatRoom.lastSeq,
+                func.coalesce(models.ChatReadStatus.lastReadSeq, 0).label("lastReadSeq")
             )
-            .where(
+            .outerjoin(models.UserInfo, models.UserInfo.user_id == other_user_id)
+            .outerjoin(models.PartyUserInfo, models.PartyUserInfo.user_id == other_user_id)
+            .outerjoin(latest_chat_ids, latest_chat_ids.c.chatRoom_id == models.ChatRoom.id)
+            .outerjoin(models.Chat, models.Chat.id == latest_chat_ids.c.chat_id)
+            .outerjoin(
+                models.ChatReadStatus,
                 and_(
-                    models.ChatRoom.party_id == party_id,
-                    or_(
-                        models.ChatRoom.user_id_1 == user_id,
-                        models.ChatRoom.user_id_2 == user_id
-                    )
+                    models.ChatReadStatus.chatRoom_id == models.ChatRoom.id,
+                    models.ChatReadStatus.user_id == user_id
                 )
             )
+            .where(my_rooms)
         )
         
         result = await db.execute(query)
-        chat_room_data = result.fetchall()  
-        if not chat_room_data:
+        chat_rooms = result.all()
+        if not chat_rooms:
             return {
                 "data": None,
                 "totalCount": 0
             }
 
-        response = []
-        for chat_room in chat_room_data:
-            chat_room_id = chat_room[0]  
-            user_id_1 = chat_room[1]  
-            user_id_2 = chat_room[2]  
-
-
-            other_user_id = user_id_1 if user_id != user_id_1 else user_id_2
-
-            user_info_query = (
-                select(models.UserInfo.name, models.UserInfo.gender, models.PartyUserInfo.team)
-                .join(models.PartyUserInfo, models.PartyUserInfo.user_id == models.UserInfo.user_id)
-                .where(models.UserInfo.user_id == other_user_id)
-            )
-            
-            user_info_result = await db.execute(user_info_query)
-            user_info = user_info_result.fetchone()
-
-            user_name = user_info[0] if user_info else None
-            user_gender = user_info[1] if user_info else None
-            user_team = user_info[2] if user_info else None
-
-            latest_chat_query = (
-                select(models.Chat.contents, models.Chat.date)
-                .join(models.ChatRoom, models.Chat.chatRoom_id == models.ChatRoom.id)
-                .where(models.ChatRoom.id == chat_room_id)
-                .order_by(models.Chat.date.desc())
-            )
-            
-            latest_chat_result = await db.execute(latest_chat_query)
-            latest_chat = latest_chat_result.fetchone()
-
-            chat_contents = latest_chat[0] if latest_chat else ""
-            chat_date = latest_chat[1] if latest_chat else ""
-
-            unread_count_query = (
-                select(
-                    func.count(models.Chat.id).label("unread_count")
-                )
-                .select_from(models.Chat)
-                .join(models.ChatRoom, models.Chat.chatRoom_id == models.ChatRoom.id)
-                .join(models.ChatReadStatus, models.ChatRoom.id == models.ChatReadStatus.chatRoom_id)
-                .where(models.ChatReadStatus.user_id == user_id)
-                .where(
-                    case(
-                        (models.ChatReadStatus.lastReadChat_id.is_(None), True),  
-                        (models.Chat.id > models.ChatReadStatus.lastReadChat_id, True),  
-                        else_=False  
-                    )
-                )
-                .where(models.ChatRoom.id == chat_room_id)
-                .where(models.Chat.user_id != user_id)
-            )
-
-            
-            unread_count_result = await db.execute(unread_count_query)
-            unread_count = unread_count_result.scalar()
-
-            response.append({
-                "id": chat_room_id,
-                "user_id_2": other_user_id,
-                "gender": user_gender,
-                "team": user_team,
-                "name": user_name,
-                "contents": chat_contents,
-                "date": chat_date,
-                "unreadCount": unread_count,
-            })
+        response = [
+            {
+                "id": chat_room.chat_room_id,
+                "user_id_2": chat_room.other_user_id,
+                "gender": chat_room.gender,
+                "team": chat_room.team if chat_room.room_team is None else chat_room.room_team,
+                "name": chat_room.name if chat_room.room_team is None else team_chatRoom_name(chat_room.room_team),
+                "contents": chat_room.contents if chat_room.contents is not None else "",
+                "date": chat_room.date if chat_room.date is not None else "",
+                "unreadCount": room_seqs.get(chat_room.chat_room_id, chat_room.lastSeq) - get_read_seq(chat_room.chat_room_id, user_id, chat_room.lastReadSeq),
+                "group": chat_room.room_team is not None,
+            }
+            for chat_room in chat_rooms
+        ]
 
         return {
             "data": response,
@@ -620,6 +898,22 @@ async def post_userChatRooms(
 
 
 
+def chat_message(chat: models.Chat) -> ChatMessage:
+    return ChatMessage(
+        chat.id,
+        chat.user_id,
+        chat.contents,
+        chat.date.strftime(DATE_FORMAT) if chat.date else None,
+        chat.seq,
+    )
+
+
+def history_delay() -> float:
+    """새 history 버퍼로 응답하기 전에 기다릴 시간. write-behind 모드는 다른 워커가 응답만 하고 아직 저장하지 않은 메시지가
+    조회에도 (구독 전에 보내져서) 버스에도 없을 수 있다 - 배치 대기와 저장 시간만큼 지나면 DB 에 들어가 있다"""
+    return 2 * writer.interval if writer.enabled else 0.0
+
+
 async def post_userChatContents(
     db: AsyncSession, 
     userChatContentsRequest: schemas.userChatContentsRequest,
@@ -627,13 +921,23 @@ async def post_userChatContents(
     try:
         chatRoom_id = userChatContentsRequest.chatRoom_id
         lastChat_id = userChatContentsRequest.lastChat_id 
+
+        # 최근 메시지는 채팅 서버 메모리(history 버퍼)에서 바로 응답
+        messages = manager.history.page(chatRoom_id, CHAT_PAGE_SIZE, lastChat_id)
+        if messages is not None:
+            return {
+                "data": [message.as_row() for message in messages],
+                "totalCount": 0
+            }
         
         if lastChat_id is None:
+            # 첫 페이지는 버퍼를 채울 것이라 조회 전에 버스부터 구독한다 (조회와 구독 사이에 다른 워커가 보낸 메시지가 빠지지 않게)
+            await manager.reserve_history(chatRoom_id, history_delay())
             query = (
                 select(models.Chat)
                 .where(models.Chat.chatRoom_id == chatRoom_id)
                 .order_by(models.Chat.id.desc())
-                .limit(30)
+                .limit(CHAT_PAGE_SIZE)
             )
         else:
             query = (
@@ -643,20 +947,18 @@ async def post_userChatContents(
                     models.Chat.id < lastChat_id  
                 )
                 .order_by(models.Chat.id.desc())
-                .limit(30)
+                .limit(CHAT_PAGE_SIZE)
             )
         
         result = await db.execute(query)
         chat_room_datas = result.fetchall()  
 
-        response = [{
-                "id": chat_room_data[0].id,
-                "user_id": chat_room_data[0].user_id,
-                "contents": chat_room_data[0].contents,
-                "date": chat_room_data[0].date
-                } for chat_room_data in chat_room_datas   
-            ]
+        messages = [chat_message(chat_room_data[0]) for chat_room_data in chat_room_datas]
+        # 첫 페이지를 읽었으면 다음 조회부터는 메모리에서 응답하도록 버퍼를 채워 둔다
+        if lastChat_id is None:
+            await manager.seed_history(chatRoom_id, messages, CHAT_PAGE_SIZE, history_delay())
 
+        response = [message.as_row() for message in messages]
         response.reverse()
         
         return {
@@ -681,6 +983,93 @@ async def post_userChatContents(
         raise HTTPException(status_code=500, detail={"msg": error_message})
 
 
+async def post_userChatSync(
+    db: AsyncSession,
+    userChatSyncRequest: schemas.userChatSyncRequest,
+):
+    try:
+        party_id = userChatSyncRequest.party_id
+        user_id = userChatSyncRequest.user_id
+        cursor = userChatSyncRequest.cursor
+
+        # 내 방만 (요청에 다른 사람 방이 섞여 있어도 무시)
+        chatRoom_ids = await get_user_chatRoom_ids(db, party_id, user_id)
+
+        # 방별 하한 chat_id. (chatRoom_id, id) 순서로 페이지를 넘기므로
+        # cursor 보다 앞 방은 끝났고, cursor 방은 cursor 이후부터
+        seen = {room.chatRoom_id: room.lastChat_id or 0 for room in userChatSyncRequest.rooms}
+        bounds: Dict[int, int] = {}
+        for chatRoom_id in chatRoom_ids:
+            bound = seen.get(chatRoom_id, 0)
+            if cursor is not None:
+                if chatRoom_id < cursor.chatRoom_id:
+                    continue
+                if chatRoom_id == cursor.chatRoom_id:
+                    bound = max(bound, cursor.lastChat_id or 0)
+            bounds[chatRoom_id] = bound
+
+        if not bounds:
+            return {
+                "data": [],
+                "totalCount": 0,
+                "next": None
+            }
+
+        # 방마다 (chatRoom_id = ? AND id > ?) 인덱스 범위 하나씩, 처음 받는 방은 IN 으로 묶는다
+        ranges = [
+            and_(models.Chat.chatRoom_id == chatRoom_id, models.Chat.id > bound)
+            for chatRoom_id, bound in bounds.items() if bound
+        ]
+        fresh = [chatRoom_id for chatRoom_id, bound in bounds.items() if not bound]
+        if fresh:
+            ranges.append(models.Chat.chatRoom_id.in_(fresh))
+
+        result = await db.execute(
+            select(models.Chat)
+            .where(or_(*ranges))
+            .order_by(models.Chat.chatRoom_id, models.Chat.id)
+            .limit(CHAT_SYNC_PAGE_SIZE + 1)
+        )
+        messages: Dict[Tuple[int, int], ChatMessage] = {
+            (chat.chatRoom_id, chat.id): chat_message(chat) for chat in result.scalars().all()
+        }
+        # write-behind 로 아직 DB 에 없는 최신 메시지는 history 버퍼에서 합친다
+        for chatRoom_id, bound in bounds.items():
+            for message in manager.history.after(chatRoom_id, bound):
+                messages[(chatRoom_id, message.id)] = message
+
+        ordered = sorted(messages.items(), key=lambda item: item[0])
+        page = ordered[:CHAT_SYNC_PAGE_SIZE]
+        next_cursor = None
+        if len(ordered) > CHAT_SYNC_PAGE_SIZE:
+            (chatRoom_id, chat_id), _ = page[-1]
+            next_cursor = {"chatRoom_id": chatRoom_id, "lastChat_id": chat_id}
+
+        response = [{"chatRoom_id": chatRoom_id, **message.as_row()} for (chatRoom_id, _), message in page]
+
+        return {
+            "data": response,
+            "totalCount": len(response),
+            "next": next_cursor
+        }
+
+    except SQLAlchemyError as e:
+        error_message = str(e)
+        print("SQLAlchemyError:", error_message)
+        await log_error(db, error_message)
+        raise HTTPException(status_code=500, detail="Database Error")
+    except ValueError as e:
+        error_message = str(e)
+        print("ValueError:", error_message)
+        await log_error(db, error_message)
+        raise HTTPException(status_code=400, detail={"msg": error_message})
+    except Exception as e:
+        error_message = str(e)
+        print("Exception:", error_message)
+        await log_error(db, error_message)
+        raise HTTPException(status_code=500, detail={"msg": error_message})
+
+
 # class ConnectionManager:
 #     def __init__(self):
 #         self.chat_room_connections: Dict[int, Dict[int, WebSocket]] = {}
@@ -726,55 +1115,88 @@ async def post_userChatContents(
 #             if not self.chat_room_connections.get(chatRoom_id):
 #                 del self.chat_room_connections[chatRoom_id]
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
-        self.lock = asyncio.Lock()
-
-    async def connect(self, chatRoom_id: int, websocket: WebSocket):
-        await websocket.accept()
-        async with self.lock:
-            if chatRoom_id not in self.active_connections:
-                self.active_connections[chatRoom_id] = []
-            
-            if len(self.active_connections[chatRoom_id]) >= 2:
-                await websocket.close()
-                return 
-            self.active_connections[chatRoom_id].append(websocket)
-
-    async def disconnect(self, chatRoom_id: int, websocket: WebSocket):
-        async with self.lock:
-            self.active_connections[chatRoom_id].remove(websocket)
-            if not self.active_connections[chatRoom_id]:
-                del self.active_connections[chatRoom_id]
-                
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-
-    async def broadcast(self, chatRoom_id: int, message: str):
-        connections = self.active_connections.get(chatRoom_id, [])
-        for connection in connections[:]:  
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                print(f"WebSocket 전송 오류: {e}")
-                await self.disconnect(chatRoom_id, connection)
-                
-manager = ConnectionManager()
 
 
 async def post_chat(
     db: AsyncSession, 
     chat: schemas.chatCreateRequest,
 ):
+    # 금지어/연락처 필터 (chat/filter.py) - 거절은 저장/에러 로그 없이 바로 400, mask 는 가린 본문을 저장
+    verdict = chat_filter.check(chat.contents)
+    if verdict is not None:
+        if verdict.action == REJECT:
+            raise HTTPException(status_code=400, detail={"msg": "금지어가 포함된 메시지는 보낼 수 없습니다"})
+        chat.contents = verdict.contents
+
+    # 클라이언트 키가 있으면 처음 본 키일 때만 저장한다 (모바일 재전송 중복 방지)
+    claim: Optional[asyncio.Future] = None
     try:
-        db_chat = models.Chat(user_id=chat.user_id, contents=chat.contents, chatRoom_id=chat.chatRoom_id, date=format_dates(datetime.now()))
-        db.add(db_chat)
-        await db.commit()
-        await db.refresh(db_chat)
-        
-        await manager.broadcast(f"User {chat.user_id} says: {chat.contents}", chat.chatRoom_id)
-        return {"msg": "Chat created successfully"}
+        if chat.clientKey is not None:
+            if not chat.clientKey or len(chat.clientKey) > CLIENT_KEY_MAX_LENGTH:
+                raise ValueError(f"clientKey 는 1~{CLIENT_KEY_MAX_LENGTH}자여야 합니다")
+            future, first = recent_keys.claim(chat.chatRoom_id, chat.user_id, chat.clientKey)
+            if not first:
+                result = await asyncio.shield(future)
+                if result is None:
+                    raise ValueError("같은 clientKey 의 이전 전송이 실패했습니다. 다시 보내 주세요")
+                return duplicate_chat(result)
+            claim = future
+            # write-behind 모드에서 메모리에 없는 키의 재전송은 flusher 가 배치를 저장할 때 유니크 키로 걸러낸다 (chat/writer.py)
+
+        chat_id = next_id()
+        date = format_dates(datetime.now())
+
+        # write-behind 모드면 DB 대신 writer 큐로 보내고, 배치 INSERT 는 flusher 가 처리
+        if writer.enabled:
+            # 순번은 메모리 카운터에서 - ChatRoom.lastSeq 는 flusher 가 배치 트랜잭션에서 올린다 (메시지마다 DB 왕복 없음)
+            row = {
+                "id": chat_id,
+                "user_id": chat.user_id,
+                "contents": chat.contents,
+                "chatRoom_id": chat.chatRoom_id,
+                "date": date,
+                "seq": await room_seqs.next(db, chat.chatRoom_id),
+                "clientKey": chat.clientKey,
+            }
+            existing = await writer.submit(row)
+            if existing is not None:
+                # flush 모드: 같은 clientKey 가 배치 저장 때 먼저 저장되어 있었다
+                recent_keys.resolve(claim, existing)
+                claim = None
+                return duplicate_chat(existing)
+            # flush 모드는 다른 워커와 겹쳐서 다시 매긴 순번이 row 에 들어 있다
+            seq = row["seq"]
+            msg = "Chat queued successfully" if writer.mode == "enqueue" else "Chat created successfully"
+        else:
+            seq = await reserve_seq(db, chat.chatRoom_id)
+            db_chat = models.Chat(id=chat_id, user_id=chat.user_id, contents=chat.contents, chatRoom_id=chat.chatRoom_id, date=date, seq=seq, clientKey=chat.clientKey)
+            db.add(db_chat)
+            try:
+                await advance_read_seq(db, chat.chatRoom_id, chat.user_id, seq)
+                await db.commit()
+            except IntegrityError:
+                # 메모리에서 밀려난 키나 다른 워커가 먼저 저장한 키 - 롤백하면 예약한 순번도 돌아간다
+                await db.rollback()
+                existing = await find_chat_by_key(db, chat) if chat.clientKey is not None else None
+                if existing is None:
+                    raise
+                recent_keys.db_hits += 1
+                recent_keys.resolve(claim, existing)
+                claim = None
+                return duplicate_chat(existing)
+            msg = "Chat created successfully"
+
+        result = {"msg": msg, "chat_id": chat_id, "date": date.strftime(DATE_FORMAT), "seq": seq}
+        if verdict is not None and verdict.action == MASK:
+            # 보낸 사람도 가려진 본문을 보도록
+            result["contents"] = chat.contents
+        if claim is not None:
+            recent_keys.resolve(claim, result)
+            claim = None
+        await publish_chatRoom_chat(db, chat, chat_id, date, seq)
+        if verdict is not None and verdict.flagged:
+            await flag_chat(db, chat, verdict, chat_id, date)
+        return result
         
     except SQLAlchemyError as e:
         error_message = str(e)
@@ -791,41 +1213,11 @@ async def post_chat(
         print("Exception:", error_message)
         await log_error(db, error_message)
         raise HTTPException(status_code=500, detail={"msg": error_message})
+    finally:
+        if claim is not None:
+            recent_keys.release(chat.chatRoom_id, chat.user_id, chat.clientKey, claim)
     
     
-async def get_chatId(
-    db: AsyncSession,
-    chatRoom_id: int,
-    user_id: int
-):
-    try:
-        query = (
-            select(models.Chat.id)
-            .where(models.Chat.chatRoom_id == chatRoom_id, models.Chat.user_id == user_id)
-            .order_by(models.Chat.id.desc())
-            .limit(1)
-        )
-        result = await db.execute(query)
-        existing_chat_id = result.scalar_one_or_none()
-        
-        return existing_chat_id  
-        
-    except SQLAlchemyError as e:
-        error_message = str(e)
-        print("SQLAlchemyError:", error_message)
-        await log_error(db, error_message)
-        raise HTTPException(status_code=500, detail="Database Error")
-    except ValueError as e:
-        error_message = str(e)
-        print("ValueError:", error_message)
-        await log_error(db, error_message)
-        raise HTTPException(status_code=400, detail={"msg": error_message})
-    except Exception as e:
-        error_message = str(e)
-        print("Exception:", error_message)
-        await log_error(db, error_message)
-        raise HTTPException(status_code=500, detail={"msg": error_message})
-    
 async def post_lastReadChat(
     db: AsyncSession, 
     chat: schemas.chatCreateRequest,
@@ -834,39 +1226,15 @@ async def post_lastReadChat(
         chatRoom_id = chat.chatRoom_id
         user_id = chat.user_id
         lastReadChat_id=chat.lastReadChat_id
-        
-        query = (
-            select(
-                models.ChatReadStatus
-            )
-            .where(
-                and_(
-                    models.ChatReadStatus.chatRoom_id == chatRoom_id,
-                    models.ChatReadStatus.user_id == user_id
-                )
-            )
-        )
-        
-        result = await db.execute(query)
-        existing_chat_status = result.scalar_one_or_none()
+        # 순번은 DB 에서 찾지 않는다 (history 버퍼 또는 클라이언트가 받은 seq)
+        lastReadSeq = get_chat_seq(chatRoom_id, lastReadChat_id, chat.lastReadSeq)
 
-        if existing_chat_status:
-            existing_chat_status.lastReadChat_id = lastReadChat_id
-            existing_chat_status.date = format_dates(datetime.now())
-            msg = "ChatReadStatus updated successfully"
-        
-        else:
-            db_chat = models.ChatReadStatus(
-                chatRoom_id=chatRoom_id, 
-                user_id=user_id, 
-                lastReadChat_id=lastReadChat_id, 
-                date=format_dates(datetime.now())
-            )
-            db.add(db_chat)
-            msg = "ChatReadStatus created successfully"
+        # 스크롤 중에 자주 들어오는 요청이라 메모리에서 최댓값만 남기고, 저장은 receipts 가 모아서 한다
+        if not await receipts.mark(chatRoom_id, user_id, lastReadChat_id, lastReadSeq):
+            return {"msg": "ChatReadStatus unchanged"}
 
-        await db.commit()
-        return {"msg": msg}
+        await publish_chatRoom_read(db, chatRoom_id, user_id, lastReadChat_id)
+        return {"msg": "ChatReadStatus updated successfully"}
         
     except SQLAlchemyError as e:
         error_message = str(e)
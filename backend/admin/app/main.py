@@ -1,6 +1,7 @@
 import logging
 import os
 import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from .db import database, errorLog
@@ -8,9 +9,32 @@ from starlette.middleware.sessions import SessionMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
 from .routers import admin, owner, manager, user
+from .chat import connectionManager, events, filter, receipts, shutdown, writer
+from .utils import snowflake
 from dotenv import load_dotenv
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 채팅 id 의 워커 번호 - 못 잡으면 요청을 받기 전에 시작을 멈춘다
+    snowflake.generator.start()
+    await filter.chat_filter.start()
+    await writer.writer.start()
+    await receipts.receipts.start()
+    await connectionManager.manager.start()
+    await events.party_events.start()
+    await events.chat_room_events.start()
+    shutdown.graceful.install()
+    yield
+    await shutdown.graceful.close()
+    await events.chat_room_events.close()
+    await events.party_events.close()
+    await connectionManager.manager.close()
+    await receipts.receipts.close()
+    await writer.writer.close()
+    await filter.chat_filter.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -4,6 +4,14 @@ from ..utils import schemas
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from ..oauth import oauth
+from ..chat.writer import writer
+from ..chat.receipts import receipts
+from ..chat.connectionManager import manager
+from ..chat.events import party_events, chat_room_events
+from ..chat.dedupe import recent_keys
+from ..chat.filter import chat_filter
+from ..chat.ratelimit import chat_rate_limit
+from ..chat.shutdown import graceful
 
 router = APIRouter(
     prefix="/admin",
@@ -140,4 +148,50 @@ async def update_deny_adminOwners(
         raise HTTPException(status_code=400, detail={"msg": str(e)})
     except Exception as e:
         await errorLog.log_error(db, str(e))
-        raise HTTPException(status_code=500, detail={"msg": str(e)})
\ No newline at end of file
+        raise HTTPException(status_code=500, detail={"msg": str(e)})
+
+
+@router.get(
+    "/chat/stats", 
+    summary="관리자용 채팅 서버 상태 API - 채팅 쓰기 큐 깊이, 배치 저장(flush) 지연시간, 읽음 상태 저장 대기 수, 방별 송신 큐 깊이, DB 풀 사용량 등 워커별 지표")
+async def read_adminChatStats(
+    token: str = Depends(oauth.admin_verify_token)
+):
+    if token != "SUPER_ADMIN":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to access this resource."
+        )
+    return {
+        "data": {
+            "writer": writer.stats(),
+            "readReceipts": receipts.stats(),
+            "connections": manager.stats(),
+            "partyEvents": party_events.stats(),
+            "chatRoomEvents": chat_room_events.stats(),
+            "rateLimit": chat_rate_limit.stats(),
+            "dedupe": recent_keys.stats(),
+            "filter": chat_filter.stats(),
+            "shutdown": graceful.stats(),
+            "database": {
+                "pool": database.pool_stats(database.engine),
+                "chatPool": database.pool_stats(database.chat_engine),
+            },
+        },
+        "totalCount": 0
+    }
+
+
+@router.post(
+    "/chat/filter/reload", 
+    summary="관리자용 채팅 금지어 목록 다시 읽기 API - CHAT_FILTER_WORDS 파일을 바로 다시 읽는다 (워커별, 파일이 바뀌면 각 워커가 CHAT_FILTER_RELOAD 초 안에 알아서 다시 읽음)")
+async def update_adminChatFilter(
+    token: str = Depends(oauth.admin_verify_token)
+):
+    if token != "SUPER_ADMIN":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to access this resource."
+        )
+    await chat_filter.reload(force=True)
+    return {"data": chat_filter.stats(), "totalCount": 0}
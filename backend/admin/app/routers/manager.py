@@ -1,8 +1,11 @@
-from typing import Optional
+from typing import List, Optional
 from fastapi import APIRouter
 from fastapi import Depends, HTTPException, Query, status, APIRouter
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from ..db import errorLog, managerService, database
+from ..chat.connectionManager import manager
+from ..chat.events import SSE_HEADERS
+from ..chat.filter import chat_filter
 from ..utils import schemas
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
@@ -451,4 +454,72 @@ async def read_managerPartyMatchTime(
         raise HTTPException(status_code=400, detail={"msg": str(e)})
     except Exception as e:
         await errorLog.log_error(db, str(e))
-        raise HTTPException(status_code=500, detail={"msg": str(e)})
\ No newline at end of file
+        raise HTTPException(status_code=500, detail={"msg": str(e)})
+
+@router.post(
+    "/party/announcement/{id}", 
+    summary="매니저용 파티 공지 API - 파티 이벤트 채널(/user/party/events)을 듣고 있는 유저들에게 공지 전송")
+async def create_managerPartyAnnouncement(
+    id: int,
+    data: schemas.managerPartyAnnouncement,
+    db: AsyncSession = Depends(database.get_db),
+    token: str = Depends(oauth.manager_verify_token)
+):
+    try:
+        if token not in ["ROLE_AUTH_OWNER", "ROLE_AUTH_MANAGER"]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You do not have permission to access this resource."
+            )
+        return await managerService.post_managerPartyAnnouncement(db, id, data)
+    except ValueError as e:
+        await errorLog.log_error(db, str(e))
+        raise HTTPException(status_code=400, detail={"msg": str(e)})
+    except Exception as e:
+        await errorLog.log_error(db, str(e))
+        raise HTTPException(status_code=500, detail={"msg": str(e)})
+
+
+@router.get(
+    "/chat/flags/{party_id}", 
+    summary="매니저용 채팅 모니터링 API - 금지어 필터가 flag 처리한 최근 채팅 (최신순, 워커 메모리 기준)")
+async def read_managerChatFlags(
+    party_id: int,
+    token: str = Depends(oauth.manager_verify_token)
+):
+    if token not in ["ROLE_AUTH_OWNER", "ROLE_AUTH_MANAGER"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to access this resource."
+        )
+    flags = chat_filter.recent_flags(party_id)
+    return {"data": flags, "totalCount": len(flags)}
+
+
+@router.get(
+    "/chat/tap/{party_id}", 
+    summary="매니저용 채팅 모니터링 채널(SSE, 읽기 전용) - 파티의 모든 채팅방에서 오가는 chat 이벤트를 실시간으로 받는다. chatRoom_id, user_id 를 (여러 번) 넘기면 그 방/보낸 사람만")
+async def read_managerChatTap(
+    party_id: int,
+    chatRoom_id: Optional[List[int]] = Query(None),
+    user_id: Optional[List[int]] = Query(None),
+    token: str = Depends(oauth.manager_verify_token)
+):
+    if token not in ["ROLE_AUTH_OWNER", "ROLE_AUTH_MANAGER"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to access this resource."
+        )
+    # 방 목록만 한 번 읽고, 스트림이 열려 있는 동안은 DB 세션을 잡지 않는다 (메시지는 소켓과 같은 브로드캐스트 경로에서 받음)
+    async with database.ChatSessionLocal() as db:
+        chatRoom_ids = await managerService.get_party_chatRoom_ids(db, party_id)
+    rooms = None
+    if chatRoom_id:
+        rooms = set(chatRoom_id) & set(chatRoom_ids)
+        if not rooms:
+            raise HTTPException(status_code=400, detail={"msg": f"파티의 채팅방이 아닙니다: {chatRoom_id}"})
+    return StreamingResponse(
+        manager.tap(party_id, chatRoom_ids, rooms, set(user_id) if user_id else None),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
@@ -1,12 +1,17 @@
 import json
+import math
 import os
 from fastapi import Depends, HTTPException, APIRouter, Query, WebSocket, WebSocketDisconnect, status
 from fastapi.websockets import WebSocketState
 from ..db import errorLog, userService, database
+from ..chat import protocol
+from ..chat.events import party_events, chat_room_events, chat_room_channel, SSE_HEADERS
+from ..chat.ratelimit import chat_rate_limit
+from ..chat.receipts import receipts
 from ..utils import schemas
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..oauth import kakaoLogin, oauth
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
 from typing import Optional, List
 
 router = APIRouter(
@@ -131,10 +136,30 @@ async def read_userPartyInfo(
         raise HTTPException(status_code=500, detail={"msg": str(e)})
     
 
+@router.get(
+    "/party/events/{party_id}", 
+    summary="파티 이벤트 채널(SSE) - matchStart, partyOn, partyUserOn, team, announcement, presence 이벤트를 받는다. matchTime/party 폴링 대신 사용")
+async def read_userPartyEvents(
+    party_id: int,
+    token: str = Depends(oauth.user_verify_token)
+):
+    # 스트림이 열려 있는 동안 DB 세션을 잡지 않는다. 현재 상태는 접속 직후 /party/{id} 로 한 번 가져온다
+    if token != "ROLE_USER":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to access this resource."
+        )
+    return StreamingResponse(
+        party_events.stream(party_id),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+    
+
 @router.get(
     "/partyInfo/{party_id}", 
     response_model=schemas.userPartyInfoResponse, 
-    summary="User 테이블의 party_id 에 해당하는 유저들의 정보를 가져오는 API - PartyUserInfo 테이블의 해당 유저의 partyOn 데이터가 true 인 경우의 유저들 정보만 가져오기")
+    summary="User 테이블의 party_id 에 해당하는 유저들의 정보를 가져오는 API - PartyUserInfo 테이블의 해당 유저의 partyOn 데이터가 true 인 경우의 유저들 정보만 가져오기 (online 은 채팅 소켓 접속 여부)")
 async def read_userPartyInfo( 
     party_id: int, 
     db: AsyncSession = Depends(database.get_db),
@@ -228,6 +253,25 @@ async def create_userChatRooms(
         await errorLog.log_error(db, str(e))
         raise HTTPException(status_code=500, detail={"msg": str(e)})
     
+@router.get(
+    "/chatRooms/events/{party_id}/{user_id}", 
+    summary="채팅방 리스트 이벤트 채널(SSE) - 처음 한 번 /chatRooms 로 리스트를 가져온 뒤 chat(새 메시지), chatRoom(새 채팅방), read(읽음) 변경분만 받는다")
+async def read_userChatRoomsEvents(
+    party_id: int,
+    user_id: int,
+    token: str = Depends(oauth.user_verify_token)
+):
+    if token != "ROLE_USER":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to access this resource."
+        )
+    return StreamingResponse(
+        chat_room_events.stream(chat_room_channel(party_id, user_id)),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+    
 @router.post(
     "/chat/contents", 
     summary="해당 채팅방의 채팅 내역 가져오기 API")
@@ -250,6 +294,28 @@ async def create_userChatContents(
         await errorLog.log_error(db, str(e))
         raise HTTPException(status_code=500, detail={"msg": str(e)})
     
+@router.post(
+    "/chat/sync", 
+    summary="내 모든 채팅방의 새 메시지를 한 번에 가져오기 API - 방별 마지막으로 받은 chat_id 이후 메시지를 (방, chat_id) 순서로 페이지 단위로 반환, 다음 페이지는 응답의 next 를 cursor 로 넘긴다")
+async def create_userChatSync(
+    userChatSyncRequest: schemas.userChatSyncRequest,
+    db: AsyncSession = Depends(database.get_db),
+    token: str = Depends(oauth.user_verify_token)
+):
+    try:
+        if token != "ROLE_USER":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You do not have permission to access this resource."
+            )
+        return await userService.post_userChatSync(db, userChatSyncRequest)
+    except ValueError as e:
+        await errorLog.log_error(db, str(e))
+        raise HTTPException(status_code=400, detail={"msg": str(e)})
+    except Exception as e:
+        await errorLog.log_error(db, str(e))
+        raise HTTPException(status_code=500, detail={"msg": str(e)})
+    
 @router.post(
     "/chat",
     summary="채팅 전송(생성) API")
@@ -264,8 +330,22 @@ async def create_chat(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You do not have permission to access this resource."
             )
-        return await userService.post_chat(db, chat)
+        allowed, retry_after = chat_rate_limit.check(chat.user_id, chat.chatRoom_id)
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail={"msg": "채팅을 너무 빠르게 보내고 있습니다"},
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+        result = await userService.post_chat(db, chat)
+        if result.get("duplicate"):
+            return result
+        # 웹소켓으로 보낸 채팅과 똑같이 방에 붙어 있는 소켓에 전달 (history 버퍼에도 들어간다)
+        await manager.broadcast(chat.chatRoom_id, protocol.envelope("chat", payload=chat_payload(chat, result)))
+        return result
 
+    except HTTPException as http_exc:
+        raise http_exc
     except ValueError as e:
         await errorLog.log_error(db, str(e))
         raise HTTPException(status_code=400, detail={"msg": str(e)})
@@ -274,48 +354,182 @@ async def create_chat(
         raise HTTPException(status_code=500, detail={"msg": str(e)})
 
 
-manager = userService.ConnectionManager()
+# 프로세스 당 하나의 레지스트리를 써야 워커 간 fan-out 구독이 맞는다
+manager = userService.manager
+
+
+def chat_payload(chat: schemas.chatCreateRequest, result: dict) -> dict:
+    return {
+        "user_id": chat.user_id,
+        "chatRoom_id": chat.chatRoom_id,
+        "chat_id": result["chat_id"],
+        "content": chat.contents,
+        "date": result["date"],
+        "seq": result["seq"],
+    }
+
+async def send_chat(connection, user_id: int, chatRoom_id: int, contents: Optional[str], client_id=None, client_key: Optional[str] = None):
+    # 한도를 넘은 메시지는 DB 에 닿기 전에 버리고 에러만 돌려준다. 클라이언트는 retryAfter(ms) 뒤에 다시 보낼 수 있다
+    allowed, retry_after = chat_rate_limit.check(user_id, chatRoom_id)
+    if not allowed:
+        payload = {"msg": "채팅을 너무 빠르게 보내고 있습니다", "code": "rate_limited", "retryAfter": math.ceil(retry_after * 1000)}
+        manager.send(connection, protocol.envelope("error", ack=client_id, payload=payload))
+        return
+
+    chat = schemas.chatCreateRequest(user_id=user_id, contents=contents, chatRoom_id=chatRoom_id, clientKey=client_key)
+    async with database.ChatSessionLocal() as db:
+        result = await userService.post_chat(db, chat)
+
+    # v1 클라이언트는 보낸 메시지를 다시 받지 않고 ack 만 받는다
+    if connection.fmt != protocol.LEGACY:
+        ack = {"chat_id": result["chat_id"]}
+        # 필터가 본문을 가렸으면 보낸 사람 화면도 바꿀 수 있게 같이 보낸다
+        if "contents" in result:
+            ack["content"] = result["contents"]
+        manager.send(connection, protocol.envelope("ack", ack=client_id, payload=ack))
+    # 재전송이면 이미 전달된 메시지라 ack 만 다시 보낸다
+    if result.get("duplicate"):
+        return
+    # 인코딩은 broadcast 에서 포맷별로 한 번만, 실제 전송은 소켓별 송신 큐가 처리
+    await manager.broadcast(chatRoom_id, protocol.envelope("chat", payload=chat_payload(chat, result)), sender=connection)
 
 @router.websocket("/ws/chat/{chatRoom_id}/{user_id}")
 async def websocket_endpoint(
     websocket: WebSocket, 
     chatRoom_id: int, 
     user_id: int,
-    db: AsyncSession = Depends(database.get_db),
+    lastChat_id: Optional[int] = None,
     token: str = Depends(oauth.user_verify_token)
 ):
-    
+    # 재접속할 때 마지막으로 받은 chat_id 를 lastChat_id 로 넘기면 그 이후 메시지만 다시 보내준다
+    # 소켓이 열려 있는 동안 세션을 잡고 있지 않고, 저장할 메시지가 있을 때만 채팅 전용 풀에서 꺼내 쓴다
     try:
         if token != "ROLE_USER":
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You do not have permission to access this resource."
             )
-        await manager.connect(chatRoom_id, websocket)
+        # 방 -> 파티/멤버는 캐시에서 읽는다. 파티는 접속 현황에 세고, 팀 단체방이면 멤버 수만큼 소켓을 받는다
+        async with database.ChatSessionLocal() as db:
+            members = await userService.get_chatRoom_members(db, chatRoom_id)
+        limit = manager.room_limit(len(members) - 1) if members is not None else None
+        connection = await manager.connect(chatRoom_id, websocket, lastChat_id, limit)
+        if connection is None:
+            return
+    except Exception as e:
+        await websocket.send_text(f"WebSocket 연결 처리 중 예외 발생: {e}")
+        return
+
+    # accept 뒤에 무엇이 실패하든 잡은 자리(방/전체 정원)와 구독을 돌려준다
+    try:
+        if members is not None:
+            await manager.track(connection, members[0], user_id)
         
         while True:
+            client_id = None
             try:
-                data = await websocket.receive_text()
-                chat = schemas.chatCreateRequest(user_id=user_id, contents=data, chatRoom_id=chatRoom_id)
-                await userService.post_chat(db, chat)
-                
-                chat_id = await userService.get_chatId(db, chatRoom_id, user_id)
-                message = json.dumps({
-                    "user_id": user_id,
-                    "chatRoom_id": chatRoom_id,
-                    "chat_id": chat_id,
-                    "content": data,
-                }, ensure_ascii=False)
-
-                await manager.broadcast(chatRoom_id, message)
+                received = await websocket.receive()
+                if received["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(received.get("code", 1000))
+                manager.touch(connection)
+
+                event = protocol.decode(connection.fmt, received)
+                if event["type"] == "pong":
+                    continue
+                client_id = event.get("id")
+                payload = event.get("payload") or {}
+                if event["type"] == "typing":
+                    await manager.typing(connection, chatRoom_id, user_id, bool(payload.get("typing")))
+                    continue
+                if event["type"] != "chat":
+                    raise ValueError(f"지원하지 않는 메시지 타입입니다: {event['type']}")
+
+                await send_chat(connection, user_id, chatRoom_id, payload.get("content"), client_id, payload.get("clientKey"))
             except WebSocketDisconnect:
-                await manager.disconnect(chatRoom_id, websocket)
                 break
             except Exception as e:
-                await websocket.send_text(f"WebSocket 처리 중 예외 발생: {e}")
+                manager.send(connection, protocol.envelope("error", ack=client_id, payload={"msg": f"WebSocket 처리 중 예외 발생: {e}"}))
             
     except Exception as e:
         await websocket.send_text(f"WebSocket 연결 처리 중 예외 발생: {e}")
+    finally:
+        await manager.remove(connection)
+        # 방을 나가면 모아 둔 읽음 상태를 바로 저장
+        await receipts.flush([(chatRoom_id, user_id)])
+
+
+@router.websocket("/ws/{user_id}")
+async def websocket_user_endpoint(
+    websocket: WebSocket, 
+    user_id: int,
+    party_id: Optional[int] = None,
+    token: str = Depends(oauth.user_verify_token)
+):
+    # 유저당 소켓 하나로 여러 방을 받는다 (v1 서브프로토콜 전용, 이벤트 모양은 chat/protocol.py)
+    # party_id 를 넘기면 그 파티의 내 방을 모두 구독한 상태로 시작하고, 이후 생긴 방은 subscribe 로 추가한다 (파티 접속 현황에도 이때 센다)
+    # 방마다 소켓을 여는 /ws/chat/{chatRoom_id}/{user_id} 와 달리 보고 있지 않은 방의 메시지도 받는다
+    if token != "ROLE_USER":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to access this resource."
+        )
+    connection = await manager.connect_user(user_id, websocket)
+    if connection is None:
+        return
+
+    try:
+        if party_id is not None:
+            async with database.ChatSessionLocal() as db:
+                chatRoom_ids = await userService.get_user_chatRoom_ids(db, party_id, user_id)
+            for chatRoom_id in chatRoom_ids:
+                await manager.subscribe(connection, chatRoom_id)
+            await manager.track(connection, party_id, user_id)
+
+        while True:
+            client_id = None
+            try:
+                received = await websocket.receive()
+                if received["type"] == "websocket.disconnect":
+                    break
+                manager.touch(connection)
+
+                event = protocol.decode(connection.fmt, received)
+                if event["type"] == "pong":
+                    continue
+                client_id = event.get("id")
+                payload = event.get("payload") or {}
+                chatRoom_id = int(payload.get("chatRoom_id") or 0)
+
+                if event["type"] == "subscribe":
+                    async with database.ChatSessionLocal() as db:
+                        members = await userService.get_chatRoom_members(db, chatRoom_id)
+                    if members is None or user_id not in members[1:]:
+                        raise ValueError(f"참여하지 않은 채팅방입니다: {chatRoom_id}")
+                    await manager.subscribe(connection, chatRoom_id, payload.get("lastChat_id"))
+                    manager.send(connection, protocol.envelope("ack", ack=client_id, payload={"chatRoom_id": chatRoom_id}))
+                elif event["type"] == "unsubscribe":
+                    await manager.unsubscribe(connection, chatRoom_id)
+                    await receipts.flush([(chatRoom_id, user_id)])
+                    manager.send(connection, protocol.envelope("ack", ack=client_id, payload={"chatRoom_id": chatRoom_id}))
+                elif event["type"] == "chat":
+                    if chatRoom_id not in connection.rooms:
+                        raise ValueError(f"구독하지 않은 채팅방입니다: {chatRoom_id}")
+                    await send_chat(connection, user_id, chatRoom_id, payload.get("content"), client_id, payload.get("clientKey"))
+                elif event["type"] == "typing":
+                    # 저장하지 않고 방의 다른 소켓에만 전달 (ack 없음)
+                    if chatRoom_id in connection.rooms:
+                        await manager.typing(connection, chatRoom_id, user_id, bool(payload.get("typing")))
+                else:
+                    raise ValueError(f"지원하지 않는 메시지 타입입니다: {event['type']}")
+            except WebSocketDisconnect:
+                break
+            except Exception as e:
+                manager.send(connection, protocol.envelope("error", ack=client_id, payload={"msg": f"WebSocket 처리 중 예외 발생: {e}"}))
+    finally:
+        chatRoom_ids = list(connection.rooms)
+        await manager.remove(connection)
+        # 모아 둔 읽음 상태를 바로 저장
+        await receipts.flush([(chatRoom_id, user_id) for chatRoom_id in chatRoom_ids])
         
 
 @router.post(
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Index, Integer, String, DateTime, Float, Time, func, Boolean, Text, ForeignKey
+from sqlalchemy import BigInteger, Column, Index, Integer, String, DateTime, Float, Time, func, Boolean, Text, ForeignKey
 from ..db.database import Base
 from sqlalchemy.orm import relationship
+from .snowflake import next_id
 
 class ErrorLog(Base):
     __tablename__ = "ErrorLogs"
@@ -156,11 +157,21 @@ class PartyUserInfo(Base):
 class Chat(Base):
     __tablename__ = "Chat"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # 서버에서 발급하는 시간순 id (utils/snowflake.py) - INSERT 전에 id 를 알 수 있다
+    id = Column(BigInteger, primary_key=True, index=True, autoincrement=False, default=next_id)
     user_id = Column(Integer, ForeignKey('User.id', ondelete="CASCADE"))
     contents = Column(Text)
     date = Column(DateTime, default=func.now())
     chatRoom_id = Column(Integer, ForeignKey('ChatRoom.id', ondelete="CASCADE"))
+    # 방 안에서의 순번 (chat/sequence.py)
+    seq = Column(Integer)
+    # 클라이언트가 만든 메시지 키 - 재전송 중복 방지 (chat/dedupe.py). 키 없이 보낸 채팅은 NULL
+    clientKey = Column(String(64), nullable=True)
+
+    __table_args__ = (
+        Index("ux_Chat_chatRoom_id_seq", "chatRoom_id", "seq", unique=True),
+        Index("ux_Chat_chatRoom_id_user_id_clientKey", "chatRoom_id", "user_id", "clientKey", unique=True),
+    )
 
     user = relationship("User", back_populates="chat")
     chatRooms = relationship("ChatRoom", back_populates="chat")
@@ -172,9 +183,16 @@ class ChatReadStatus(Base):
     id = Column(Integer, primary_key=True, index=True)
     chatRoom_id = Column(Integer, ForeignKey('ChatRoom.id', ondelete="CASCADE"))
     user_id = Column(Integer, ForeignKey('User.id', ondelete="CASCADE"))
-    lastReadChat_id = Column(Integer)
+    lastReadChat_id = Column(BigInteger)
+    # 마지막으로 읽은 메시지의 순번 - 안읽은 수 = ChatRoom.lastSeq - lastReadSeq
+    lastReadSeq = Column(Integer, nullable=False, default=0, server_default="0")
     date = Column(DateTime, default=func.now())
 
+    # 읽음 상태 배치 upsert(app/chat/receipts.py) 의 충돌 키
+    __table_args__ = (
+        Index("ux_ChatReadStatus_chatRoom_id_user_id", "chatRoom_id", "user_id", unique=True),
+    )
+
     user = relationship("User", back_populates="chatReadStatus")
     chatRooms = relationship("ChatRoom", back_populates="chatReadStatus")
 
@@ -186,10 +204,32 @@ class ChatRoom(Base):
     party_id = Column(Integer, ForeignKey('Party.id', ondelete="CASCADE"))
     user_id_1 = Column(Integer)
     user_id_2 = Column(Integer)
+    # 방의 마지막 메시지 순번
+    lastSeq = Column(Integer, nullable=False, default=0, server_default="0")
+    # 팀 단체방이면 조 번호 (user_id_1/user_id_2 는 NULL, 멤버는 ChatRoomMember). 1:1 방은 NULL
+    team = Column(Integer, nullable=True)
+
+    # 파티의 조마다 단체방 하나. team 이 NULL 인 1:1 방끼리는 충돌하지 않는다
+    __table_args__ = (
+        Index("ux_ChatRoom_party_id_team", "party_id", "team", unique=True),
+    )
 
     party = relationship("Party", back_populates="chatRooms")
     chat = relationship("Chat", back_populates="chatRooms")
     chatReadStatus = relationship("ChatReadStatus", back_populates="chatRooms")
+
+
+class ChatRoomMember(Base):
+    __tablename__ = "ChatRoomMember"
+
+    id = Column(Integer, primary_key=True, index=True)
+    chatRoom_id = Column(Integer, ForeignKey('ChatRoom.id', ondelete="CASCADE"))
+    user_id = Column(Integer, ForeignKey('User.id', ondelete="CASCADE"), index=True)
+    date = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index("ux_ChatRoomMember_chatRoom_id_user_id", "chatRoom_id", "user_id", unique=True),
+    )
     
 class UserMatch(Base):
     __tablename__ = "UserMatch"
@@ -151,6 +151,9 @@ class managerPartyUserInfoData(BaseModel):
 class managerPartyUserInfoDatas(BaseModel):
     data: List[managerPartyUserInfoData] 
 
+class managerPartyAnnouncement(BaseModel):
+    message: str
+
 ## user
 class userLoginResponse(BaseModel):
     name: Optional[str] = None
@@ -202,6 +205,7 @@ class userPartyInfoResponses(BaseModel):
     name: str
     gender: bool
     team: int 
+    online: bool = False
 
 class userPartyInfoResponse(BaseModel):
     data: List[userPartyInfoResponses]
@@ -233,16 +237,32 @@ class userChatContentsRequest(BaseModel):
     chatRoom_id: int
     lastChat_id: Optional[int] = None
 
+class chatSyncCursor(BaseModel):
+    chatRoom_id: int
+    lastChat_id: Optional[int] = None
+
+class userChatSyncRequest(BaseModel):
+    party_id: int
+    user_id: int
+    # 방별로 마지막으로 받은 chat_id. 없는 방은 처음부터
+    rooms: List[chatSyncCursor] = []
+    # 이전 응답의 next (다음 페이지)
+    cursor: Optional[chatSyncCursor] = None
+
 class chatCreateRequest(BaseModel):
     user_id: int
     contents: str
     chatRoom_id: int
+    # 클라이언트가 메시지마다 만드는 키 (UUID 등). 같은 키로 다시 보내면 처음 저장된 채팅을 돌려준다
+    clientKey: Optional[str] = None
     
     
 class lastReadChatRequest(BaseModel):
     chatRoom_id: int
     user_id: int
     lastReadChat_id: Optional[int] = None
+    # 클라이언트가 받은 그 채팅의 seq (채팅 이벤트/조회 응답에 들어 있음) - 있으면 서버가 순번을 따로 찾지 않는다
+    lastReadSeq: Optional[int] = None
     
 class userMatchConfirmResponse(BaseModel):
     user_id_2: Optional[int] = None
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from typing import IO, Optional
+
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+load_dotenv()
+
+# 프론트(JS Number)에서 정밀도 손실이 없도록 전체를 53비트 안에 맞춘다
+# | 41비트 ms 타임스탬프 | 5비트 워커 id | 7비트 시퀀스 |
+EPOCH_MS = 1704034800000  # 2024-01-01 00:00:00 KST
+WORKER_BITS = 5
+SEQUENCE_BITS = 7
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# 워커 id. 지정하지 않으면 시작할 때 CHAT_WORKER_LOCK_DIR 의 잠금 파일로 같은 호스트에서 안 쓰는 번호를 잡는다.
+# 여러 호스트에서 같은 DB 를 쓰면 호스트끼리는 잠금이 공유되지 않으므로 워커마다 CHAT_WORKER_ID 를 지정해야 한다
+CHAT_WORKER_ID = os.getenv("CHAT_WORKER_ID")
+CHAT_WORKER_LOCK_DIR = os.getenv("CHAT_WORKER_LOCK_DIR", "chat_worker")
+
+
+def try_lock(path: str) -> Optional[IO]:
+    """path 잠금 파일을 비차단으로 잡는다. 잡으면 열린 파일(닫으면 풀림), 다른 프로세스가 잡고 있으면 None"""
+    f = open(path, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+class SnowflakeGenerator:
+    def __init__(self, worker_id: Optional[int] = None, lock_dir: str = CHAT_WORKER_LOCK_DIR):
+        if worker_id is not None and not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER_ID}")
+        self.worker_id = worker_id
+        self.lock_dir = lock_dir
+        # 잡은 워커 id 의 잠금 파일 - 프로세스가 끝날 때까지 열어 둔다 (죽으면 OS 가 잠금을 푼다)
+        self.lock_file = None
+        self.last_ms = -1
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def start(self) -> int:
+        """워커 id 를 정한다. 앱 시작 때 호출해서 id 를 못 잡으면 요청을 받기 전에 실패하게 한다"""
+        with self.lock:
+            if self.worker_id is None:
+                self.worker_id = self.allocate()
+            return self.worker_id
+
+    def allocate(self) -> int:
+        for worker_id in range(MAX_WORKER_ID + 1):
+            f = self.hold(worker_id)
+            if f is None:
+                continue
+            self.lock_file = f
+            return worker_id
+        raise RuntimeError(
+            f"채팅 워커 id 를 잡지 못했습니다: {self.lock_dir} 의 0~{MAX_WORKER_ID} 번이 모두 사용 중입니다. "
+            "CHAT_WORKER_ID 를 워커마다 다르게 지정하세요"
+        )
+
+    def hold(self, worker_id: int) -> Optional[IO]:
+        """worker_id 를 쓰는 프로세스가 없으면 그 잠금을 잡는다 - 죽은 워커의 채팅 로그를 옮기는 동안 새 워커가 같은 id 를 못 잡게"""
+        os.makedirs(self.lock_dir, exist_ok=True)
+        return try_lock(os.path.join(self.lock_dir, f"worker-{worker_id}.lock"))
+
+    def next_id(self) -> int:
+        if self.worker_id is None:
+            self.start()
+        with self.lock:
+            now_ms = int(time.time() * 1000) - EPOCH_MS
+            # 시계가 뒤로 가거나 같은 ms 에 시퀀스를 다 쓰면 마지막 ms 를 이어 써서 단조 증가를 지킨다
+            if now_ms <= self.last_ms:
+                self.sequence = (self.sequence + 1) & MAX_SEQUENCE
+                if self.sequence == 0:
+                    self.last_ms += 1
+            else:
+                self.last_ms = now_ms
+                self.sequence = 0
+            return (self.last_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self.sequence
+
+
+generator = SnowflakeGenerator(int(CHAT_WORKER_ID) if CHAT_WORKER_ID is not None else None)
+
+
+def next_id() -> int:
+    return generator.next_id()
@@ -0,0 +1,4 @@
+-- Chat.id 를 서버 발급 snowflake id (utils/snowflake.py, 최대 53비트) 로 바꾸기 위한 컬럼 확장
+-- 기존 AUTO_INCREMENT 값은 snowflake 값보다 항상 작으므로 id 기준 정렬/페이지네이션은 그대로 유지된다
+ALTER TABLE Chat MODIFY id BIGINT NOT NULL AUTO_INCREMENT;
+ALTER TABLE ChatReadStatus MODIFY lastReadChat_id BIGINT NULL;
@@ -0,0 +1,54 @@
+-- 방별 메시지 순번 (app/chat/sequence.py)
+-- 안읽은 수를 Chat COUNT 대신 ChatRoom.lastSeq - ChatReadStatus.lastReadSeq 로 계산한다
+-- MySQL 8.0 이상 (ROW_NUMBER 윈도 함수). 서버를 내린 상태에서 실행한다.
+
+ALTER TABLE ChatRoom ADD COLUMN lastSeq INT NOT NULL DEFAULT 0;
+ALTER TABLE Chat ADD COLUMN seq INT NULL;
+ALTER TABLE ChatReadStatus ADD COLUMN lastReadSeq INT NOT NULL DEFAULT 0;
+
+-- 1. 기존 메시지에 방별로 id 순서대로 1 부터 순번 부여
+UPDATE Chat c
+JOIN (
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY chatRoom_id ORDER BY id) AS seq
+    FROM Chat
+) numbered ON numbered.id = c.id
+SET c.seq = numbered.seq;
+
+CREATE UNIQUE INDEX ux_Chat_chatRoom_id_seq ON Chat (chatRoom_id, seq);
+
+-- 2. 방의 마지막 순번
+UPDATE ChatRoom r
+JOIN (
+    SELECT chatRoom_id, MAX(seq) AS lastSeq
+    FROM Chat
+    GROUP BY chatRoom_id
+) last ON last.chatRoom_id = r.id
+SET r.lastSeq = last.lastSeq;
+
+-- 3. 읽음 순번 - 기존 안읽은 수(lastReadChat_id 이후 상대방 메시지 수)가 그대로 나오도록
+--    lastReadSeq = lastSeq - 기존 안읽은 수
+UPDATE ChatReadStatus s
+JOIN ChatRoom r ON r.id = s.chatRoom_id
+SET s.lastReadSeq = r.lastSeq - (
+    SELECT COUNT(*)
+    FROM Chat c
+    WHERE c.chatRoom_id = s.chatRoom_id
+      AND c.user_id <> s.user_id
+      AND (s.lastReadChat_id IS NULL OR c.id > s.lastReadChat_id)
+);
+
+-- 4. 읽음 상태가 없는 (방, 참여자) - 기존에는 안읽은 수가 0 이었으므로 lastReadSeq = lastSeq 로 만든다.
+--    이후 새로 생기는 방은 읽음 상태가 없으면 lastReadSeq 0 (방의 메시지를 모두 안읽음) 으로 센다
+INSERT INTO ChatReadStatus (chatRoom_id, user_id, lastReadChat_id, lastReadSeq, date)
+SELECT r.id, m.user_id, NULL, r.lastSeq, NOW()
+FROM ChatRoom r
+JOIN (
+    SELECT id AS chatRoom_id, user_id_1 AS user_id FROM ChatRoom
+    UNION
+    SELECT id AS chatRoom_id, user_id_2 AS user_id FROM ChatRoom
+) m ON m.chatRoom_id = r.id
+WHERE m.user_id IS NOT NULL
+  AND NOT EXISTS (
+    SELECT 1 FROM ChatReadStatus s
+    WHERE s.chatRoom_id = r.id AND s.user_id = m.user_id
+  );
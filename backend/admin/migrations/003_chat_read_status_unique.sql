@@ -0,0 +1,13 @@
+-- 읽음 상태 배치 upsert (app/chat/receipts.py)
+-- INSERT ... ON DUPLICATE KEY UPDATE 가 (chatRoom_id, user_id) 유니크 키로 충돌을 잡는다
+-- 서버를 내린 상태에서 실행한다.
+
+-- 1. (방, 유저) 당 행이 여러 개면 가장 많이 읽은 행만 남긴다
+DELETE s FROM ChatReadStatus s
+JOIN ChatReadStatus keep
+  ON keep.chatRoom_id = s.chatRoom_id
+ AND keep.user_id = s.user_id
+ AND (keep.lastReadSeq > s.lastReadSeq OR (keep.lastReadSeq = s.lastReadSeq AND keep.id > s.id));
+
+-- 2. 유니크 키
+CREATE UNIQUE INDEX ux_ChatReadStatus_chatRoom_id_user_id ON ChatReadStatus (chatRoom_id, user_id);
@@ -0,0 +1,6 @@
+-- 클라이언트 메시지 키 (app/chat/dedupe.py)
+-- 같은 사람이 같은 방에 같은 키로 다시 보낸 채팅은 저장하지 않는다. 키가 NULL 인 행(기존 채팅, 키 없이 보낸 채팅)끼리는 충돌하지 않는다
+-- 서버를 내린 상태에서 실행한다.
+
+ALTER TABLE Chat ADD COLUMN clientKey VARCHAR(64) NULL;
+CREATE UNIQUE INDEX ux_Chat_chatRoom_id_user_id_clientKey ON Chat (chatRoom_id, user_id, clientKey);
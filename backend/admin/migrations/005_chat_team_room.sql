@@ -0,0 +1,18 @@
+-- 팀 단체방 (PartyUserInfo.team 마다 하나)
+-- 단체방은 ChatRoom.team 에 조 번호를 넣고 user_id_1/user_id_2 는 비워 둔다. 멤버는 ChatRoomMember, 읽음 위치는 기존 ChatReadStatus 를 그대로 쓴다
+-- 방과 멤버는 매니저가 조를 배정할 때 만든다 (userService.sync_team_chatRooms). 서버를 내린 상태에서 실행한다.
+
+ALTER TABLE ChatRoom ADD COLUMN team INT NULL;
+CREATE UNIQUE INDEX ux_ChatRoom_party_id_team ON ChatRoom (party_id, team);
+
+CREATE TABLE ChatRoomMember (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    chatRoom_id INT,
+    user_id INT,
+    date DATETIME,
+    UNIQUE KEY ux_ChatRoomMember_chatRoom_id_user_id (chatRoom_id, user_id),
+    KEY ix_ChatRoomMember_user_id (user_id),
+    KEY ix_ChatRoomMember_id (id),
+    CONSTRAINT fk_ChatRoomMember_chatRoom_id FOREIGN KEY (chatRoom_id) REFERENCES ChatRoom (id) ON DELETE CASCADE,
+    CONSTRAINT fk_ChatRoomMember_user_id FOREIGN KEY (user_id) REFERENCES User (id) ON DELETE CASCADE
+);
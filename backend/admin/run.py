@@ -3,6 +3,8 @@ import subprocess
 import platform
 import psutil
 import uvicorn
+from app.chat.compression import ChatWebSocketProtocol
+from app.chat.shutdown import CHAT_DRAIN_WINDOW
 
 # def check_port_availability(port: int) -> bool:
 #     """Check if a port is already in use (works on both Windows and Linux)."""
@@ -41,5 +43,8 @@ import uvicorn
 
 if __name__ == "__main__":
     port = 9000
-    uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True)
+    # 채팅 소켓 압축 설정(CHAT_WS_DEFLATE*)은 ChatWebSocketProtocol 에서 적용
+    # 종료 시 소켓을 CHAT_DRAIN_WINDOW 동안 나눠 닫고, 응답 없는 연결은 여유 5초 뒤 강제로 끊는다 (app/chat/shutdown.py)
+    uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True, ws=ChatWebSocketProtocol,
+                timeout_graceful_shutdown=int(CHAT_DRAIN_WINDOW) + 5)
     # uvicorn.run("app.main:app", host="0.0.0.0", port=port, workers=4, loop="uvloop")
\ No newline at end of file
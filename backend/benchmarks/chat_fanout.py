@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "admin"))
+from app.chat import protocol  # noqa: E402
+from app.chat.broker import LocalBroker  # noqa: E402
+from app.chat.connectionManager import ConnectionManager  # noqa: E402
+from app.chat.events import EventHub  # noqa: E402
+
+# 팀 단체방 fan-out 벤치마크
+# 멤버 수를 늘려 가며 메시지 한 개를 방의 모든 소켓에 보내는 비용과 인코딩 횟수를 잰다
+#   소켓 전달: 소켓마다 인코딩해서 바로 send (변경 전 방식) vs ConnectionManager.broadcast (포맷별 한 번 인코딩 + 소켓별 송신 큐)
+#   채팅방 리스트 SSE: 멤버마다 EventHub.publish (멤버마다 인코딩) vs EventHub.publish_many (한 번 인코딩)
+# 소켓은 절반은 json, 절반은 msgpack 서브프로토콜
+# 사용법: python benchmarks/chat_fanout.py [--members 2 10 50] [--messages 2000]
+
+FORMATS = ["pirates.chat.v1.json", "pirates.chat.v1.msgpack"]
+
+
+class FakeWebSocket:
+    def __init__(self, subprotocol):
+        self.scope = {"subprotocols": [subprotocol]}
+        self.sent = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+    async def send_text(self, data):
+        self.sent += 1
+
+    async def send_bytes(self, data):
+        self.sent += 1
+
+
+class CountingEncode:
+    """module.name 호출 수 - 소켓 프레임은 protocol.encode, SSE 이벤트는 json.dumps"""
+
+    def __init__(self, module, name: str):
+        self.count = 0
+        self.module = module
+        self.name = name
+        self.original = getattr(module, name)
+
+    def __enter__(self):
+        def counted(*args, **kwargs):
+            self.count += 1
+            return self.original(*args, **kwargs)
+
+        setattr(self.module, self.name, counted)
+        return self
+
+    def __exit__(self, *exc):
+        setattr(self.module, self.name, self.original)
+
+
+def chat_event(seq: int) -> dict:
+    return protocol.envelope("chat", payload={
+        "user_id": 1, "chatRoom_id": 1, "chat_id": seq, "content": "오늘 저녁 몇 시에 모여요?",
+        "date": "2025-01-31T20:00:00", "seq": seq,
+    })
+
+
+async def bench_sockets(members: int, messages: int):
+    manager = ConnectionManager(broker=LocalBroker(), queue_size=messages + 1)
+    sockets = [FakeWebSocket(FORMATS[i % 2]) for i in range(members)]
+    limit = manager.room_limit(members)
+    connections = [await manager.connect(1, websocket, limit=limit) for websocket in sockets]
+    assert all(connections), f"방 정원({limit})이 멤버 수({members})보다 작습니다"
+
+    # 변경 전: 소켓마다 인코딩하고 순서대로 await send
+    with CountingEncode(protocol, "encode") as counter:
+        start = time.perf_counter()
+        for seq in range(messages):
+            event = chat_event(seq)
+            for connection in connections:
+                data = protocol.encode(event, connection.fmt)
+                if isinstance(data, bytes):
+                    await connection.websocket.send_bytes(data)
+                else:
+                    await connection.websocket.send_text(data)
+        naive = (time.perf_counter() - start) / messages * 1e6
+        naive_encodes = counter.count / messages
+
+    # 변경 후: broadcast 는 큐에 넣고 돌아오고, 송신 태스크가 보낸다 - 다 보낼 때까지 잰다
+    for websocket in sockets:
+        websocket.sent = 0
+    with CountingEncode(protocol, "encode") as counter:
+        start = time.perf_counter()
+        for seq in range(messages):
+            await manager.broadcast(1, chat_event(seq))
+        broadcast_return = (time.perf_counter() - start) / messages * 1e6
+        while manager.events_sent < messages * members:
+            await asyncio.sleep(0)
+        fanout = (time.perf_counter() - start) / messages * 1e6
+        # 버스로 보내는 json 인코딩 포함 (LocalBroker 는 보내지 않지만 인코딩은 한다)
+        fanout_encodes = counter.count / messages
+
+    for connection in connections:
+        await manager.remove(connection)
+    return naive, naive_encodes, broadcast_return, fanout, fanout_encodes
+
+
+async def bench_room_list(members: int, messages: int):
+    hub = EventHub(prefix=b"bench:", broker=LocalBroker(), queue_size=messages * 2 + 2)
+    channels = list(range(members))
+    queues = [await hub.subscribe(channel) for channel in channels]
+    payload = {"party_id": 1, "chatRoom_id": 1, "chat_id": 1, "user_id": 1, "contents": "오늘 저녁 몇 시에 모여요?",
+               "date": "2025-01-31T20:00:00", "seq": 1}
+
+    with CountingEncode(json, "dumps") as counter:
+        start = time.perf_counter()
+        for _ in range(messages):
+            for channel in channels:
+                await hub.publish(channel, "chat", payload)
+        each = (time.perf_counter() - start) / messages * 1e6
+        each_encodes = counter.count / messages
+
+    with CountingEncode(json, "dumps") as counter:
+        start = time.perf_counter()
+        for _ in range(messages):
+            await hub.publish_many(channels, "chat", payload)
+        many = (time.perf_counter() - start) / messages * 1e6
+        many_encodes = counter.count / messages
+
+    assert all(queue.qsize() == messages * 2 for queue in queues)
+    return each, each_encodes, many, many_encodes
+
+
+async def main(args):
+    print(f"메시지 {args.messages}개, 메시지 한 개당 시간(us)과 인코딩 횟수\n")
+    print("[소켓 전달]")
+    print(f"{'멤버':>6}{'변경 전':>10}{'인코딩':>8}{'broadcast 반환':>16}{'전송 완료':>11}{'인코딩':>8}")
+    for members in args.members:
+        naive, naive_encodes, returned, fanout, encodes = await bench_sockets(members, args.messages)
+        print(f"{members:>8}{naive:>11.1f}{naive_encodes:>10.1f}{returned:>16.1f}{fanout:>13.1f}{encodes:>10.1f}")
+
+    print("\n[채팅방 리스트 SSE]")
+    print(f"{'멤버':>6}{'publish x N':>13}{'인코딩':>8}{'publish_many':>14}{'인코딩':>8}")
+    for members in args.members:
+        each, each_encodes, many, many_encodes = await bench_room_list(members, args.messages)
+        print(f"{members:>8}{each:>13.1f}{each_encodes:>10.1f}{many:>14.1f}{many_encodes:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, nargs="+", default=[2, 10, 50])
+    parser.add_argument("--messages", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "admin"))
+from app.chat.filter import AhoCorasick, ChatFilter  # noqa: E402
+
+# 채팅 금지어 필터 벤치마크
+# 금지어 수를 늘려 가며 메시지 한 개 검사 시간을 비교한다
+#   단어별 in: 금지어마다 `word in text` (단어 수에 비례)
+#   단어별 정규식: 금지어마다 미리 컴파일한 정규식 search
+#   합친 정규식: 금지어 전체를 | 로 묶은 정규식 하나 (위치마다 후보를 되짚어서 단어 수의 영향을 받는다)
+#   Aho-Corasick: app/chat/filter.py (본문 길이에 비례)
+# 사용법: python benchmarks/chat_filter.py [--patterns 100 1000 10000] [--messages 2000]
+
+HANGUL = [chr(code) for code in range(0xAC00, 0xD7A4)]
+COMMON = "가나다라마바사아자차카타파하이그저는은을를에서도요네" * 4
+LATIN = "abcdefghijklmnopqrstuvwxyz"
+
+
+def random_word(rng: random.Random) -> str:
+    if rng.random() < 0.2:
+        return "".join(rng.choice(LATIN) for _ in range(rng.randint(4, 8)))
+    return "".join(rng.choice(HANGUL) for _ in range(rng.randint(2, 4)))
+
+
+def random_message(rng: random.Random, words, hit_rate: float) -> str:
+    # 일상 채팅처럼 자주 쓰는 글자 위주 + 일부 메시지에만 금지어
+    text = [rng.choice(COMMON) if rng.random() < 0.8 else rng.choice(HANGUL) for _ in range(rng.randint(10, 120))]
+    for i in range(len(text) // 6):
+        text[rng.randrange(len(text))] = " "
+    if rng.random() < hit_rate:
+        position = rng.randrange(len(text))
+        text[position:position] = list(rng.choice(words))
+    return "".join(text)
+
+
+def per_message_us(fn, messages) -> float:
+    start = time.perf_counter()
+    for message in messages:
+        fn(message)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def main(args):
+    rng = random.Random(1)
+    print(f"메시지 {args.messages}개 (10~120자, {args.hit_rate:.0%} 에 금지어), 메시지 한 개 검사 시간(us)\n")
+    print(f"{'금지어 수':>8}{'만들기 ms':>11}{'단어별 in':>11}{'단어별 정규식':>13}{'합친 정규식':>12}{'Aho-Corasick':>14}{'필터 check':>12}")
+    for count in args.patterns:
+        words = list({random_word(rng) for _ in range(count * 2)})[:count]
+        messages = [random_message(rng, words, args.hit_rate) for _ in range(args.messages)]
+
+        start = time.perf_counter()
+        matcher = AhoCorasick(words)
+        build_ms = (time.perf_counter() - start) * 1000
+        regexes = [re.compile(re.escape(word)) for word in words]
+        # 긴 단어가 먼저 걸리도록 길이순 (짧은 단어가 앞에 있으면 겹친 긴 단어를 놓친다)
+        combined = re.compile("|".join(re.escape(word) for word in sorted(words, key=len, reverse=True)))
+        chat_filter = ChatFilter(path=os.devnull, contact="off", reload_interval=1e9)
+        chat_filter.load(words)
+
+        # 걸린 메시지가 같은지 확인
+        for message in messages[:200]:
+            expected = {word for word in words if word in message}
+            found = {matcher.patterns[index] for _, _, index in matcher.finditer(message)}
+            assert expected == found, "단어별 in 과 Aho-Corasick 결과가 다릅니다"
+
+        naive = per_message_us(lambda text: [word for word in words if word in text], messages[: max(args.messages // 10, 1)])
+        regex = per_message_us(lambda text: [r for r in regexes if r.search(text)], messages[: max(args.messages // 10, 1)])
+        joined = per_message_us(lambda text: combined.findall(text), messages)
+        aho = per_message_us(lambda text: list(matcher.finditer(text)), messages)
+        checked = per_message_us(chat_filter.check, messages)
+        print(f"{count:>10}{build_ms:>11.1f}{naive:>11.1f}{regex:>15.1f}{joined:>14.1f}{aho:>14.1f}{checked:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patterns", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--hit-rate", type=float, default=0.05)
+    main(parser.parse_args())
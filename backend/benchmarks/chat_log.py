@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, time as dtime
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "admin"))
+os.environ.setdefault("DATABASE_PORT", "3306")
+from app.chat.sequence import room_seqs  # noqa: E402
+from app.chat.wal import ChatLog  # noqa: E402
+from app.chat.writer import ChatWriter  # noqa: E402
+from app.db import database, userService  # noqa: E402
+from app.db.database import Base  # noqa: E402
+from app.utils import models, schemas  # noqa: E402
+from app.utils.snowflake import next_id  # noqa: E402
+
+# 채팅 저장 경로 벤치마크: 메시지마다 DB commit (direct) vs 로컬 로그 fsync 후 응답 + 백그라운드 복제 (wal)
+# 동시에 보내는 사람 수를 늘려 가며 응답 지연(p50/p99)과 처리량, wal 모드의 DB 반영 지연, 재시작 복구 시간을 잰다
+# 두 경로 모두 실제 userService.post_chat 을 부른다 - direct 는 순번 예약(reserve_seq) + INSERT + commit,
+# wal 은 메모리 순번(room_seqs) + 로그 fsync (ChatRoom.lastSeq 는 writer 가 배치로 올린다)
+# 기본은 임시 디렉터리의 sqlite 파일 (commit 마다 fsync). 실제 MySQL 은 --url 로 지정 (테이블을 만들고 데이터를 넣으므로 벤치마크 전용 DB)
+# 사용법: python benchmarks/chat_log.py [--messages 2000] [--senders 1 16 64]
+
+PARTY_ID = 1
+ROOMS = 64
+
+
+async def setup(url: str):
+    # sqlite 는 쓰기가 한 번에 하나라서 동시 전송이 많으면 잠금 대기가 길다 - 에러 대신 대기 시간으로 보이게 timeout 을 늘린다
+    engine = create_async_engine(url, connect_args={"timeout": 120} if url.startswith("sqlite") else {})
+    if url.startswith("sqlite"):
+        @event.listens_for(engine.sync_engine, "connect")
+        def sqlite_functions(conn, record):
+            conn.create_function("greatest", -1, max)
+            # reserve_seq 의 LAST_INSERT_ID(expr) - MySQL 처럼 연결마다 값을 기억한다
+            last_insert_id = [0]
+
+            def last_insert_id_function(*args):
+                if args:
+                    last_insert_id[0] = args[0]
+                return last_insert_id[0]
+            conn.create_function("last_insert_id", -1, last_insert_id_function)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as db:
+        db.add(models.Party(id=PARTY_ID, number=ROOMS * 2, partyOn=True, partyDate=datetime(2025, 1, 31), partyTime=dtime(20, 0),
+                            matchStartTime=datetime(2025, 1, 31, 22, 0, 0)))
+        for user_id in range(1, ROOMS * 2 + 1):
+            db.add(models.User(id=user_id, party_id=PARTY_ID))
+        for room in range(1, ROOMS + 1):
+            db.add(models.ChatRoom(id=room, party_id=PARTY_ID, user_id_1=room * 2 - 1, user_id_2=room * 2, lastSeq=0))
+        await db.commit()
+    # writer 는 채팅 전용 세션 팩토리를 쓴다. 메모리 순번은 새로 만든 DB 의 lastSeq 부터
+    database.ChatSessionLocal = session_factory
+    room_seqs.last.clear()
+    return engine, session_factory
+
+
+def make_chat(sender: int, seq: int) -> schemas.chatCreateRequest:
+    room = sender % ROOMS + 1
+    return schemas.chatCreateRequest(user_id=room * 2 - 1, contents=f"메시지 {sender}-{seq}", chatRoom_id=room)
+
+
+async def run_senders(session_factory, writer: ChatWriter, senders: int, messages: int):
+    """post_chat 이 보는 writer 를 바꿔 끼우고 동시에 보낸다 (요청마다 세션 하나 - 라우터의 get_db 처럼)"""
+    userService.writer = writer
+    latencies = []
+
+    async def sender(index: int):
+        for seq in range(messages // senders):
+            chat = make_chat(index, seq)
+            start = time.perf_counter()
+            async with session_factory() as db:
+                await userService.post_chat(db, chat)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender(index) for index in range(senders)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    return p50, p99, len(latencies) / elapsed
+
+
+async def count_chats(session_factory) -> int:
+    async with session_factory() as db:
+        return await db.scalar(select(func.count(models.Chat.id)))
+
+
+async def bench(url: str, wal_dir: str, senders: int, messages: int, fsync_ms: float):
+    engine, session_factory = await setup(url)
+    try:
+        direct = await run_senders(session_factory, ChatWriter(mode="direct"), senders, messages)
+
+        shutil.rmtree(wal_dir, ignore_errors=True)
+        writer = ChatWriter(mode="wal")
+        writer.log = ChatLog(wal_dir, fsync_ms=fsync_ms)
+        await writer.start()
+        before = await count_chats(session_factory)
+        wal = await run_senders(session_factory, writer, senders, messages)
+        # 마지막 응답 이후 DB 에 다 반영될 때까지
+        start = time.perf_counter()
+        sent = messages // senders * senders
+        while await count_chats(session_factory) - before < sent:
+            await asyncio.sleep(0.005)
+        lag_ms = (time.perf_counter() - start) * 1000
+        fsyncs = writer.log.fsyncs
+        await writer.close()
+        async with session_factory() as db:
+            last_seq = await db.scalar(select(func.sum(models.ChatRoom.lastSeq)))
+        assert last_seq == before + sent, "ChatRoom.lastSeq 가 저장된 메시지 수와 다릅니다"
+    finally:
+        await engine.dispose()
+    return direct, wal, lag_ms, sent / max(fsyncs, 1)
+
+
+async def bench_recovery(url: str, wal_dir: str, messages: int):
+    """로그에만 쓰고 DB 로 옮기기 전에 죽은 상황 -> 다시 시작할 때 recover 가 옮기는 시간"""
+    engine, session_factory = await setup(url)
+    try:
+        shutil.rmtree(wal_dir, ignore_errors=True)
+        log = ChatLog(wal_dir, fsync_ms=0)
+        log.open()
+        log.start()
+        seqs = {}
+        rows = []
+        for index in range(messages):
+            chat = make_chat(index, 0)
+            seqs[chat.chatRoom_id] = seqs.get(chat.chatRoom_id, 0) + 1
+            rows.append({
+                "id": next_id(),
+                "user_id": chat.user_id,
+                "contents": chat.contents,
+                "chatRoom_id": chat.chatRoom_id,
+                "date": datetime.now().replace(microsecond=0),
+                "seq": seqs[chat.chatRoom_id],
+                "clientKey": None,
+            })
+        await asyncio.gather(*(log.append(row) for row in rows))
+        await log.close()
+
+        writer = ChatWriter(mode="wal")
+        writer.log = ChatLog(wal_dir)
+        start = time.perf_counter()
+        await writer.start()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        recovered = await count_chats(session_factory)
+        await writer.close()
+    finally:
+        await engine.dispose()
+    print(f"\n[복구] 로그에만 있던 {messages}건 -> 시작할 때 {recovered}건을 DB 로 옮김, {elapsed_ms:.1f} ms")
+    assert recovered == messages, "복구된 메시지 수가 다릅니다"
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="chat_log_bench_")
+    url = args.url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}"
+    wal_dir = os.path.join(workdir, "wal")
+    try:
+        print(f"메시지 {args.messages}개, 그룹 커밋 대기 {args.fsync_ms}ms, DB {url.split(':')[0]}\n")
+        print(f"{'동시 전송':>6}{'direct p50':>12}{'p99':>11}{'msg/s':>8}{'wal p50':>11}{'p99':>11}{'msg/s':>8}{'fsync당':>8}{'DB 반영':>9}")
+        for senders in args.senders:
+            (d50, d99, drate), (w50, w99, wrate), lag_ms, per_fsync = await bench(url, wal_dir, senders, args.messages, args.fsync_ms)
+            print(f"{senders:>10}{d50:>10.2f}ms{d99:>9.2f}ms{drate:>8.0f}{w50:>9.2f}ms{w99:>9.2f}ms{wrate:>8.0f}{per_fsync:>10.1f}{lag_ms:>9.0f}ms")
+        await bench_recovery(url, wal_dir, args.messages)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--senders", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--fsync-ms", type=float, default=1.0)
+    asyncio.run(main(parser.parse_args()))
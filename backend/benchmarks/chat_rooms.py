@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, time as dtime, timedelta
+
+from sqlalchemy import case, event, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "admin"))
+os.environ.setdefault("DATABASE_PORT", "3306")
+from app.db import userService  # noqa: E402
+from app.db.database import Base  # noqa: E402
+from app.utils import models, schemas  # noqa: E402
+
+# 채팅방 리스트(post_userChatRooms) 벤치마크
+# 방 수를 늘려 가며 기존 방식(방마다 쿼리 3개)과 단일 쿼리 방식의 쿼리 수와 지연시간을 비교한다
+# 기본은 메모리 sqlite 에 --rtt-ms 만큼 쿼리당 네트워크 왕복 시간을 더해서 잰다. 실제 MySQL 은 --url 로 지정
+# (--url 로 지정한 DB 에는 테이블을 만들고 데이터를 넣으므로 벤치마크 전용 DB 를 쓸 것)
+# 사용법: python benchmarks/chat_rooms.py [--rooms 1 5 20 50 100] [--messages 50] [--rtt-ms 0.5]
+
+PARTY_ID = 1
+USER_ID = 1
+
+
+async def legacy_chat_rooms(db: AsyncSession, party_id: int, user_id: int) -> list:
+    """변경 전 post_userChatRooms - 방 목록 1번 + 방마다 상대방 정보/마지막 메시지/안읽은 수 3번"""
+    result = await db.execute(
+        select(models.ChatRoom.id, models.ChatRoom.user_id_1, models.ChatRoom.user_id_2)
+        .where(
+            models.ChatRoom.party_id == party_id,
+            or_(models.ChatRoom.user_id_1 == user_id, models.ChatRoom.user_id_2 == user_id),
+        )
+    )
+    response = []
+    for chat_room_id, user_id_1, user_id_2 in result.fetchall():
+        other_user_id = user_id_1 if user_id != user_id_1 else user_id_2
+        user_info = (await db.execute(
+            select(models.UserInfo.name, models.UserInfo.gender, models.PartyUserInfo.team)
+            .join(models.PartyUserInfo, models.PartyUserInfo.user_id == models.UserInfo.user_id)
+            .where(models.UserInfo.user_id == other_user_id)
+        )).fetchone()
+        latest_chat = (await db.execute(
+            select(models.Chat.contents, models.Chat.date)
+            .where(models.Chat.chatRoom_id == chat_room_id)
+            .order_by(models.Chat.date.desc())
+        )).fetchone()
+        unread_count = (await db.execute(
+            select(func.count(models.Chat.id))
+            .join(models.ChatReadStatus, models.Chat.chatRoom_id == models.ChatReadStatus.chatRoom_id)
+            .where(models.ChatReadStatus.user_id == user_id)
+            .where(case(
+                (models.ChatReadStatus.lastReadChat_id.is_(None), True),
+                (models.Chat.id > models.ChatReadStatus.lastReadChat_id, True),
+                else_=False,
+            ))
+            .where(models.Chat.chatRoom_id == chat_room_id)
+            .where(models.Chat.user_id != user_id)
+        )).scalar()
+        response.append((chat_room_id, other_user_id, user_info, latest_chat, unread_count))
+    return response
+
+
+async def seed(session_factory, rooms: int, messages: int):
+    async with session_factory() as db:
+        db.add(models.Party(id=PARTY_ID, number=rooms + 1, partyOn=True, partyDate=datetime(2025, 1, 31), partyTime=dtime(20, 0),
+                            matchStartTime=datetime(2025, 1, 31, 22, 0, 0)))
+        for user_id in range(USER_ID, USER_ID + rooms + 1):
+            db.add(models.User(id=user_id, party_id=PARTY_ID))
+            db.add(models.UserInfo(user_id=user_id, name=f"user{user_id}", gender=user_id % 2 == 0))
+            db.add(models.PartyUserInfo(user_id=user_id, team=user_id % 4 + 1, partyOn=True))
+
+        chat_id = 1
+        date = datetime(2025, 1, 31, 20, 0, 0)
+        for room in range(1, rooms + 1):
+            other = USER_ID + room
+            db.add(models.ChatRoom(id=room, party_id=PARTY_ID, user_id_1=other, user_id_2=USER_ID, lastSeq=messages))
+            last_read_chat_id, last_read_seq = None, 0
+            for seq in range(1, messages + 1):
+                # 앞쪽 절반은 주고받은 뒤 읽은 상태, 뒤쪽 절반은 상대방이 보낸 안 읽은 메시지
+                # (보내면 자기 메시지까지 읽은 것으로 올라가므로 안 읽은 구간에는 상대 메시지만 있다)
+                sender = USER_ID if seq % 2 and seq <= messages // 2 else other
+                db.add(models.Chat(id=chat_id, user_id=sender, contents=f"메시지 {seq}", chatRoom_id=room, date=date, seq=seq))
+                if seq <= messages // 2:
+                    last_read_chat_id, last_read_seq = chat_id, seq
+                chat_id += 1
+                date += timedelta(seconds=1)
+            db.add(models.ChatReadStatus(chatRoom_id=room, user_id=USER_ID, lastReadChat_id=last_read_chat_id, lastReadSeq=last_read_seq))
+        await db.commit()
+
+
+async def measure(session_factory, counter: dict, fn, repeat: int):
+    # 첫 실행은 캐시/커넥션 준비용으로 버린다
+    async with session_factory() as db:
+        await fn(db)
+    counter["queries"] = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        async with session_factory() as db:
+            await fn(db)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+    return counter["queries"] / repeat, elapsed_ms
+
+
+async def run(url: str, rooms: int, messages: int, rtt_ms: float, repeat: int):
+    kwargs = {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}} if url.startswith("sqlite") else {}
+    engine = create_async_engine(url, **kwargs)
+    counter = {"queries": 0}
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        counter["queries"] += 1
+        if rtt_ms:
+            time.sleep(rtt_ms / 1000)
+
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+        saved_rtt, rtt_ms = rtt_ms, 0
+        await seed(session_factory, rooms, messages)
+        rtt_ms = saved_rtt
+
+        request = schemas.userChatRoomsRequest(party_id=PARTY_ID, user_id=USER_ID)
+        legacy = await measure(session_factory, counter, lambda db: legacy_chat_rooms(db, PARTY_ID, USER_ID), repeat)
+        current = await measure(session_factory, counter, lambda db: userService.post_userChatRooms(db, request), repeat)
+
+        # 두 방식의 결과(상대방, 마지막 메시지, 안읽은 수)가 같은지 확인
+        async with session_factory() as db:
+            old = {row[0]: (row[1], row[3][0] if row[3] else "", row[4]) for row in await legacy_chat_rooms(db, PARTY_ID, USER_ID)}
+            new = {room["id"]: (room["user_id_2"], room["contents"], room["unreadCount"]) for room in (await userService.post_userChatRooms(db, request))["data"]}
+        assert old == new, "기존 방식과 결과가 다릅니다"
+    finally:
+        await engine.dispose()
+    return legacy, current
+
+
+async def main(args):
+    print(f"방당 메시지 {args.messages}개, 쿼리당 왕복 {args.rtt_ms}ms, {args.repeat}회 평균\n")
+    print(f"{'방 수':>6}{'기존 쿼리':>10}{'기존 ms':>10}{'단일 쿼리':>10}{'단일 ms':>10}")
+    for rooms in args.rooms:
+        (legacy_queries, legacy_ms), (queries, ms) = await run(args.url, rooms, args.messages, args.rtt_ms, args.repeat)
+        print(f"{rooms:>6}{legacy_queries:>10.0f}{legacy_ms:>10.2f}{queries:>10.0f}{ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="sqlite+aiosqlite://")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1, 5, 20, 50, 100])
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--rtt-ms", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
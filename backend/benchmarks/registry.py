@@ -0,0 +1,227 @@
+import argparse
+import asyncio
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict, deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "admin"))
+from app.chat import protocol  # noqa: E402
+from app.chat.broker import LocalBroker  # noqa: E402
+from app.chat.connectionManager import ConnectionManager  # noqa: E402
+from app.chat.protocol import Frame  # noqa: E402
+
+# 채팅 소켓 레지스트리(ConnectionManager) 마이크로벤치마크
+# 실제 소켓 대신 가짜 웹소켓으로 연결/브로드캐스트/해제 비용, 연결 레코드 메모리, 정원 초과 처리를 잰다
+# 비교 대상은 변경 전 방식 (전역 락, accept 후 정원 확인, 방별 list 에서 O(n) 삭제)
+# 사용법: python benchmarks/registry.py [--connections 50000]
+
+
+class FakeWebSocket:
+    def __init__(self, subprotocols=()):
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.accepted = False
+
+    async def accept(self, subprotocol=None):
+        self.accepted = True
+
+    async def close(self, code=1000):
+        pass
+
+    async def send_text(self, data):
+        pass
+
+    async def send_bytes(self, data):
+        pass
+
+
+class LegacyConnection:
+    def __init__(self, chatRoom_id, websocket, fmt=protocol.LEGACY):
+        self.chatRoom_id = chatRoom_id
+        self.websocket = websocket
+        self.fmt = fmt
+        self.queue = deque()
+        self.ready = asyncio.Event()
+        self.sender = None
+        self.closing = False
+        self.last_seen = time.monotonic()
+
+
+async def idle_drain(connection):
+    return None
+
+
+class LegacyRegistry:
+    """변경 전 ConnectionManager 의 등록/해제/전달 부분 (송신 태스크, heartbeat 목록, 버스 구독 포함)"""
+
+    def __init__(self, room_max_sockets=2):
+        self.active_connections = {}
+        self.lock = asyncio.Lock()
+        self.broker = LocalBroker()
+        self.recent = OrderedDict()
+        self.room_max_sockets = room_max_sockets
+        self.accepted_then_closed = 0
+
+    async def connect(self, chatRoom_id, websocket):
+        await websocket.accept()
+        async with self.lock:
+            connections = self.active_connections.setdefault(chatRoom_id, [])
+            if len(connections) >= self.room_max_sockets:
+                self.accepted_then_closed += 1
+                await websocket.close()
+                return None
+            connection = LegacyConnection(chatRoom_id, websocket)
+            connection.sender = asyncio.create_task(idle_drain(connection))
+            connections.append(connection)
+            self.recent[connection] = None
+            if len(connections) == 1:
+                await self.broker.subscribe(chatRoom_id)
+        return connection
+
+    async def disconnect(self, chatRoom_id, websocket):
+        async with self.lock:
+            connections = self.active_connections.get(chatRoom_id)
+            connection = next((c for c in connections if c.websocket is websocket), None)
+            connections.remove(connection)
+            self.recent.pop(connection, None)
+            if not connections:
+                del self.active_connections[chatRoom_id]
+                await self.broker.unsubscribe(chatRoom_id)
+        connection.sender.cancel()
+
+    def deliver(self, chatRoom_id, frame):
+        for connection in self.active_connections.get(chatRoom_id, [])[:]:
+            connection.queue.append(frame)
+            connection.ready.set()
+
+
+def new_manager(room_max_sockets=2, user_max_sockets=5):
+    # 송신 큐만 보고 실제 전송은 하지 않도록 drain 을 바로 끝낸다 (송신 태스크는 첫 전송 때 만들어진다)
+    manager = ConnectionManager(broker=LocalBroker(), room_max_sockets=room_max_sockets, user_max_sockets=user_max_sockets)
+    manager.drain = idle_drain
+    return manager
+
+
+def timed(label, n, start):
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28}{elapsed * 1000:>10.1f} ms  {elapsed / n * 1e6:>8.2f} us/op")
+
+
+async def bench_rooms(n):
+    """1:1 방 n/2 개에 방 단위 소켓 2개씩"""
+    rooms = n // 2
+    order = [(room, i) for room in range(rooms) for i in range(2)]
+    random.shuffle(order)
+    frame = Frame(protocol.envelope("chat", payload={"content": "안녕하세요"}))
+
+    print(f"\n[방 단위 소켓 {n}개 / 방 {rooms}개]")
+    for name in ("변경 전", "변경 후"):
+        registry = LegacyRegistry() if name == "변경 전" else new_manager()
+        sockets = {key: FakeWebSocket() for key in order}
+        connections = {}
+        print(f" {name}")
+
+        start = time.perf_counter()
+        for key in order:
+            connections[key] = await registry.connect(key[0], sockets[key])
+        timed("connect", n, start)
+
+        # 변경 후에는 소켓의 첫 메시지 때 송신 태스크를 만들어서 첫 회와 이후를 나눠 잰다
+        for label in ("broadcast (첫 메시지)", "broadcast (이후)"):
+            start = time.perf_counter()
+            for room in range(rooms):
+                if name == "변경 전":
+                    registry.deliver(room, frame)
+                else:
+                    await registry.deliver(room, frame)
+            timed(label, rooms, start)
+
+        random.shuffle(order)
+        start = time.perf_counter()
+        for key in order:
+            if name == "변경 전":
+                await registry.disconnect(key[0], sockets[key])
+            else:
+                await registry.remove(connections[key])
+        timed("disconnect", n, start)
+
+
+async def bench_hot_room(n, legacy_n):
+    """유저 소켓 n개가 한 방을 같이 구독 (단체방/라이브 탭처럼 한 방에 소켓이 몰린 경우) - 무작위 순서로 해제"""
+    print(f"\n[한 방에 소켓 {n}개, 무작위 순서로 해제]")
+    manager = new_manager(user_max_sockets=1)
+    connections = []
+    for user_id in range(n):
+        connection = await manager.connect_user(user_id, FakeWebSocket(["pirates.chat.v1.json"]))
+        await manager.subscribe(connection, 1)
+        connections.append(connection)
+    random.shuffle(connections)
+    start = time.perf_counter()
+    for connection in connections:
+        await manager.remove(connection)
+    print(" 변경 후")
+    timed("remove", n, start)
+
+    # 변경 전 방식은 O(n^2) 라 legacy_n 개로 재고 n 개 기준으로 환산
+    registry = LegacyRegistry(room_max_sockets=legacy_n)
+    sockets = [FakeWebSocket() for _ in range(legacy_n)]
+    for websocket in sockets:
+        await registry.connect(1, websocket)
+    random.shuffle(sockets)
+    start = time.perf_counter()
+    for websocket in sockets:
+        await registry.disconnect(1, websocket)
+    elapsed = time.perf_counter() - start
+    print(f" 변경 전 ({legacy_n}개로 측정)")
+    print(f"  {'disconnect':<28}{elapsed * 1000:>10.1f} ms  {elapsed / legacy_n * 1e6:>8.2f} us/op")
+    scaled = elapsed * (n / legacy_n) ** 2
+    print(f"  {f'{n}개 환산 (n^2)':<28}{scaled * 1000:>10.1f} ms  {scaled / n * 1e6:>8.2f} us/op")
+
+
+async def bench_memory(n):
+    print(f"\n[소켓 {n}개 등록 후 레지스트리 메모리 (연결 레코드, 송신 큐, 송신 태스크, 방/heartbeat 목록)]")
+    for name in ("변경 전", "변경 후"):
+        registry = LegacyRegistry() if name == "변경 전" else new_manager()
+        sockets = [FakeWebSocket() for _ in range(n)]
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        records = [await registry.connect(i // 2, websocket) for i, websocket in enumerate(sockets)]
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        print(f"  {name:<28}{used / 1024 / 1024:>10.1f} MB  {used / n:>8.0f} B/연결")
+        for record, websocket in zip(records, sockets):
+            if name == "변경 전":
+                await registry.disconnect(record.chatRoom_id, websocket)
+            else:
+                await registry.remove(record)
+
+
+async def bench_admission(attempts):
+    """정원 2 인 방에 동시에 attempts 개가 붙으려고 할 때 accept 된 소켓 수"""
+    print(f"\n[정원 2 인 방에 동시에 {attempts}개 접속 시도]")
+    for name in ("변경 전", "변경 후"):
+        registry = LegacyRegistry() if name == "변경 전" else new_manager()
+        sockets = [FakeWebSocket() for _ in range(attempts)]
+        results = await asyncio.gather(*(registry.connect(7, websocket) for websocket in sockets))
+        accepted = sum(1 for websocket in sockets if websocket.accepted)
+        admitted = sum(1 for result in results if result is not None)
+        print(f"  {name:<28}핸드셰이크 완료 {accepted}개, 등록 {admitted}개")
+
+
+async def main(args):
+    random.seed(1)
+    await bench_rooms(args.connections)
+    await bench_hot_room(args.connections, min(args.connections, args.legacy_hot))
+    await bench_memory(args.connections)
+    await bench_admission(100)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=50000)
+    parser.add_argument("--legacy-hot", type=int, default=10000)
+    asyncio.run(main(parser.parse_args()))
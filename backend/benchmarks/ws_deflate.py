@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from websockets import frames
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "admin"))
+from app.chat.compression import ThresholdPerMessageDeflate  # noqa: E402
+
+# 채팅 소켓 permessage-deflate 벤치마크
+# 실제 채팅과 비슷한 한국어 메시지를 크기별로 만들어서, 설정별로 메시지당 CPU 시간과 절약한 바이트를 비교한다
+# 사용법: python benchmarks/ws_deflate.py [--messages 5000]
+
+PHRASES = [
+    "안녕하세요", "반가워요", "몇 살이세요?", "어디서 오셨어요?", "저도요 ㅋㅋ", "ㅋㅋㅋㅋㅋ",
+    "오늘 파티 재밌네요", "혹시 MBTI 뭐예요?", "저는 ENFP 에요", "서울에서 왔어요", "내일 일정 있으세요?",
+    "게스트하우스 분위기 좋다", "술 잘 드세요?", "조금만 마셔요", "이따 2차 가실래요?", "좋아요!",
+    "사진 찍어요", "어떤 일 하세요?", "개발자예요", "와 신기하다", "여행 자주 다니세요?",
+]
+
+# (이름, 본문 글자 수 범위)
+SIZES = [
+    ("짧은 답장", (2, 10)),
+    ("일반 채팅", (10, 40)),
+    ("긴 채팅", (40, 120)),
+    ("아주 긴 채팅", (120, 400)),
+]
+
+# (이름, window bits, 최소 압축 크기)
+SETTINGS = [
+    ("압축 안 함", None, 0),
+    ("window 15", 15, 0),
+    ("window 12", 12, 0),
+    ("window 10", 10, 0),
+    ("window 15, 128B 미만 제외", 15, 128),
+    ("window 12, 256B 미만 제외", 12, 256),
+]
+
+
+def make_messages(count: int, length_range, seed: int = 0):
+    rng = random.Random(seed)
+    messages = []
+    chat_id = 361731134988160
+    for _ in range(count):
+        target = rng.randint(*length_range)
+        content = ""
+        while len(content) < target:
+            content += rng.choice(PHRASES) + " "
+        chat_id += rng.randint(1, 5000)
+        payload = {
+            "user_id": rng.randint(1, 200),
+            "chatRoom_id": rng.randint(400, 500),
+            "chat_id": chat_id,
+            "content": content[:target].strip(),
+        }
+        messages.append(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+    return messages
+
+
+def run(messages, window_bits, min_size):
+    raw_bytes = sum(len(m) for m in messages)
+    if window_bits is None:
+        return raw_bytes, raw_bytes, 0.0
+
+    # 연결 하나에서 메시지를 연속으로 보내는 상황 (context takeover 유지)
+    extension = ThresholdPerMessageDeflate(False, False, 15, window_bits, min_size=min_size)
+    wire_bytes = 0
+    start = time.process_time()
+    for data in messages:
+        frame = extension.encode(frames.Frame(frames.OP_TEXT, data))
+        wire_bytes += len(frame.data)
+    cpu = time.process_time() - start
+    return raw_bytes, wire_bytes, cpu
+
+
+def main(args):
+    print(f"메시지 {args.messages}개씩, 소켓 하나에서 연속 전송 기준\n")
+    for size_name, length_range in SIZES:
+        messages = make_messages(args.messages, length_range)
+        avg_raw = sum(len(m) for m in messages) / len(messages)
+        print(f"[{size_name}] 평균 원본 {avg_raw:.0f}B")
+        print(f"  {'설정':<24}{'CPU us/msg':>12}{'평균 전송 B':>12}{'절약 %':>9}{'절약 B/CPU us':>15}")
+        for name, window_bits, min_size in SETTINGS:
+            raw_bytes, wire_bytes, cpu = run(messages, window_bits, min_size)
+            cpu_us = cpu * 1_000_000 / len(messages)
+            saved = raw_bytes - wire_bytes
+            saved_per_us = (saved / len(messages)) / cpu_us if cpu_us else 0.0
+            print(
+                f"  {name:<24}{cpu_us:>12.2f}{wire_bytes / len(messages):>12.1f}"
+                f"{saved * 100 / raw_bytes:>9.1f}{saved_per_us:>15.2f}"
+            )
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=5000)
+    main(parser.parse_args())
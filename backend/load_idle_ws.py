@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import os
+import websockets
+import pymysql
+from dotenv import load_dotenv
+
+# 유휴 웹소켓 N개를 열어두고 서버가 잡고 있는 MySQL 커넥션 수가 늘지 않는지 확인하는 부하 테스트
+# 사용법: python load_idle_ws.py --token <유저 access_token> [--sockets 1000] [--max-db-connections 5]
+
+load_dotenv(os.path.join(os.path.dirname(__file__), "admin", ".env"))
+load_dotenv()
+
+
+def count_db_connections() -> int:
+    """서버 계정으로 열려 있는 MySQL 세션 수 (이 스크립트 자신의 세션 제외)"""
+    conn = pymysql.connect(
+        host=os.getenv("DATABASE_HOST"),
+        port=int(os.getenv("DATABASE_PORT", "3306")),
+        user=os.getenv("DATABASE_USER"),
+        password=os.getenv("DATABASE_PASSWORD"),
+        database=os.getenv("DATABASE_NAME"),
+    )
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM information_schema.PROCESSLIST WHERE USER = %s AND ID != CONNECTION_ID()",
+                (os.getenv("DATABASE_USER"),),
+            )
+            return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+
+async def open_socket(url: str, opened: list, stop: asyncio.Event):
+    try:
+        async with websockets.connect(url, open_timeout=30) as websocket:
+            opened.append(websocket)
+            await stop.wait()
+    except Exception as e:
+        print(f"연결 실패 {url}: {e}")
+
+
+async def main(args):
+    before = count_db_connections()
+    print(f"테스트 전 DB 커넥션: {before}")
+
+    stop = asyncio.Event()
+    opened: list = []
+    tasks = []
+    # 방 하나당 최대 2명이므로 소켓 2개씩 같은 방에 붙인다
+    for i in range(args.sockets):
+        chatRoom_id = args.room_start + i // 2
+        user_id = args.user_start + i
+        url = f"{args.host}/user/ws/chat/{chatRoom_id}/{user_id}?token={args.token}"
+        tasks.append(asyncio.create_task(open_socket(url, opened, stop)))
+        if i % 100 == 99:
+            await asyncio.sleep(0.1)
+
+    await asyncio.sleep(args.idle)
+    during = count_db_connections()
+    print(f"유휴 소켓 {len(opened)}개 연결 중 DB 커넥션: {during} (증가 {during - before})")
+
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    if len(opened) < args.sockets:
+        raise SystemExit(f"FAIL: {args.sockets}개 중 {len(opened)}개만 연결됨")
+    if during - before > args.max_db_connections:
+        raise SystemExit(f"FAIL: DB 커넥션이 {during - before}개 늘었음 (허용 {args.max_db_connections})")
+    print("OK")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="ws://localhost:9000")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--sockets", type=int, default=1000)
+    parser.add_argument("--idle", type=float, default=10, help="연결 후 유휴 상태로 기다릴 시간(초)")
+    parser.add_argument("--room-start", type=int, default=1000000)
+    parser.add_argument("--user-start", type=int, default=1000000)
+    parser.add_argument("--max-db-connections", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -12,6 +12,7 @@ interface ChatData {
   user_id: number;
   contents: string;
   date: string;
+  seq?: number; // 방 안 순번 - 읽음 처리할 때 같이 보냄
 }
 
 interface ChatResponse {
@@ -27,6 +28,7 @@ function Chat() {
   const [chatData, setChatData] = useState<ChatData[]>([]);
   const [lastChatId, setLastChatId] = useState<number | null>(null); // 현재 채팅 데이터 중 가장 오래된 채팅 id, 이전 채팅목록 불러오기 위한 변수
   const [lastReadChatId, setLastReadChatId] = useState<number | null>(null); // 유저가 채팅방에서 마지막으로 읽은 상대방의 채팅 id
+  const lastReadSeqRef = useRef<number | undefined>(undefined); // 그 채팅의 seq (서버가 순번을 따로 조회하지 않도록)
   const [loading, setLoading] = useState<boolean>(true);
   const [error, setError] = useState<string | null>(null);
   const [message, setMessage] = useState<string>(""); // 입력된 메시지 상태 추가
@@ -41,11 +43,14 @@ function Chat() {
 
   // WebSocket 연결을 위한 ref
   const socketRef = useRef<WebSocket | null>(null);
+  // 마지막으로 받은 채팅 id - 재접속할 때 서버에 넘겨서 놓친 메시지만 다시 받는다
+  const newestChatIdRef = useRef<number | null>(null);
 
   // chatData가 업데이트될 때마다 lastChatId를 계산
   useEffect(() => {
     if (chatData.length > 0) {
       setLastChatId(chatData[0].id);
+      newestChatIdRef.current = chatData[chatData.length - 1].id;
     }
   }, [chatData]);
 
@@ -101,47 +106,87 @@ function Chat() {
 
   // WebSocket 연결 설정
   useEffect(() => {
-    if (chatRoom_id && userId) {
-      socketRef.current = new WebSocket(
-        `ws://localhost:9000/user/ws/chat/${chatRoom_id}/${userId}?token=${token}`
+    if (!chatRoom_id || !userId) return;
+
+    let closedByPage = false; // 페이지를 떠나서 닫은 경우에는 재접속하지 않음
+    let reconnectTimer: ReturnType<typeof setTimeout> | null = null;
+
+    const connect = () => {
+      const lastChat =
+        newestChatIdRef.current !== null
+          ? `&lastChat_id=${newestChatIdRef.current}`
+          : "";
+      const socket = new WebSocket(
+        `ws://localhost:9000/user/ws/chat/${chatRoom_id}/${userId}?token=${token}${lastChat}`
       );
+      socketRef.current = socket;
 
-      socketRef.current.onopen = () => {
+      socket.onopen = () => {
         console.log("WebSocket 연결됨.");
       };
 
-      socketRef.current.onmessage = (event) => {
+      socket.onmessage = (event) => {
         const messageData = JSON.parse(event.data); // 서버에서 온 메시지가 JSON 형식이라면 파싱
 
-        const { id, user_id, content } = messageData; // 서버에서 받은 메시지 데이터
+        // 서버 heartbeat - 응답하지 않으면 서버가 죽은 연결로 보고 정리함
+        if (messageData.type === "ping") {
+          socket.send(JSON.stringify({ type: "pong" }));
+          return;
+        }
+
+        // 끊겨 있던 동안의 메시지를 서버가 다 채워줄 수 없는 경우 - 최신 채팅 내역을 다시 불러옴
+        if (messageData.type === "resync") {
+          setChatData([]);
+          setHasMore(true);
+          fetchChatContents(false);
+          return;
+        }
 
-        // 서버에서 메시지를 받으면 채팅 데이터에 추가
-        setChatData((prevData) => [
-          ...prevData,
-          {
-            id: id, // 채팅 데이터의 id
-            user_id: user_id, // 채팅을 보낸 사람의 user_id
-            contents: content, // 메시지 내용
-            date: new Date().toISOString(), // 메시지 전송 시간
-          },
-        ]);
+        const { chat_id, user_id, content, date, seq } = messageData; // 서버에서 받은 메시지 데이터
+
+        // 서버에서 메시지를 받으면 채팅 데이터에 추가 (재접속 replay 와 겹치는 메시지는 건너뜀)
+        setChatData((prevData) =>
+          prevData.some((chat) => chat.id === chat_id)
+            ? prevData
+            : [
+                ...prevData,
+                {
+                  id: chat_id, // 채팅 데이터의 id
+                  user_id: user_id, // 채팅을 보낸 사람의 user_id
+                  contents: content, // 메시지 내용
+                  date: date || new Date().toISOString(), // 메시지 전송 시간
+                  seq: seq,
+                },
+              ]
+        );
 
         if (user_id !== userId) {
           // 상대방의 채팅이면 마지막 읽은 채팅 id 를 업데이트
-          setLastReadChatId(id);
+          lastReadSeqRef.current = seq;
+          setLastReadChatId(chat_id);
         }
       };
 
-      socketRef.current.onerror = (error) => {
+      socket.onerror = (error) => {
         console.error("WebSocket 에러:", error);
       };
 
-      socketRef.current.onclose = () => {
+      socket.onclose = (event) => {
         console.log("WebSocket 연결 종료");
+        if (!closedByPage) {
+          // 서버 재시작(1012)이면 서버가 정해준 retry=<ms> 만큼 더 기다려서 재접속이 한꺼번에 몰리지 않게 한다
+          const retry =
+            event.code === 1012 ? Number(event.reason.replace("retry=", "")) || 0 : 0;
+          reconnectTimer = setTimeout(connect, 1000 + retry);
+        }
       };
-    }
+    };
+
+    connect();
 
     return () => {
+      closedByPage = true;
+      if (reconnectTimer) clearTimeout(reconnectTimer);
       if (socketRef.current) {
         socketRef.current.close();
       }
@@ -182,6 +227,7 @@ function Chat() {
           chatRoom_id: chatRoomId,
           user_id: userId,
           lastReadChat_id: lastReadChatId,
+          lastReadSeq: lastReadSeqRef.current,
         },
         {
           params: { token },
@@ -211,6 +257,7 @@ function Chat() {
 
         if (message.user_id !== userId) {
           // 상대방이 보낸 메세지면
+          lastReadSeqRef.current = message.seq;
           setLastReadChatId(message.id);
           break;
         }
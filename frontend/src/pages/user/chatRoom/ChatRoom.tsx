@@ -16,6 +16,7 @@ type ChatRoomResponse = {
   contents: string | null; // 해당 채팅방
   date: string | null;
   unreadCount: number | null;
+  group: boolean; // 팀 단체방 여부 (단체방은 상대 유저 정보 없이 name 이 방 이름)
 };
 
 const ChatRoom = () => {
@@ -48,8 +49,8 @@ const ChatRoom = () => {
         }
       );
 
-      // 응답 데이터를 상태에 저장합니다.
-      setChatRooms(response.data.data);
+      // 응답 데이터를 상태에 저장합니다. (채팅방이 없으면 data 가 null)
+      setChatRooms(response.data.data || []);
     } catch (error) {
       // 에러를 처리합니다.
       setError("채팅방 데이터를 가져오는 데 실패했습니다.");
@@ -78,6 +79,64 @@ const ChatRoom = () => {
     fetchChatRooms();
   }, []);
 
+  // 채팅방 리스트 이벤트 채널 - 처음 한 번 리스트를 가져온 뒤에는 변경분만 받아서 반영
+  useEffect(() => {
+    if (!party_id || !user_id || !token) return;
+
+    const events = new EventSource(
+      `/api/user/chatRooms/events/${party_id}/${user_id}?token=${token}`
+    );
+
+    // 새 메시지: 마지막 메시지 갱신, 상대방 메시지면 안읽음 +1, 최신 방을 맨 위로
+    events.addEventListener("chat", (event) => {
+      const { payload } = JSON.parse((event as MessageEvent).data);
+      setChatRooms((prev) => {
+        const rooms = prev || [];
+        const room = rooms.find((r) => r.id === payload.chatRoom_id);
+        if (!room) return rooms;
+        const updated = {
+          ...room,
+          contents: payload.contents,
+          date: payload.date,
+          unreadCount:
+            payload.user_id !== user_id
+              ? (room.unreadCount || 0) + 1
+              : room.unreadCount,
+        };
+        return [updated, ...rooms.filter((r) => r.id !== room.id)];
+      });
+    });
+
+    // 나와 연결된 새 채팅방
+    events.addEventListener("chatRoom", (event) => {
+      const { payload } = JSON.parse((event as MessageEvent).data);
+      setChatRooms((prev) => {
+        const rooms = prev || [];
+        if (rooms.some((r) => r.id === payload.id)) return rooms;
+        return [payload, ...rooms];
+      });
+    });
+
+    // 다른 탭/기기에서 읽음 처리
+    events.addEventListener("read", (event) => {
+      const { payload } = JSON.parse((event as MessageEvent).data);
+      setChatRooms((prev) =>
+        (prev || []).map((r) =>
+          r.id === payload.chatRoom_id ? { ...r, unreadCount: 0 } : r
+        )
+      );
+    });
+
+    // 서버에서 밀린 이벤트를 버린 경우 - 리스트를 다시 가져온다
+    events.addEventListener("resync", () => {
+      fetchChatRooms();
+    });
+
+    return () => {
+      events.close();
+    };
+  }, [party_id, user_id, token]);
+
   // 로딩 중일 때 보여줄 화면
   if (loading) return <div>Loading...</div>;
 
@@ -106,7 +165,9 @@ const ChatRoom = () => {
             >
               <ChatRoomInfo
                 name={
-                  chatRoom.team
+                  chatRoom.group
+                    ? chatRoom.name
+                    : chatRoom.team
                     ? `${chatRoom.team}조 ${chatRoom.name}`
                     : chatRoom.name
                 }
@@ -100,6 +100,42 @@ function Party() {
     }
   }, [user]);
 
+  // 파티 이벤트 채널 - 매니저가 짝매칭 시작/파티 on·off/공지를 하면 서버가 바로 알려줌 (폴링 대신)
+  useEffect(() => {
+    const partyId = user?.party_id;
+    if (!partyId || !token) return;
+
+    const events = new EventSource(
+      `/api/user/party/events/${partyId}?token=${token}`
+    );
+
+    events.addEventListener("matchStart", (event) => {
+      const { payload } = JSON.parse((event as MessageEvent).data);
+      setMatchTime(payload.matchStartTime);
+    });
+
+    events.addEventListener("partyOn", (event) => {
+      const { payload } = JSON.parse((event as MessageEvent).data);
+      setPartyInfo((prev) =>
+        prev ? { ...prev, party_on: payload.partyOn } : prev
+      );
+    });
+
+    events.addEventListener("announcement", (event) => {
+      const { payload } = JSON.parse((event as MessageEvent).data);
+      alert(payload.message);
+    });
+
+    // 서버에서 밀린 이벤트를 버린 경우 - 파티 정보를 다시 가져온다
+    events.addEventListener("resync", () => {
+      getPartyInfo(partyId);
+    });
+
+    return () => {
+      events.close();
+    };
+  }, [user?.party_id, token]);
+
   // 로그아웃 처리 함수
   const handleLogout = () => {
     // Recoil 상태를 초기화하여 로그인 정보 삭제
@@ -18,6 +18,7 @@ interface UserPartyInfo {
   gender: boolean; // true: 남자, false: 여자
   team: number | null; // 팀 번호 (nullable)
   chatRoomId: number | null; // 서로의 채팅방 번호
+  online: boolean; // 채팅 접속 중 여부
 }
 
 function PartyUserList() {
@@ -80,6 +81,30 @@ function PartyUserList() {
     fetchPartyUsers();
   }, [user, navigate]);
 
+  // 접속 현황 - 처음엔 partyInfo 의 online 값, 이후 변화는 파티 이벤트 채널로 받는다
+  useEffect(() => {
+    if (!partyId || !token) return;
+
+    const events = new EventSource(
+      `/api/user/party/events/${partyId}?token=${token}`
+    );
+
+    events.addEventListener("presence", (event) => {
+      const { payload } = JSON.parse((event as MessageEvent).data);
+      setPartyUsers((prev) =>
+        prev.map((partyUser) =>
+          partyUser.id === payload.user_id
+            ? { ...partyUser, online: payload.online }
+            : partyUser
+        )
+      );
+    });
+
+    return () => {
+      events.close();
+    };
+  }, [partyId, token]);
+
   // 유저 리스트 팀으로 그룹화
   const groupByTeam = (
     users: UserPartyInfo[]
@@ -168,6 +193,7 @@ function PartyUserList() {
                       chatRoomId={user.chatRoomId}
                       userId={userId}
                       partyId={partyId}
+                      online={user.online}
                     />
                   ))}
               </div>
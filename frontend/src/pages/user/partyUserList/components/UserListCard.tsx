@@ -16,6 +16,7 @@ interface UserListCardProps {
   chatRoomId: number | null; // 채팅방 ID
   userId: number | null; // 본인 id
   partyId: number | null; // 파티 id
+  online: boolean; // 채팅 접속 중 여부
 }
 
 function UserListCard({
@@ -26,6 +27,7 @@ function UserListCard({
   chatRoomId,
   userId,
   partyId,
+  online,
 }: UserListCardProps) {
   const navigate = useNavigate();
   const user = useRecoilValue(userAtom);
@@ -100,6 +102,7 @@ function UserListCard({
           src={gender ? man_icon : woman_icon}
           alt={`${gender ? "man" : "woman"}_icon_img`}
         />
+        {online && <span className={styles.online_dot} />}
       </div>
       <div className={styles.team_and_name_box}>
         {team === null ? (